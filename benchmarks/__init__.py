@@ -0,0 +1 @@
+"""Offline crawler benchmarks (see benchmarks/run.py)."""
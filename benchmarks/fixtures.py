@@ -0,0 +1,187 @@
+"""
+Listing, product and catalog fixtures for the benchmark stub server.
+
+Real pages recorded with `python -m benchmarks.record` (from the live
+sites or the page archive) are stored in benchmarks/fixtures/<website_key>/
+and served as-is; the recorded product pages are served in turn for the
+site's product URLs. For sites without recordings, deterministic pages are
+synthesized from the site's own selectors and the product rows in data/,
+padded to a realistic page size, so every entry in WEBSITES can be
+benchmarked offline. Reports list which kind each site used.
+"""
+
+import ast
+import csv
+import html
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+FIXTURE_DIR = BENCHMARK_DIR / "fixtures"
+SAMPLE_DATA_DIR = BENCHMARK_DIR.parent / "data"
+
+SPEC_FIELDS = ["battery", "motor_type", "max_speed", "range", "weight", "max_load"]
+SPEC_LABELS = {
+    "battery": "Battery", "motor_type": "Motor", "max_speed": "Speed",
+    "range": "Range", "weight": "Weight", "max_load": "Capacity",
+}
+
+_COMPOUND = re.compile(r"([a-zA-Z][\w-]*)?((?:[.#][\w-]+|\[[^\]]*\]|:[\w-]+(?:\([^)]*\))?)*)")
+_PART = re.compile(r"([.#])([\w-]+)|\[([\w-]+)[*^$~|]?=?['\"]?([^'\"\]]*)['\"]?\]|:(?:-soup-)?contains\(['\"](.*?)['\"]\)")
+
+
+def load_sample_rows(data_dir: Path = SAMPLE_DATA_DIR) -> List[Dict[str, str]]:
+    """Product rows from the dated site CSVs in data/, used to fill synthetic pages."""
+    rows = []
+    for path in sorted(Path(data_dir).glob("*_[0-9]*.csv")):
+        with open(path, newline="", encoding="utf-8") as f:
+            rows.extend(row for row in csv.DictReader(f) if row.get("name"))
+    if not rows:
+        rows = [{"name": "Sample E-Bike", "price": "1499.0", "battery": "48V 14Ah", "range": "Up to 50 miles"}]
+    return rows
+
+
+def _element(compound: str, content: str, default_tag: str = "div", attrs: Optional[Dict[str, str]] = None) -> str:
+    """Render one compound selector (tag.class#id[attr]:contains()) as an element around `content`."""
+    match = _COMPOUND.fullmatch(compound)
+    if not match:
+        raise ValueError(f"Unsupported selector part: {compound}")
+    tag = match.group(1) or default_tag
+    classes, attributes, prefix = [], dict(attrs or {}), ""
+    for part in _PART.finditer(match.group(2)):
+        if part.group(1) == ".":
+            classes.append(part.group(2))
+        elif part.group(1) == "#":
+            attributes["id"] = part.group(2)
+        elif part.group(3):
+            attributes.setdefault(part.group(3), part.group(4) or "")
+        elif part.group(5) is not None:
+            prefix = html.escape(part.group(5)) + " "
+    if classes:
+        attributes["class"] = " ".join(classes)
+    rendered = "".join(f' {k}="{html.escape(v, quote=True)}"' for k, v in attributes.items())
+    if tag == "img":
+        return f"<img{rendered}>"
+    return f"<{tag}{rendered}>{prefix}{content}</{tag}>"
+
+
+def render_selector(selector: str, content: str, leaf_tag: str = "div",
+                    leaf_attrs: Optional[Dict[str, str]] = None) -> str:
+    """
+    Render HTML matched by the first descendant-only alternative of a selector.
+
+    E.g. ".specs .spec-item:contains('Battery') .spec-value" becomes nested
+    divs with "Battery" in the spec item and `content` in the value.
+    """
+    for alternative in (a.strip() for a in selector.split(",")):
+        if any(c in alternative for c in "+>~"):
+            continue
+        parts = alternative.split()
+        markup = _element(parts[-1], content, leaf_tag, leaf_attrs)
+        for compound in reversed(parts[:-1]):
+            markup = _element(compound, markup)
+        return markup
+    return ""
+
+
+def _images(row: Dict[str, str]) -> List[str]:
+    value = row.get("images") or ""
+    if value.startswith("["):
+        try:
+            return [str(v) for v in ast.literal_eval(value)][:6]
+        except (ValueError, SyntaxError):
+            pass
+    return [value] if value else []
+
+
+def _padding(kilobytes: int, seed: int) -> str:
+    """Navigation, footer and inline script filler of roughly the given size."""
+    links = "".join(f'<li class="nav__item"><a href="/category/{seed}-{i}">Category {i}</a></li>' for i in range(60))
+    block = f'<nav class="site-nav"><ul>{links}</ul></nav>'
+    script = "<script>window.__STATE__ = " + json.dumps({"items": [{"id": i, "seed": seed} for i in range(40)]}) + ";</script>"
+    chunk = block + script
+    repeats = max(1, (kilobytes * 1024) // len(chunk))
+    return chunk * repeats
+
+
+def product_page(config: Dict[str, Any], row: Dict[str, str], page_kb: int, seed: int) -> str:
+    selectors = config["selectors"]
+    body = [render_selector(selectors["name"], html.escape(row.get("name", "")), "h1")]
+    if row.get("price"):
+        body.append(render_selector(selectors["price"], f"${float(row['price']):,.2f}"))
+    if row.get("description"):
+        body.append(render_selector(selectors["description"], html.escape(row["description"]), "p"))
+    for field in SPEC_FIELDS:
+        if row.get(field) and field in selectors:
+            value = html.escape(row[field])
+            if ":contains" not in selectors[field].split(",")[0]:
+                value = f"{SPEC_LABELS[field]}: {value}"
+            body.append(render_selector(selectors[field], value))
+    for src in _images(row):
+        body.append(render_selector(selectors.get("images", "img"), "", "img", {"src": src}))
+
+    head = ""
+    if config.get("structured_source", {}).get("json_ld"):
+        json_ld = {
+            "@context": "https://schema.org", "@type": "Product", "name": row.get("name"),
+            "description": row.get("description") or "",
+            "image": _images(row),
+            "offers": {"@type": "Offer", "price": row.get("price") or "", "priceCurrency": "USD"},
+            "additionalProperty": [
+                {"@type": "PropertyValue", "name": SPEC_LABELS[f], "value": row[f]} for f in SPEC_FIELDS if row.get(f)
+            ],
+        }
+        head = f'<script type="application/ld+json">{json.dumps(json_ld)}</script>'
+
+    padding = _padding(page_kb, seed)
+    half = len(padding) // 2
+    return (f"<!DOCTYPE html><html><head><title>{html.escape(row.get('name', ''))}</title>{head}</head>"
+            f"<body>{padding[:half]}<main>{''.join(body)}</main>{padding[half:]}</body></html>")
+
+
+def listing_page(config: Dict[str, Any], product_urls: List[str], next_url: Optional[str],
+                 page_kb: int, seed: int) -> str:
+    discovery = config["discovery"]
+    links = "".join(render_selector(discovery["product_link_selector"], "View bike", "a", {"href": url})
+                    for url in product_urls)
+    pagination = ""
+    if next_url and discovery.get("pagination_selector"):
+        pagination = render_selector(discovery["pagination_selector"], "Next", "a", {"href": next_url})
+    return (f"<!DOCTYPE html><html><head><title>Bikes</title></head><body>{_padding(page_kb // 2, seed)}"
+            f"<main>{links}{pagination}</main></body></html>")
+
+
+def catalog_entry(product_id: str, row: Dict[str, str]) -> Dict[str, Any]:
+    """A Shopify products.json entry for a sample row."""
+    specs = "".join(f"<li>{SPEC_LABELS[f]}: {html.escape(row[f])}</li>" for f in SPEC_FIELDS if row.get(f))
+    return {
+        "handle": product_id,
+        "title": row.get("name"),
+        "product_type": "E-Bike",
+        "body_html": f"<p>{html.escape(row.get('description') or '')}</p><ul>{specs}</ul>",
+        "variants": [{"price": row.get("price") or "0", "available": True}],
+        "images": [{"src": src} for src in _images(row)],
+    }
+
+
+def sitemap(product_urls: List[str]) -> str:
+    urls = "".join(f"<url><loc>{html.escape(u)}</loc><lastmod>2025-05-23</lastmod></url>" for u in product_urls)
+    return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>'
+
+
+def recorded(website_key: str, name: str) -> Optional[bytes]:
+    """A recorded fixture file, if one exists for the site."""
+    path = FIXTURE_DIR / website_key / name
+    return path.read_bytes() if path.exists() else None
+
+
+def recorded_products(website_key: str) -> List[bytes]:
+    """The recorded product pages of a site (product.html or product-N.html), in name order."""
+    return [path.read_bytes() for path in sorted((FIXTURE_DIR / website_key).glob("product*.html"))]
+
+
+def template_prefix(config: Dict[str, Any]) -> str:
+    return urlparse(config["product_url_template"]).path.split("{product_id}")[0]
@@ -0,0 +1,125 @@
+"""
+Record real pages as benchmark fixtures.
+
+For each website, stores the first listing page, a few product pages and
+(for catalog sites) the first catalog page in benchmarks/fixtures/<website_key>/:
+
+    listing.html  product-1.html ... product-N.html  catalog.json
+
+The stub server then serves these instead of synthetic pages. Links to the
+site's own origin are made relative so the recorded pages never send the
+benchmark back to the live site.
+
+Pages are fetched from the live site, or with --from-archive taken from the
+page archive (data/pages) that every crawl fills, without any network access:
+
+    python -m benchmarks.record --sites cube_bikes,fiido
+    python -m benchmarks.record --from-archive --products 5
+"""
+
+import argparse
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from src.crawlers import crawler
+from src.crawlers.config.websites import WEBSITES
+from src.crawlers.page_archive import PageArchive
+
+from .fixtures import FIXTURE_DIR
+
+DEFAULT_PRODUCTS = 3
+
+
+def _relativize(page: bytes, base_url: str) -> bytes:
+    parts = urlsplit(base_url)
+    origin = f"{parts.scheme}://{parts.netloc}".encode()
+    return re.sub(re.escape(origin) + rb"(?=[/\"'])", b"", page)
+
+
+def _write(target: Path, name: str, page: Optional[bytes], written: List[str]):
+    if page is not None:
+        (target / name).write_bytes(page)
+        written.append(name)
+
+
+def _live_pages(config: Dict[str, Any], products: int) -> Dict[str, Optional[bytes]]:
+    def fetch(url: str) -> Optional[bytes]:
+        response = crawler.fetch_page(url)
+        return response.content if response is not None else None
+
+    pages = {"listing.html": fetch(config["discovery"]["url"])}
+    structured = config.get("structured_source", {})
+    if structured.get("catalog_url"):
+        pages["catalog.json"] = fetch(f"{structured['catalog_url']}?limit=250&page=1")
+
+    product_ids = crawler.discover_product_ids({**config, "discovery": {**config["discovery"], "max_pages": 1}})
+    for number, product_id in enumerate(product_ids[:products], 1):
+        pages[f"product-{number}.html"] = fetch(crawler.build_product_url(config, product_id, config["languages"][0]))
+    return pages
+
+
+def _archived_pages(website_key: str, config: Dict[str, Any], products: int,
+                    archive: PageArchive) -> Dict[str, Optional[bytes]]:
+    # Latest capture of every URL
+    latest = {entry.url: entry for entry in archive.entries(website_key)}
+    pages: Dict[str, Optional[bytes]] = {}
+    listing = latest.get(config["discovery"]["url"])
+    pages["listing.html"] = archive.read(listing) if listing else None
+
+    catalog_url = config.get("structured_source", {}).get("catalog_url")
+    if catalog_url:
+        first_page = [entry for url, entry in latest.items()
+                      if url.startswith(catalog_url) and re.search(r"[?&]page=1(&|$)", url)]
+        pages["catalog.json"] = archive.read(first_page[-1]) if first_page else None
+
+    product_pages = [entry for entry in latest.values() if entry.kind == "product"]
+    for number, entry in enumerate(product_pages[-products:] if products else [], 1):
+        pages[f"product-{number}.html"] = archive.read(entry)
+    return pages
+
+
+def record_site(website_key: str, products: int = DEFAULT_PRODUCTS,
+                archive: Optional[PageArchive] = None) -> List[str]:
+    config = WEBSITES[website_key]
+    target = FIXTURE_DIR / website_key
+    target.mkdir(parents=True, exist_ok=True)
+    if archive is not None:
+        pages = _archived_pages(website_key, config, products, archive)
+    else:
+        pages = _live_pages(config, products)
+
+    written: List[str] = []
+    if any(name.startswith("product-") and page is not None for name, page in pages.items()):
+        # Replace the previous recording's product pages, which may be more
+        for old in target.glob("product*.html"):
+            old.unlink()
+    for name, page in pages.items():
+        if page is not None and name.endswith(".html"):
+            page = _relativize(page, config["base_url"])
+        _write(target, name, page, written)
+    return written
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Record real pages as benchmark fixtures")
+    parser.add_argument("--sites", help="comma-separated WEBSITES keys (default: all)")
+    parser.add_argument("--products", type=int, default=DEFAULT_PRODUCTS, help="product pages per site")
+    parser.add_argument("--from-archive", nargs="?", type=Path, const=crawler.PAGE_ARCHIVE_DIR, default=None,
+                        metavar="DIR", help="take the pages from a page archive (default data/pages) "
+                                            "instead of the live sites")
+    args = parser.parse_args(argv)
+
+    archive = PageArchive(args.from_archive) if args.from_archive else None
+    try:
+        for website_key in args.sites.split(",") if args.sites else WEBSITES:
+            written = record_site(website_key, args.products, archive)
+            print(f"{website_key}: {', '.join(written) or 'nothing recorded'}")
+    finally:
+        if archive is not None:
+            archive.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""
+Offline crawler benchmark.
+
+Starts a stub server per website, then measures against it:
+
+    parse_ms       per-page time of ExtractionPlan.parse + parse_product_page
+    discovery_s    discover_product_ids (or the structured catalog) per site
+    run_crawler_s  end-to-end run_crawler wall time, in a scratch data dir
+    pages_per_sec  successful responses served during the run per second
+    peak_rss_mb    peak resident memory of the benchmark process
+    peak_child_rss_mb  peak resident memory of its largest child process
+                   (parse workers, thumbnail workers)
+
+Results are written as JSON and can be compared against a stored baseline:
+
+    python -m benchmarks.run --save-baseline
+    python -m benchmarks.run --baseline benchmarks/baseline.json
+
+The comparison exits with status 1 if any metric regressed by more than
+the tolerance.
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.crawlers import crawler
+from src.crawlers.config.websites import WEBSITES
+from src.crawlers.extraction import get_plan
+from src.crawlers.structured import read_catalog
+
+from .fixtures import BENCHMARK_DIR, load_sample_rows
+from .stub_server import Faults, StubSite
+
+RESULTS_DIR = BENCHMARK_DIR / "results"
+DEFAULT_BASELINE = BENCHMARK_DIR / "baseline.json"
+
+# metric path -> True if higher is better
+COMPARED_METRICS = {
+    "run_crawler_s": False,
+    "pages_per_sec": True,
+    "parse_ms.mean": False,
+    "parse_ms.p95": False,
+    "discovery_s.total": False,
+    "peak_rss_mb": False,
+    "peak_child_rss_mb": False,
+}
+
+# Pace the crawler only by the simulated server, not by production delays
+BENCHMARK_POLITENESS = {"initial_delay": 0.0, "min_delay": 0.0, "backoff_base": 0.2}
+
+_CRAWLER_PATHS = [
+    "CURRENT_DATA_DIR", "HISTORY_DIR", "PRICE_INDEX_DIR", "IMAGE_DIR", "THUMBNAIL_DIR", "WEB_DATA_DIR",
+    "HTTP_CACHE_DIR", "STATE_DIR", "CHANGES_DIR", "FRONTIER_DB", "METRICS_DIR",
+    "SHARD_OUTPUT_DIR", "SHARD_FRONTIER_DIR", "MATCH_INDEX_DIR", "PAGE_ARCHIVE_DIR", "REPLAY_DIR",
+]
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))]
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(statistics.fmean(values), 3),
+        "p50": round(_percentile(values, 50), 3),
+        "p95": round(_percentile(values, 95), 3),
+        "max": round(max(values), 3),
+    }
+
+
+def _peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    """Peak RSS of this process, or with RUSAGE_CHILDREN of its largest finished child."""
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=BENCHMARK_DIR.parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextmanager
+def crawler_sandbox(configs: Dict[str, Dict[str, Any]], scratch: Path):
+    """Point the crawler's data directories, site list and shared sessions at a scratch setup."""
+    saved = {name: getattr(crawler, name) for name in _CRAWLER_PATHS + ["WEBSITES", "_http_session", "_politeness"]}
+    try:
+        for name in _CRAWLER_PATHS:
+            setattr(crawler, name, scratch / saved[name].relative_to(crawler.BASE_DIR))
+        crawler.WEBSITES = configs
+        crawler._http_session = None
+        crawler._politeness = None
+        yield
+    finally:
+        if crawler._http_session is not None:
+            crawler._http_session.close()
+        for name, value in saved.items():
+            setattr(crawler, name, value)
+
+
+def benchmark_parse(sites: Dict[str, StubSite], pages_per_site: int) -> Dict[str, Any]:
+    timings, per_site = [], {}
+    for key, site in sites.items():
+        config = site.config
+        plan = get_plan(config["selectors"], config.get("parse_only"))
+        site_timings = []
+        for product_id in site.product_ids[:pages_per_site]:
+            page = site.product(product_id).decode("utf-8")
+            started = time.perf_counter()
+            soup = plan.parse(page)
+            crawler.parse_product_page(soup, config["selectors"], product_id)
+            site_timings.append((time.perf_counter() - started) * 1000)
+        per_site[key] = _summary(site_timings)
+        timings.extend(site_timings)
+    return {**_summary(timings), "sites": per_site}
+
+
+def benchmark_discovery(sites: Dict[str, StubSite]) -> Dict[str, Any]:
+    result = {}
+    for key, site in sites.items():
+        structured = site.config.get("structured_source", {})
+        started = time.perf_counter()
+        if structured.get("catalog"):
+            found = len(read_catalog(structured, crawler.fetch_page) or {})
+            method = "catalog"
+        else:
+            found = len(crawler.discover_product_ids(site.config))
+            method = "sitemap" if site.config.get("discovery", {}).get("sitemap") else "listing"
+        result[key] = {"seconds": round(time.perf_counter() - started, 3), "products": found, "method": method}
+    result["total"] = round(sum(r["seconds"] for r in result.values()), 3)
+    return result
+
+
+def benchmark_run(sites: Dict[str, StubSite], scratch: Path, max_parallel_sites: int,
+                  parse_workers: Optional[int] = None) -> Dict[str, Any]:
+    for site in sites.values():
+        site.requests.clear()
+    started = time.perf_counter()
+    crawler.run_crawler(max_parallel_sites=max_parallel_sites, parse_workers=parse_workers)
+    elapsed = time.perf_counter() - started
+
+    statuses: Dict[str, int] = {}
+    for site in sites.values():
+        for status, count in site.requests.items():
+            statuses[str(status)] = statuses.get(str(status), 0) + count
+    ok = sum(count for status, count in statuses.items() if status.startswith("2"))
+    products = sum(
+        max(sum(1 for _ in open(path, encoding="utf-8")) - 1, 0)
+        for path in (scratch / "data" / "current").glob("*.csv")
+    )
+    return {
+        "run_crawler_s": round(elapsed, 3),
+        "pages_per_sec": round(ok / elapsed, 2) if elapsed else 0.0,
+        "requests": statuses,
+        "products_saved": products,
+    }
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    keys = args.sites.split(",") if args.sites else list(WEBSITES)
+    unknown = set(keys) - set(WEBSITES)
+    if unknown:
+        raise SystemExit(f"Unknown sites: {', '.join(sorted(unknown))}")
+
+    faults = Faults(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, throttle_rate=args.throttle_rate,
+                    error_rate=args.error_rate, seed=args.seed)
+    rows = load_sample_rows()
+    sites = {key: StubSite(key, WEBSITES[key], rows, products=args.products, per_page=args.per_page,
+                           page_kb=args.page_kb, faults=faults) for key in keys}
+    for site in sites.values():
+        site.start()
+        if not args.real_politeness:
+            site.config["politeness"] = dict(BENCHMARK_POLITENESS)
+
+    configs = {key: site.config for key, site in sites.items()}
+    fixture_kinds = {key: "recorded" if site.recorded_products else "synthetic" for key, site in sites.items()}
+    synthetic = [key for key, kind in fixture_kinds.items() if kind == "synthetic"]
+    if synthetic:
+        logging.getLogger("ebike_crawler.benchmark").warning(
+            f"No recorded pages for {', '.join(synthetic)}; using synthetic pages (see benchmarks/record.py)")
+    try:
+        with tempfile.TemporaryDirectory(prefix="ebike-bench-") as scratch_dir:
+            scratch = Path(scratch_dir)
+            with crawler_sandbox(configs, scratch):
+                parse = benchmark_parse(sites, args.parse_pages)
+                discovery = benchmark_discovery(sites)
+                run = benchmark_run(sites, scratch, args.max_parallel_sites, args.parse_workers)
+    finally:
+        for site in sites.values():
+            site.stop()
+
+    # Before any other child is started: a forked child reports this process's RSS as its own
+    peak_rss = {"peak_rss_mb": _peak_rss_mb(), "peak_child_rss_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN)}
+    return {
+        "version": 1,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "sites": keys, "products": args.products, "per_page": args.per_page, "page_kb": args.page_kb,
+            "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "throttle_rate": args.throttle_rate,
+            "error_rate": args.error_rate, "seed": args.seed, "real_politeness": args.real_politeness,
+            "max_parallel_sites": args.max_parallel_sites, "parse_workers": args.parse_workers,
+        },
+        # True unless every site was served recorded pages: the numbers then
+        # describe generated markup, not the real sites
+        "synthetic": bool(synthetic),
+        "fixtures": fixture_kinds,
+        "metrics": {
+            **run,
+            "parse_ms": parse,
+            "discovery_s": discovery,
+            **peak_rss,
+        },
+    }
+
+
+def _metric(report: Dict[str, Any], path: str) -> Optional[float]:
+    value: Any = report["metrics"]
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return float(value)
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Describe every compared metric that is worse than the baseline by more than `tolerance`."""
+    if report["settings"] != baseline.get("settings"):
+        logging.getLogger("ebike_crawler.benchmark").warning("Benchmark settings differ from the baseline")
+    if report.get("fixtures") != baseline.get("fixtures"):
+        logging.getLogger("ebike_crawler.benchmark").warning(
+            "Baseline was served different fixtures (recorded vs synthetic pages)")
+    regressions = []
+    for path, higher_is_better in COMPARED_METRICS.items():
+        current, previous = _metric(report, path), _metric(baseline, path)
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        worse = -change if higher_is_better else change
+        status = "REGRESSION" if worse > tolerance else "ok"
+        print(f"  {path:<20} {previous:>10.3f} -> {current:>10.3f} ({change:+.1%}) {status}")
+        if worse > tolerance:
+            regressions.append(f"{path} {change:+.1%}")
+    return regressions
+
+
+def _fixture_label(report: Dict[str, Any]) -> str:
+    kinds = set(report.get("fixtures", {}).values())
+    if kinds == {"recorded"}:
+        return "recorded pages"
+    return "SYNTHETIC pages" if kinds == {"synthetic"} or not kinds else "partly SYNTHETIC pages"
+
+
+def _print_report(report: Dict[str, Any]):
+    metrics = report["metrics"]
+    print(f"Results on {_fixture_label(report)}")
+    print(f"run_crawler:   {metrics['run_crawler_s']:.2f}s, {metrics['pages_per_sec']:.1f} pages/s, "
+          f"{metrics['products_saved']} products, responses {metrics['requests']}")
+    print(f"parse:         mean {metrics['parse_ms'].get('mean', 0):.2f}ms, p95 {metrics['parse_ms'].get('p95', 0):.2f}ms "
+          f"over {metrics['parse_ms']['count']} pages")
+    print(f"discovery:     {metrics['discovery_s']['total']:.2f}s total")
+    for key, site in metrics["discovery_s"].items():
+        if key != "total":
+            print(f"  {key:<22} {site['seconds']:.3f}s  {site['products']} products via {site['method']}")
+    print(f"peak RSS:      {metrics['peak_rss_mb']:.1f} MB, largest child process "
+          f"{metrics.get('peak_child_rss_mb', 0):.1f} MB")
+    recorded = [key for key, kind in report.get("fixtures", {}).items() if kind == "recorded"]
+    print(f"fixtures:      recorded pages for {', '.join(recorded) or 'no sites'}, synthetic for the rest")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the crawler against local stub servers")
+    parser.add_argument("--sites", help="comma-separated WEBSITES keys (default: all)")
+    parser.add_argument("--products", type=int, default=50, help="products per site")
+    parser.add_argument("--per-page", type=int, default=12, help="products per listing page")
+    parser.add_argument("--page-kb", type=int, default=150, help="approximate size of synthetic pages")
+    parser.add_argument("--parse-pages", type=int, default=20, help="pages per site in the parse benchmark")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of 429 responses")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 500 responses")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-parallel-sites", type=int, default=crawler.MAX_PARALLEL_SITES)
+    parser.add_argument("--parse-workers", type=int, default=None,
+                        help="parse processes for the run_crawler benchmark (default: the crawler's default)")
+    parser.add_argument("--real-politeness", action="store_true",
+                        help="keep the production politeness delays instead of pacing only by the stub")
+    parser.add_argument("--output", type=Path, help="report path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", type=Path, help="compare against this report")
+    parser.add_argument("--save-baseline", action="store_true", help=f"also store the report as {DEFAULT_BASELINE.name}")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    parser.add_argument("--verbose", action="store_true", help="show crawler logs")
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        logging.getLogger("ebike_crawler").setLevel(logging.WARNING)
+
+    report = run_benchmark(args)
+    _print_report(report)
+
+    output = args.output or RESULTS_DIR / f"{datetime.datetime.now().strftime('%Y%m%dT%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Report written to {output}")
+    if args.save_baseline:
+        DEFAULT_BASELINE.write_text(json.dumps(report, indent=2))
+        print(f"Baseline saved to {DEFAULT_BASELINE}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        print(f"Comparison with {args.baseline} on {_fixture_label(baseline)} "
+              f"(tolerance {args.tolerance:.0%}):")
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
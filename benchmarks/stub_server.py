@@ -0,0 +1,185 @@
+"""
+Local stub HTTP servers standing in for the manufacturer websites.
+
+Each website gets its own server on a loopback port (so per-host politeness
+applies per site as it does live). Servers answer the site's listing,
+product, catalog, sitemap and robots.txt URLs from fixtures, and can
+simulate latency, 429 throttling and server errors.
+"""
+
+import json
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlencode, urlparse, urlsplit, urlunsplit
+
+from . import fixtures
+
+
+@dataclass
+class Faults:
+    """Simulated server behaviour."""
+
+    latency_ms: float = 0.0        # mean added response time
+    jitter_ms: float = 0.0         # uniform +/- jitter around the mean
+    throttle_rate: float = 0.0     # fraction of requests answered 429
+    error_rate: float = 0.0        # fraction of requests answered 500
+    retry_after: int = 1           # Retry-After seconds sent with 429s
+    seed: int = 0
+
+
+def rebase_url(url: str, origin: str) -> str:
+    """Point an absolute URL at `origin` (scheme://host:port), keeping path and query."""
+    parts = urlsplit(url)
+    base = urlsplit(origin)
+    return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, parts.fragment))
+
+
+def rebase_config(config: Dict[str, Any], origin: str) -> Dict[str, Any]:
+    """Copy of a WEBSITES entry with every URL pointed at a stub server."""
+    config = json.loads(json.dumps(config))
+    config["base_url"] = rebase_url(config["base_url"], origin)
+    config["product_url_template"] = rebase_url(config["product_url_template"], origin).replace(
+        "%7Bproduct_id%7D", "{product_id}")
+    discovery = config.get("discovery", {})
+    for key in ("url", "sitemap"):
+        if discovery.get(key):
+            discovery[key] = rebase_url(discovery[key], origin)
+    structured = config.get("structured_source", {})
+    if structured.get("catalog_url"):
+        structured["catalog_url"] = rebase_url(structured["catalog_url"], origin)
+    return config
+
+
+class StubSite:
+    """Fixture-backed fake of one website."""
+
+    def __init__(self, website_key: str, config: Dict[str, Any], rows: List[Dict[str, str]],
+                 products: int = 50, per_page: int = 12, page_kb: int = 150, faults: Optional[Faults] = None):
+        self.website_key = website_key
+        self.config = config
+        self.rows = rows
+        self.per_page = per_page
+        self.page_kb = page_kb
+        self.faults = faults or Faults()
+        self.product_ids = [f"bench-{website_key.replace('_', '-')}-{i:04d}" for i in range(products)]
+        self.requests = Counter()
+        self._rng = random.Random(self.faults.seed)
+        self._lock = threading.Lock()
+        self._pages: Dict[str, bytes] = {}
+        self.recorded_products = fixtures.recorded_products(website_key)
+        self.server: Optional[ThreadingHTTPServer] = None
+        self.origin = ""
+
+    # --- Fixtures ---------------------------------------------------------------
+
+    def _row(self, product_id: str) -> Dict[str, str]:
+        index = self.product_ids.index(product_id) if product_id in self.product_ids else 0
+        return self.rows[(index + zlib.crc32(self.website_key.encode()) % 97) % len(self.rows)]
+
+    def product_url(self, product_id: str) -> str:
+        return self.config["product_url_template"].format(product_id=product_id)
+
+    def product(self, product_id: str) -> bytes:
+        if self.recorded_products:
+            # Recorded listings link real product handles, so spread any ID over the pages
+            return self.recorded_products[zlib.crc32(product_id.encode()) % len(self.recorded_products)]
+        page = self._pages.get(product_id)
+        if page is None:
+            page = fixtures.product_page(self.config, self._row(product_id), self.page_kb,
+                                         self.product_ids.index(product_id)).encode("utf-8")
+            self._pages[product_id] = page
+        return page
+
+    def listing(self, page: int) -> bytes:
+        recorded = fixtures.recorded(self.website_key, "listing.html")
+        if recorded is not None:
+            return recorded
+        start = (page - 1) * self.per_page
+        urls = [self.product_url(p) for p in self.product_ids[start:start + self.per_page]]
+        next_url = None
+        if start + self.per_page < len(self.product_ids):
+            discovery_path = urlparse(self.config["discovery"]["url"]).path
+            next_url = f"{self.origin}{discovery_path}?{urlencode({'bench_page': page + 1})}"
+        return fixtures.listing_page(self.config, urls, next_url, self.page_kb, page).encode("utf-8")
+
+    def catalog(self, page: int, limit: int) -> bytes:
+        recorded = fixtures.recorded(self.website_key, "catalog.json")
+        if recorded is not None:
+            return recorded if page == 1 else b'{"products": []}'
+        ids = self.product_ids[(page - 1) * limit:page * limit]
+        return json.dumps({"products": [fixtures.catalog_entry(p, self._row(p)) for p in ids]}).encode("utf-8")
+
+    # --- HTTP ---------------------------------------------------------------------
+
+    def respond(self, path: str, query: Dict[str, List[str]]) -> tuple:
+        """(status, content type, body, extra headers) for a request."""
+        faults = self.faults
+        with self._lock:
+            roll = self._rng.random()
+            delay = max(0.0, faults.latency_ms + self._rng.uniform(-faults.jitter_ms, faults.jitter_ms)) / 1000
+        if delay:
+            time.sleep(delay)
+        if path == "/robots.txt":
+            return 200, "text/plain", b"User-agent: *\nAllow: /\n", {}
+        if roll < faults.throttle_rate:
+            return 429, "text/plain", b"Too Many Requests", {"Retry-After": str(faults.retry_after)}
+        if roll < faults.throttle_rate + faults.error_rate:
+            return 500, "text/plain", b"Internal Server Error", {}
+
+        structured = self.config.get("structured_source", {})
+        if structured.get("catalog_url") and path == urlparse(structured["catalog_url"]).path:
+            page = int(query.get("page", ["1"])[0])
+            limit = int(query.get("limit", ["250"])[0])
+            return 200, "application/json", self.catalog(page, limit), {}
+        discovery = self.config.get("discovery", {})
+        if discovery.get("sitemap") and path == urlparse(discovery["sitemap"]).path:
+            urls = [self.product_url(p) for p in self.product_ids]
+            return 200, "application/xml", fixtures.sitemap(urls).encode("utf-8"), {}
+        if discovery.get("url") and path == urlparse(discovery["url"]).path:
+            return 200, "text/html; charset=utf-8", self.listing(int(query.get("bench_page", ["1"])[0])), {}
+        prefix = fixtures.template_prefix(self.config)
+        if path.startswith(prefix):
+            product_id = path[len(prefix):].rstrip("/")
+            if product_id in self.product_ids or self.recorded_products:
+                return 200, "text/html; charset=utf-8", self.product(product_id), {}
+        return 404, "text/plain", b"Not Found", {}
+
+    def start(self) -> str:
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                status, content_type, body, headers = site.respond(parsed.path, parse_qs(parsed.query))
+                with site._lock:
+                    site.requests[status] += 1
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.origin = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.config = rebase_config(self.config, self.origin)
+        threading.Thread(target=self.server.serve_forever, name=f"stub-{self.website_key}", daemon=True).start()
+        return self.origin
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
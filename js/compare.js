@@ -10,6 +10,8 @@ class EBikeCompare {
         this.filteredBikes = [];
         this.selectedBikes = [];
         this.maxSelection = 4;
+        // Bundle row -> relevance for the current search, or null
+        this.searchResults = null;
         
         this.init();
     }
@@ -32,10 +34,21 @@ class EBikeCompare {
         const selectionSection = document.getElementById('selection-section');
         
         try {
-            // Try to discover available CSV files
-            const csvUrls = await csvParser.discoverCSVFiles('data');
+            // Prefer the precompiled bundle: one request, no CSV parsing
+            let bundleData = null;
+            try {
+                bundleData = await csvParser.loadBundle('data/manifest.json');
+            } catch (error) {
+                console.warn('Could not load data bundle, falling back to CSV files:', error);
+            }
+
+            // Otherwise try to discover available CSV files
+            const csvUrls = bundleData ? [] : await csvParser.discoverCSVFiles('data');
             
-            if (csvUrls.length === 0) {
+            if (bundleData) {
+                this.allBikes = this.processRawData(bundleData);
+                searchIndex.configure(csvParser.manifest, 'data/');
+            } else if (csvUrls.length === 0) {
                 // Fallback: try to load from existing data
                 const existingData = await this.loadExistingData();
                 this.allBikes = existingData;
@@ -89,7 +102,10 @@ class EBikeCompare {
             
             // Process images
             let images = [];
-            if (bike.images) {
+            if (Array.isArray(bike.images)) {
+                // Bundle rows already carry a parsed list
+                images = bike.images;
+            } else if (bike.images) {
                 try {
                     if (bike.images.startsWith('[')) {
                         // Convert Python list syntax (single quotes) to JSON syntax (double quotes)
@@ -127,12 +143,15 @@ class EBikeCompare {
 
             return {
                 id,
+                // Row in the data bundle, as used by the search index
+                row: index,
                 name: bike.name || 'Unnamed Bike',
                 price,
                 description: bike.description || '',
                 website: bike.website || 'Unknown',
                 manufacturer: this.extractManufacturer(bike.website),
                 product_id: bike.product_id || '',
+                canonical_id: bike.canonical_id || '',
                 language: bike.language || 'en',
                 url: bike.url || '',
                 crawl_date: bike.crawl_date || '',
@@ -142,11 +161,24 @@ class EBikeCompare {
                 range: bike.range || '',
                 weight: bike.weight || '',
                 max_load: bike.max_load || '',
-                images: images
+                battery_wh: this.parseNumber(bike.battery_wh),
+                range_km: this.parseNumber(bike.range_km),
+                max_speed_kmh: this.parseNumber(bike.max_speed_kmh),
+                weight_kg: this.parseNumber(bike.weight_kg),
+                max_load_kg: this.parseNumber(bike.max_load_kg),
+                images: images,
+                thumbnail: bike.thumbnail || ''
             };
         }).filter(bike => bike.name && bike.name !== 'Unnamed Bike');
     }
 
+    parseNumber(value) {
+        // Normalized spec columns are numbers in the bundle and strings in CSV
+        if (value === null || value === undefined || value === '') return null;
+        const number = typeof value === 'number' ? value : parseFloat(value);
+        return isNaN(number) ? null : number;
+    }
+
     extractManufacturer(website) {
         if (!website) return 'Unknown';
         
@@ -173,7 +205,22 @@ class EBikeCompare {
             this.applyFilters();
         });
 
-        document.getElementById('search-input').addEventListener('input', (e) => {
+        document.getElementById('search-input').addEventListener('input', async (e) => {
+            const query = e.target.value;
+            let results = null;
+            if (searchIndex.available) {
+                try {
+                    results = await searchIndex.search(query);
+                } catch (error) {
+                    console.warn('Search index unavailable, falling back to scanning the data:', error);
+                    searchIndex.disable();
+                }
+                // A newer query was typed while the index shards were loading
+                if (e.target.value !== query) {
+                    return;
+                }
+            }
+            this.searchResults = results;
             this.applyFilters();
         });
 
@@ -211,8 +258,12 @@ class EBikeCompare {
                 return false;
             }
 
-            // Search filter
-            if (searchFilter) {
+            // Search filter: prebuilt index when available, otherwise scan the text
+            if (searchFilter && searchIndex.available) {
+                if (this.searchResults && !this.searchResults.has(bike.row)) {
+                    return false;
+                }
+            } else if (searchFilter) {
                 const searchableText = [
                     bike.name,
                     bike.description,
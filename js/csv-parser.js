@@ -7,6 +7,8 @@
 class CSVParser {
     constructor() {
         this.cache = new Map();
+        // Manifest of the last loaded bundle (lists the search index too)
+        this.manifest = null;
     }
 
     /**
@@ -133,6 +135,74 @@ class CSVParser {
         }
     }
 
+    /**
+     * Load the precompiled data bundle produced by scripts/build.py
+     * @param {string} manifestUrl - URL of the bundle manifest
+     * @returns {Promise<Array|null>} Promise resolving to row objects, or null if no bundle exists
+     */
+    async loadBundle(manifestUrl = 'data/manifest.json') {
+        if (this.cache.has(manifestUrl)) {
+            return this.cache.get(manifestUrl);
+        }
+
+        const manifestResponse = await fetch(manifestUrl, { cache: 'no-cache' });
+        if (!manifestResponse.ok) {
+            return null;
+        }
+        const manifest = await manifestResponse.json();
+        this.manifest = manifest;
+        const baseUrl = manifestUrl.substring(0, manifestUrl.lastIndexOf('/') + 1);
+        const encodings = manifest.bundle.encodings || {};
+
+        let bundle;
+        if (encodings.gzip && typeof DecompressionStream !== 'undefined') {
+            // Fetch the smaller gzip variant and inflate it in the browser
+            const response = await fetch(baseUrl + encodings.gzip);
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            const stream = response.body.pipeThrough(new DecompressionStream('gzip'));
+            bundle = await new Response(stream).json();
+        } else {
+            const response = await fetch(baseUrl + manifest.bundle.path);
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            bundle = await response.json();
+        }
+
+        const data = this.decodeBundle(bundle);
+        this.cache.set(manifestUrl, data);
+        return data;
+    }
+
+    /**
+     * Turn a columnar bundle into an array of row objects
+     * @param {Object} bundle - Parsed bundle JSON
+     * @returns {Array} Array of objects with column names as keys
+     */
+    decodeBundle(bundle) {
+        const columns = bundle.columns.map((column, index) => {
+            let values = bundle.data[index];
+            if (column.encoding === 'dict') {
+                const dictionary = bundle.dictionaries[column.name];
+                values = values.map(code => (code === null ? null : dictionary[code]));
+            }
+            return { name: column.name, values };
+        });
+
+        const rows = new Array(bundle.count);
+        for (let i = 0; i < bundle.count; i++) {
+            const row = {};
+            for (const column of columns) {
+                const value = column.values[i];
+                row[column.name] = value === null ? '' : value;
+            }
+            rows[i] = row;
+        }
+        return rows;
+    }
+
     /**
      * Clear cache
      */
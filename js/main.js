@@ -17,6 +17,8 @@ class EBikeApp {
             search: ''
         };
         this.sortBy = 'name';
+        // Bundle row -> relevance for the current search, or null
+        this.searchResults = null;
         
         this.init();
     }
@@ -39,10 +41,21 @@ class EBikeApp {
         const controlsSection = document.getElementById('controls-section');
         
         try {
-            // Try to discover available CSV files
-            const csvUrls = await csvParser.discoverCSVFiles('data');
+            // Prefer the precompiled bundle: one request, no CSV parsing
+            let bundleData = null;
+            try {
+                bundleData = await csvParser.loadBundle('data/manifest.json');
+            } catch (error) {
+                console.warn('Could not load data bundle, falling back to CSV files:', error);
+            }
+
+            // Otherwise try to discover available CSV files
+            const csvUrls = bundleData ? [] : await csvParser.discoverCSVFiles('data');
             
-            if (csvUrls.length === 0) {
+            if (bundleData) {
+                this.allBikes = this.processRawData(bundleData);
+                searchIndex.configure(csvParser.manifest, 'data/');
+            } else if (csvUrls.length === 0) {
                 // Fallback: try to load from existing data
                 const existingData = await this.loadExistingData();
                 this.allBikes = existingData;
@@ -57,7 +70,7 @@ class EBikeApp {
             loadingIndicator.style.display = 'none';
             controlsSection.style.display = 'block';
             
-            console.log(`Loaded ${this.allBikes.length} bikes from ${csvUrls.length} sources`);
+            console.log(`Loaded ${this.allBikes.length} bikes from ${bundleData ? "the data bundle" : `${csvUrls.length} sources`}`);
         } catch (error) {
             console.error('Error loading bike data:', error);
             throw error;
@@ -97,7 +110,10 @@ class EBikeApp {
             
             // Process images
             let images = [];
-            if (bike.images) {
+            if (Array.isArray(bike.images)) {
+                // Bundle rows already carry a parsed list
+                images = bike.images;
+            } else if (bike.images) {
                 try {
                     // Try to parse as JSON array
                     if (bike.images.startsWith('[')) {
@@ -137,12 +153,15 @@ class EBikeApp {
 
             return {
                 id,
+                // Row in the data bundle, as used by the search index
+                row: index,
                 name: bike.name || 'Unnamed Bike',
                 price,
                 description: bike.description || '',
                 website: bike.website || 'Unknown',
                 manufacturer: this.extractManufacturer(bike.website),
                 product_id: bike.product_id || '',
+                canonical_id: bike.canonical_id || '',
                 language: bike.language || 'en',
                 url: bike.url || '',
                 crawl_date: bike.crawl_date || '',
@@ -152,11 +171,24 @@ class EBikeApp {
                 range: bike.range || '',
                 weight: bike.weight || '',
                 max_load: bike.max_load || '',
-                images: images
+                battery_wh: this.parseNumber(bike.battery_wh),
+                range_km: this.parseNumber(bike.range_km),
+                max_speed_kmh: this.parseNumber(bike.max_speed_kmh),
+                weight_kg: this.parseNumber(bike.weight_kg),
+                max_load_kg: this.parseNumber(bike.max_load_kg),
+                images: images,
+                thumbnail: bike.thumbnail || ''
             };
         }).filter(bike => bike.name && bike.name !== 'Unnamed Bike');
     }
 
+    parseNumber(value) {
+        // Normalized spec columns are numbers in the bundle and strings in CSV
+        if (value === null || value === undefined || value === '') return null;
+        const number = typeof value === 'number' ? value : parseFloat(value);
+        return isNaN(number) ? null : number;
+    }
+
     extractManufacturer(website) {
         if (!website) return 'Unknown';
         
@@ -195,8 +227,15 @@ class EBikeApp {
             this.displayBikes();
         });
 
-        document.getElementById('search-input').addEventListener('input', (e) => {
-            this.filters.search = e.target.value;
+        document.getElementById('search-input').addEventListener('input', async (e) => {
+            const query = e.target.value;
+            this.filters.search = query;
+            const results = await this.runSearch(query);
+            // A newer query was typed while the index shards were loading
+            if (query !== this.filters.search) {
+                return;
+            }
+            this.searchResults = results;
             this.applyFilters();
         });
 
@@ -205,6 +244,19 @@ class EBikeApp {
         });
     }
 
+    async runSearch(query) {
+        if (!searchIndex.available) {
+            return null;
+        }
+        try {
+            return await searchIndex.search(query);
+        } catch (error) {
+            console.warn('Search index unavailable, falling back to scanning the data:', error);
+            searchIndex.disable();
+            return null;
+        }
+    }
+
     populateFilters() {
         // Populate manufacturer filter
         const manufacturers = [...new Set(this.allBikes.map(bike => bike.manufacturer))].sort();
@@ -233,8 +285,12 @@ class EBikeApp {
                 }
             }
 
-            // Search filter
-            if (this.filters.search) {
+            // Search filter: prebuilt index when available, otherwise scan the text
+            if (this.filters.search && searchIndex.available) {
+                if (this.searchResults && !this.searchResults.has(bike.row)) {
+                    return false;
+                }
+            } else if (this.filters.search) {
                 const searchTerm = this.filters.search.toLowerCase();
                 const searchableText = [
                     bike.name,
@@ -269,6 +325,12 @@ class EBikeApp {
                     return (b.price || 0) - (a.price || 0);
                 case 'manufacturer':
                     return a.manufacturer.localeCompare(b.manufacturer);
+                case 'battery-high':
+                    return (b.battery_wh || 0) - (a.battery_wh || 0);
+                case 'range-high':
+                    return (b.range_km || 0) - (a.range_km || 0);
+                case 'weight-low':
+                    return (a.weight_kg || 999999) - (b.weight_kg || 999999);
                 default:
                     return 0;
             }
@@ -333,7 +395,8 @@ class EBikeApp {
         // Get main image
         let imageHtml = '<div class="no-image">No image available</div>';
         if (bike.images && bike.images.length > 0) {
-            imageHtml = `<img src="${bike.images[0]}" class="card-img-top bike-card-image" alt="${bike.name}" loading="lazy" onerror="this.parentElement.innerHTML='<div class=&quot;no-image&quot;>Image not available</div>'">`;
+            // Prefer the small self-hosted thumbnail over the full-size manufacturer image
+            imageHtml = `<img src="${bike.thumbnail || bike.images[0]}" class="card-img-top bike-card-image" alt="${bike.name}" loading="lazy" onerror="this.parentElement.innerHTML='<div class=&quot;no-image&quot;>Image not available</div>'">`;
         }
 
         col.innerHTML = `
@@ -425,6 +488,7 @@ class EBikeApp {
             priceRange: '',
             search: ''
         };
+        this.searchResults = null;
 
         document.getElementById('manufacturer-filter').value = '';
         document.getElementById('price-filter').value = '';
@@ -0,0 +1,165 @@
+/**
+ * Search Index Client for E-Bike Compare
+ *
+ * Queries the prebuilt, sharded search index written by scripts/build.py
+ * (see scripts/search_index.py). Only the shards holding the query terms
+ * are downloaded, a few KB each, and cached for the rest of the visit.
+ */
+
+class SearchIndex {
+    constructor() {
+        this.config = null;
+        this.baseUrl = 'data/';
+        this.stopwords = new Set();
+        this.folding = {};
+        this.shards = new Map();
+    }
+
+    /**
+     * Use the search index listed in a bundle manifest
+     * @param {Object} manifest - Parsed data/manifest.json
+     * @param {string} baseUrl - URL of the directory holding manifest.json
+     */
+    configure(manifest, baseUrl = 'data/') {
+        this.config = manifest && manifest.search && manifest.search.version === 1 ? manifest.search : null;
+        this.baseUrl = baseUrl;
+        this.stopwords = new Set(this.config ? this.config.stopwords : []);
+        this.folding = (this.config && this.config.folding) || {};
+    }
+
+    get available() {
+        return this.config !== null;
+    }
+
+    disable() {
+        this.config = null;
+    }
+
+    /**
+     * Lowercase, strip accents and fold the letters of the manifest's
+     * folding table (same as fold() in scripts/search_index.py)
+     * @param {string} text - Text to fold
+     * @returns {string} Folded text
+     */
+    fold(text) {
+        const stripped = (text || '').toLowerCase().normalize('NFKD').replace(/\p{M}/gu, '');
+        return Array.from(stripped, char => this.folding[char] ?? char).join('');
+    }
+
+    /**
+     * Fold and split into alphanumeric tokens, dropping stopwords
+     * (same as tokenize() in scripts/search_index.py, before stemming)
+     * @param {string} text - Text to tokenize
+     * @returns {Array<string>} Unstemmed tokens
+     */
+    tokenize(text) {
+        return (this.fold(text).match(/[a-z0-9]+/g) || []).filter(token =>
+            !this.stopwords.has(token) && (token.length > 1 || /\d/.test(token))
+        );
+    }
+
+    /**
+     * Light suffix stemming (same as stem() in scripts/search_index.py)
+     * @param {string} token - Lowercase token
+     * @returns {string} Stemmed term
+     */
+    stem(token) {
+        if (token.length <= 4 || !/^[a-z]+$/.test(token) || token.endsWith('ss')) {
+            return token;
+        }
+        for (const [suffix, replacement] of [['ies', 'y'], ['ing', ''], ['ed', ''], ['s', '']]) {
+            if (token.endsWith(suffix) && token.length - suffix.length >= 3) {
+                return token.slice(0, -suffix.length) + replacement;
+            }
+        }
+        return token;
+    }
+
+    /**
+     * Shards that can hold terms starting with a prefix
+     * @param {string} prefix - Term or term prefix
+     * @returns {Array<Object>} Shard entries of the manifest
+     */
+    shardsFor(prefix) {
+        const key = prefix.slice(0, this.config.prefix_length);
+        return this.config.shards.filter(shard => shard.last >= key && shard.first <= key + '\uffff');
+    }
+
+    async loadShard(shard) {
+        if (!this.shards.has(shard.path)) {
+            const promise = fetch(this.baseUrl + shard.path).then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+                return response.json();
+            });
+            // Failed downloads are retried on the next search
+            promise.catch(() => this.shards.delete(shard.path));
+            this.shards.set(shard.path, promise);
+        }
+        return (await this.shards.get(shard.path)).terms;
+    }
+
+    /**
+     * Document scores of all terms matching a query token
+     * @param {string} token - Unstemmed query token
+     * @param {boolean} prefix - Also match terms the token is a prefix of
+     * @returns {Promise<Map<number, number>>} Bundle row -> score
+     */
+    async matchToken(token, prefix) {
+        const term = this.stem(token);
+        const shards = await Promise.all(this.shardsFor(term).map(shard => this.loadShard(shard)));
+        const scores = new Map();
+        for (const terms of shards) {
+            for (const [candidate, postings] of Object.entries(terms)) {
+                const matches = candidate === term ||
+                    (prefix && (candidate.startsWith(token) || candidate.startsWith(term)));
+                if (!matches) {
+                    continue;
+                }
+                // Postings are (document delta, score) pairs
+                let doc = 0;
+                for (let i = 0; i < postings.length; i += 2) {
+                    doc += postings[i];
+                    scores.set(doc, Math.max(scores.get(doc) || 0, postings[i + 1]));
+                }
+            }
+        }
+        return scores;
+    }
+
+    /**
+     * Find the bundle rows matching every word of a query
+     *
+     * The last word is matched as a prefix while it is being typed.
+     * @param {string} query - Search box text
+     * @returns {Promise<Map<number, number>|null>} Bundle row -> relevance, or null if the query has no searchable words
+     */
+    async search(query) {
+        const tokens = this.tokenize(query);
+        if (tokens.length === 0) {
+            return null;
+        }
+        const typing = !/\s$/.test(query);
+        const matches = await Promise.all(tokens.map((token, index) =>
+            this.matchToken(token, typing && index === tokens.length - 1)
+        ));
+
+        // Smallest match first, so the intersection shrinks quickly
+        matches.sort((a, b) => a.size - b.size);
+        const results = new Map(matches[0]);
+        for (const scores of matches.slice(1)) {
+            for (const [doc, score] of results) {
+                if (scores.has(doc)) {
+                    results.set(doc, score + scores.get(doc));
+                } else {
+                    results.delete(doc);
+                }
+            }
+        }
+        return results;
+    }
+}
+
+// Global instance
+window.searchIndex = new SearchIndex();
@@ -2,15 +2,368 @@
 """
 Build script for E-Bike Compare static site
 
-This script builds the static website and copies it to the docs directory
-for GitHub Pages deployment.
+This script builds the static website into the docs directory for GitHub
+Pages deployment.
+
+The build is incremental: docs/.build-manifest.json records the content
+hash of every output, and only outputs whose content changed are written
+(sources are re-hashed only when their size or mtime changed). CSS and JS
+get content-hashed file names with the HTML references rewritten to
+match, so they can be cached as immutable. Text outputs get precompressed
+.gz (and .br, when brotli is installed) siblings. The data bundle and its
+search index shards are written by build_data_bundle().
 """
 
 import os
+import ast
+import csv
+import gzip
+import hashlib
+import json
+import posixpath
+import re
 import shutil
-import glob
+from datetime import datetime, timezone
 from pathlib import Path
 
+from search_index import build_search_index, check_tokenizer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Columns of the data bundle, in order, with their value types
+BUNDLE_COLUMNS = [
+    ("name", "string"),
+    ("price", "number"),
+    ("description", "string"),
+    ("battery", "string"),
+    ("motor_type", "string"),
+    ("max_speed", "string"),
+    ("range", "string"),
+    ("weight", "string"),
+    ("max_load", "string"),
+    ("images", "list"),
+    ("thumbnail", "string"),
+    ("website", "string"),
+    ("product_id", "string"),
+    # Same product on different websites (the crawler's cross-site matching)
+    ("canonical_id", "string"),
+    ("language", "string"),
+    ("url", "string"),
+    ("crawl_date", "string"),
+    # Normalized specs written by the crawler (canonical units)
+    ("battery_wh", "number"),
+    ("battery_wh_confidence", "string"),
+    ("range_km", "number"),
+    ("range_km_confidence", "string"),
+    ("max_speed_kmh", "number"),
+    ("max_speed_kmh_confidence", "string"),
+    ("weight_kg", "number"),
+    ("weight_kg_confidence", "string"),
+    ("max_load_kg", "number"),
+    ("max_load_kg_confidence", "string"),
+]
+BUNDLE_NAME = "bikes.json"
+DATED_CSV = re.compile(r"^(?P<site>.+)_(?P<date>\d{8})\.csv$")
+
+BUILD_MANIFEST = ".build-manifest.json"
+# Directories whose files get content-hashed names (main.css -> main.<hash>.css)
+HASHED_DIRS = ("css", "js")
+HASH_LENGTH = 10
+# Outputs that get .gz/.br siblings
+COMPRESSIBLE = {".html", ".css", ".js", ".json", ".csv", ".svg"}
+# href/src attribute values in HTML
+HTML_REFERENCE = re.compile(r"""(\b(?:href|src)\s*=\s*["'])([^"'#?]+)([^"']*["'])""")
+
+
+def find_latest_site_files(data_dir):
+    """Return the newest <site>_<YYYYMMDD>.csv file of every site, sorted by site."""
+    latest = {}
+    for csv_file in data_dir.glob("*.csv"):
+        match = DATED_CSV.match(csv_file.name)
+        if not match:
+            continue
+        site, date = match.group("site"), match.group("date")
+        if site not in latest or date > latest[site][0]:
+            latest[site] = (date, csv_file)
+    return [latest[site][1] for site in sorted(latest)]
+
+
+def convert_value(value, value_type):
+    """Convert a raw CSV string to the bundle's typed value (None when empty)."""
+    if value is None or value.strip() == "":
+        return None
+    if value_type == "number":
+        try:
+            return float(re.sub(r"[^\d.]", "", value.replace(",", "")))
+        except ValueError:
+            return None
+    if value_type == "list":
+        if value.startswith("["):
+            try:
+                return [str(item) for item in ast.literal_eval(value)]
+            except (ValueError, SyntaxError):
+                pass
+        return [item.strip() for item in value.split(",") if item.strip()]
+    return value
+
+
+def precompressed_names(path):
+    """Names of the precompressed siblings written for a file, by encoding."""
+    variants = {"gzip": path.name + ".gz"}
+    if brotli is not None:
+        variants["br"] = path.name + ".br"
+    return variants
+
+
+def write_precompressed(path, content=None):
+    """Write .gz (and .br when brotli is installed) siblings of a file."""
+    content = path.read_bytes() if content is None else content
+    variants = precompressed_names(path)
+    write_atomic(path.with_name(variants["gzip"]), gzip.compress(content, compresslevel=9, mtime=0))
+    if "br" in variants:
+        write_atomic(path.with_name(variants["br"]), brotli.compress(content, quality=11))
+    return variants
+
+
+def write_atomic(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(content)
+    os.replace(tmp_path, path)
+
+
+def hashed_name(rel_path, digest):
+    """css/main.css -> css/main.<hash>.css"""
+    stem, ext = posixpath.splitext(rel_path)
+    return f"{stem}.{digest[:HASH_LENGTH]}{ext}"
+
+
+class IncrementalBuild:
+    """
+    Writes outputs into the docs directory, skipping those whose content is unchanged.
+
+    Outputs are tracked by relative path in the build manifest with the
+    sha256 of their content; outputs of the previous build that are not
+    produced again are removed.
+    """
+
+    def __init__(self, docs_dir, base_dir):
+        self.docs_dir = docs_dir
+        self.base_dir = base_dir
+        manifest_path = docs_dir / BUILD_MANIFEST
+        try:
+            self.previous = json.loads(manifest_path.read_text())
+        except (OSError, ValueError):
+            self.previous = None
+        previous = self.previous or {}
+        self.previous_files = previous.get("files", {})
+        self.previous_sources = previous.get("sources", {})
+        self.files = {}
+        self.sources = {}
+        self.extra = {}
+        self.written = []
+        self.unchanged = 0
+
+    @property
+    def is_fresh(self):
+        """True when there is no usable manifest from a previous build."""
+        return self.previous is None
+
+    def source_digest(self, source):
+        """sha256 of a source file, reusing the previous hash while size and mtime are unchanged."""
+        key = source.relative_to(self.base_dir).as_posix()
+        stat = source.stat()
+        cached = self.previous_sources.get(key)
+        if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            digest = cached["sha256"]
+        else:
+            digest = hashlib.sha256(source.read_bytes()).hexdigest()
+        self.sources[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+        return digest
+
+    def add_file(self, rel_path, source):
+        """Copy a source file to `rel_path` unless the output already has its content."""
+        digest = self.source_digest(source)
+        self._place(rel_path, digest, source.read_bytes)
+
+    def add_bytes(self, rel_path, content):
+        self._place(rel_path, hashlib.sha256(content).hexdigest(), lambda: content)
+
+    def keep(self, rel_path):
+        """Carry over an output of the previous build without touching it."""
+        self.files[rel_path] = self.previous_files[rel_path]
+        self.unchanged += 1
+
+    def is_current(self, rel_path):
+        """True if the previous build wrote `rel_path` and it is still in place."""
+        entry = self.previous_files.get(rel_path)
+        if not entry or not (self.docs_dir / rel_path).exists():
+            return False
+        return all((self.docs_dir / posixpath.dirname(rel_path) / name).exists()
+                   for name in entry.get("encodings", {}).values())
+
+    def _place(self, rel_path, digest, read):
+        previous = self.previous_files.get(rel_path)
+        if previous and previous["sha256"] == digest and self.is_current(rel_path):
+            self.keep(rel_path)
+            return
+        path = self.docs_dir / rel_path
+        content = read()
+        write_atomic(path, content)
+        entry = {"sha256": digest, "size": len(content)}
+        if path.suffix in COMPRESSIBLE:
+            entry["encodings"] = write_precompressed(path, content)
+        self.files[rel_path] = entry
+        self.written.append(rel_path)
+
+    def finish(self):
+        """Remove stale outputs and write the build manifest. Returns the removed paths."""
+        removed = []
+        for rel_path, entry in self.previous_files.items():
+            if rel_path in self.files:
+                continue
+            directory = self.docs_dir / posixpath.dirname(rel_path)
+            for name in [posixpath.basename(rel_path)] + list(entry.get("encodings", {}).values()):
+                path = directory / name
+                if path.exists():
+                    path.unlink()
+            removed.append(rel_path)
+        manifest = {"version": 1, "files": self.files, "sources": self.sources, **self.extra}
+        write_atomic(self.docs_dir / BUILD_MANIFEST, json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"))
+        return removed
+
+
+def rewrite_references(html, html_rel_path, renamed):
+    """Point href/src attributes at the hashed names in `renamed` (source path -> output path)."""
+    base = posixpath.dirname(html_rel_path)
+
+    def replace(match):
+        url = match.group(2)
+        if "://" in url or url.startswith(("/", "data:", "mailto:")):
+            return match.group(0)
+        target = renamed.get(posixpath.normpath(posixpath.join(base, url)))
+        if target is None:
+            return match.group(0)
+        return match.group(1) + posixpath.relpath(target, base or ".") + match.group(3)
+
+    return HTML_REFERENCE.sub(replace, html)
+
+
+def build_data_bundle(data_dir, build):
+    """
+    Merge the latest CSV of every site into one typed, columnar JSON bundle.
+
+    Repetitive string columns (website, language, ...) are dictionary-encoded.
+    Writes bikes.<hash>.json with precompressed siblings and a small
+    manifest.json that the site fetches first (and revalidates on every
+    visit; the bundle itself never changes under its name), and the search
+    index shards over the same rows (see search_index.py). Unless the
+    source CSVs, the thumbnail map or the product matches changed, the
+    previous bundle is kept.
+
+    Args:
+        data_dir: Source data directory (the crawler's src/web/data)
+        build: IncrementalBuild writing into the docs directory
+
+    Returns:
+        The manifest dict, or None if there is no data
+    """
+    source_files = find_latest_site_files(data_dir)
+    if not source_files:
+        return None
+
+    thumbnails_file = data_dir / "thumbnails.json"
+    matches_file = data_dir / "matches.json"
+    inputs = {
+        f.name: build.source_digest(f) for f in source_files + [thumbnails_file, matches_file] if f.exists()
+    }
+    previous = (build.previous or {}).get("bundle")
+    if previous and previous["inputs"] == inputs and all(build.is_current(p) for p in previous["outputs"]):
+        for rel_path in previous["outputs"]:
+            build.keep(rel_path)
+        build.extra["bundle"] = previous
+        return json.loads((build.docs_dir / "data" / "manifest.json").read_text())
+
+    # Image URL -> thumbnail path, written by the crawler's image stage
+    thumbnails = json.loads(thumbnails_file.read_text()) if thumbnails_file.exists() else {}
+    # website|product_id -> canonical product ID, written by the crawler's matching stage
+    matches = json.loads(matches_file.read_text()) if matches_file.exists() else {}
+
+    columns = {name: [] for name, _ in BUNDLE_COLUMNS}
+    for csv_file in source_files:
+        with open(csv_file, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                for name, value_type in BUNDLE_COLUMNS:
+                    value = convert_value(row.get(name), value_type)
+                    if name == "thumbnail":
+                        images = convert_value(row.get("images"), "list") or []
+                        thumbnail = next((thumbnails[url] for url in images if url in thumbnails), None)
+                        value = f"data/thumbs/{thumbnail}" if thumbnail else None
+                    elif name == "canonical_id":
+                        value = matches.get(f"{row.get('website', '')}|{row.get('product_id', '')}")
+                    columns[name].append(value)
+
+    count = len(columns["name"])
+    column_specs = []
+    dictionaries = {}
+    data = []
+    for name, value_type in BUNDLE_COLUMNS:
+        values = columns[name]
+        spec = {"name": name, "type": value_type}
+        if value_type == "string":
+            distinct = sorted({v for v in values if v is not None})
+            if distinct and len(distinct) <= count // 2:
+                codes = {v: i for i, v in enumerate(distinct)}
+                spec["encoding"] = "dict"
+                dictionaries[name] = distinct
+                values = [codes[v] if v is not None else None for v in values]
+        column_specs.append(spec)
+        data.append(values)
+
+    bundle = {
+        "format": "ebike-bundle",
+        "version": 1,
+        "count": count,
+        "columns": column_specs,
+        "column_index": {name: i for i, (name, _) in enumerate(BUNDLE_COLUMNS)},
+        "dictionaries": dictionaries,
+        "data": data,
+    }
+    content = json.dumps(bundle, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    digest = hashlib.sha256(content).hexdigest()
+    bundle_rel = hashed_name(f"data/{BUNDLE_NAME}", digest)
+    build.add_bytes(bundle_rel, content)
+    search, search_paths = build_search_index(columns, count, build)
+
+    # An unchanged bundle keeps its timestamp, so manifest.json is not rewritten
+    generated_at = datetime.now(timezone.utc).isoformat()
+    previous_manifest = build.docs_dir / "data" / "manifest.json"
+    if previous and previous_manifest.exists():
+        old = json.loads(previous_manifest.read_text())
+        if old.get("bundle", {}).get("sha256") == digest and old.get("search") == search:
+            generated_at = old["generated_at"]
+
+    manifest = {
+        "version": 1,
+        "generated_at": generated_at,
+        "count": count,
+        "sources": [f.name for f in source_files],
+        "bundle": {
+            "path": posixpath.basename(bundle_rel),
+            "sha256": digest,
+            "size": len(content),
+            "encodings": precompressed_names(Path(bundle_rel)),
+        },
+        "search": search,
+    }
+    build.add_bytes("data/manifest.json", json.dumps(manifest, indent=2).encode("utf-8"))
+    build.extra["bundle"] = {"inputs": inputs, "outputs": [bundle_rel, *search_paths, "data/manifest.json"]}
+    return manifest
+
+
 def main():
     # Define paths
     base_dir = Path(__file__).parent.parent
@@ -19,58 +372,67 @@ def main():
     
     print("🏗️  Building E-Bike Compare static site...")
     
-    # Clean docs directory
-    if docs_dir.exists():
+    build = IncrementalBuild(docs_dir, base_dir)
+    if build.is_fresh and docs_dir.exists():
+        # No record of what a previous build wrote; start from scratch
         print("🧹 Cleaning docs directory...")
         shutil.rmtree(docs_dir)
-    
     docs_dir.mkdir(exist_ok=True)
     
-    # Copy web source files to docs
-    print("📁 Copying website files...")
-    
-    # Copy HTML files
-    for html_file in src_web_dir.glob("*.html"):
-        shutil.copy2(html_file, docs_dir)
-        print(f"   ✓ {html_file.name}")
+    print("📁 Building website files...")
     
-    # Copy CSS directory
-    css_src = src_web_dir / "css"
-    css_dest = docs_dir / "css"
-    if css_src.exists():
-        shutil.copytree(css_src, css_dest)
-        print(f"   ✓ css/ directory")
+    # CSS and JS get content-hashed names
+    renamed = {}
+    for directory in HASHED_DIRS:
+        for asset in sorted((src_web_dir / directory).rglob("*")):
+            if asset.is_file():
+                rel_path = asset.relative_to(src_web_dir).as_posix()
+                renamed[rel_path] = hashed_name(rel_path, build.source_digest(asset))
+                build.add_file(renamed[rel_path], asset)
     
-    # Copy JS directory
-    js_src = src_web_dir / "js"
-    js_dest = docs_dir / "js"
-    if js_src.exists():
-        shutil.copytree(js_src, js_dest)
-        print(f"   ✓ js/ directory")
+    # HTML keeps its name (it is the entry point) and references the hashed assets
+    for html_file in sorted(src_web_dir.glob("*.html")):
+        html = rewrite_references(html_file.read_text(encoding="utf-8"), html_file.name, renamed)
+        build.add_bytes(html_file.name, html.encode("utf-8"))
     
-    # Copy data directory (CSV files)
+    # Data files (CSVs, thumbnails) keep their names
     data_src = src_web_dir / "data"
-    data_dest = docs_dir / "data"
+    csv_count = 0
     if data_src.exists():
-        shutil.copytree(data_src, data_dest)
-        csv_count = len(list(data_dest.glob("*.csv")))
-        print(f"   ✓ data/ directory ({csv_count} CSV files)")
+        for data_file in sorted(data_src.rglob("*")):
+            if data_file.is_file():
+                build.add_file(f"data/{data_file.relative_to(data_src).as_posix()}", data_file)
+                csv_count += data_file.suffix == ".csv"
+    else:
+        print(f"   ⚠️  No data/ directory in {src_web_dir}")
+    
+    # The search index is only usable if the browser tokenizes queries like the index
+    problems = check_tokenizer(src_web_dir / "js" / "search.js")
+    if problems:
+        for problem in problems:
+            print(f"   ❌ {problem}")
+        raise SystemExit("Search tokenizers disagree (see TOKENIZER_FIXTURE in scripts/search_index.py)")
+    print("   ✓ Search tokenizers agree")
+    
+    # Precompile the data bundle the site loads instead of the raw CSVs
+    manifest = build_data_bundle(data_src, build)
+    if manifest:
+        size_kb = manifest["bundle"]["size"] // 1024
+        print(f"   ✓ data/{manifest['bundle']['path']} ({manifest['count']} bikes from "
+              f"{len(manifest['sources'])} sites, {csv_count} CSV files, {size_kb}KB)")
+        search = manifest["search"]
+        print(f"   ✓ data/search/ ({search['terms']} terms in {len(search['shards'])} shards)")
     else:
-        # Create empty data directory
-        data_dest.mkdir(exist_ok=True)
-        print(f"   ⚠️  data/ directory created (empty)")
+        print(f"   ⚠️  No CSV data found, skipping data bundle")
     
     # Create CNAME file for custom domain (if needed)
     # cname_file = docs_dir / "CNAME"
     # cname_file.write_text("your-domain.com\n")
     
     # Create .nojekyll file to prevent Jekyll processing
-    nojekyll_file = docs_dir / ".nojekyll"
-    nojekyll_file.touch()
-    print(f"   ✓ .nojekyll file created")
+    build.add_bytes(".nojekyll", b"")
     
     # Create basic README for docs folder
-    readme_file = docs_dir / "README.md"
     readme_content = """# E-Bike Compare - GitHub Pages Site
 
 This directory contains the built static website for GitHub Pages deployment.
@@ -83,7 +445,7 @@ Edit source files in `src/web/` instead.
 ## How it works
 
 1. Source files are in `src/web/`
-2. Build script (`scripts/build.py`) copies them here
+2. Build script (`scripts/build.py`) writes them here, with content-hashed CSS/JS names
 3. GitHub Pages serves from this `docs/` directory
 4. Crawlers update CSV data files automatically via GitHub Actions
 
@@ -98,24 +460,24 @@ python -m http.server 8000
 
 Then visit http://localhost:8000
 """
-    readme_file.write_text(readme_content)
-    print(f"   ✓ README.md created")
+    build.add_bytes("README.md", readme_content.encode("utf-8"))
+    
+    removed = build.finish()
     
     print("\n✅ Build completed successfully!")
     print(f"📦 Built site is in: {docs_dir}")
-    print(f"🌐 Total files: {len(list(docs_dir.rglob('*')))}")
+    print(f"🌐 {len(build.files)} files: {len(build.written)} written, {build.unchanged} unchanged, "
+          f"{len(removed)} removed")
     
-    # Print file structure
-    print("\n📋 File structure:")
-    for item in sorted(docs_dir.rglob('*')):
-        if item.is_file():
-            rel_path = item.relative_to(docs_dir)
-            size = item.stat().st_size
-            if size > 1024:
-                size_str = f"{size // 1024}KB"
-            else:
-                size_str = f"{size}B"
-            print(f"   {rel_path} ({size_str})")
+    # Print what changed
+    if build.written or removed:
+        print("\n📋 Changes:")
+    for rel_path in build.written:
+        size = build.files[rel_path]["size"]
+        size_str = f"{size // 1024}KB" if size > 1024 else f"{size}B"
+        print(f"   + {rel_path} ({size_str})")
+    for rel_path in removed:
+        print(f"   - {rel_path}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
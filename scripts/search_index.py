@@ -0,0 +1,244 @@
+"""
+Prebuilt full-text search index for the static site.
+
+Built from the data bundle's columns, so result document numbers are rows
+of the bundle. Terms come from the name, website, description and spec
+text of every row, plus tokens for the normalized specs ("750wh", "25kmh").
+Text is folded to lowercase ASCII, split into alphanumeric tokens, stripped
+of stopwords and lightly stemmed; js/search.js applies the same steps to
+the query and must be kept in sync with tokenize() and stem(). Stopwords
+and the FOLDING table are shipped to it in the manifest, and every build
+checks both tokenizers against TOKENIZER_FIXTURE (check_tokenizer()).
+
+Terms are grouped by their first PREFIX_LENGTH characters, and consecutive
+groups are packed into shards of about SHARD_TARGET_BYTES:
+
+    data/search/<first key>.<hash>.json   {"terms": {term: postings}}
+
+A shard holds every term of its keys, so a query term and any word it is
+a prefix of (when typing) are found in one small request. Postings are a
+flat list of (document delta, score) pairs. The shard list is part of
+data/manifest.json.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import unicodedata
+from collections import defaultdict
+
+PREFIX_LENGTH = 2
+SHARD_TARGET_BYTES = 8 * 1024
+# Score of one occurrence of a term per field; occurrences beyond
+# MAX_OCCURRENCES in a field do not add more
+FIELD_WEIGHTS = {
+    "name": 4,
+    "website": 3,
+    "battery": 2,
+    "motor_type": 2,
+    "max_speed": 2,
+    "range": 2,
+    "weight": 2,
+    "max_load": 2,
+    "description": 1,
+}
+SPEC_WEIGHT = 2
+MAX_OCCURRENCES = 3
+# Normalized spec column -> unit suffix of its search token
+SPEC_TOKENS = {
+    "battery_wh": "wh",
+    "range_km": "km",
+    "max_speed_kmh": "kmh",
+    "weight_kg": "kg",
+    "max_load_kg": "kg",
+}
+STOPWORDS = sorted({
+    # English
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "can", "for", "from", "has", "have", "in",
+    "is", "it", "its", "of", "on", "or", "our", "so", "that", "the", "their", "there", "this", "to",
+    "we", "will", "with", "you", "your",
+    # German
+    "auf", "aus", "bei", "das", "dem", "den", "der", "die", "ein", "eine", "einem", "einen", "einer",
+    "es", "fur", "ist", "im", "mit", "sich", "sie", "und", "von", "wie", "zu", "zum", "zur",
+})
+# (suffix, replacement), first match wins; see stem()
+SUFFIXES = (("ies", "y"), ("ing", ""), ("ed", ""), ("s", ""))
+# Lowercase letters NFKD does not decompose into ASCII plus marks; see fold()
+FOLDING = {
+    "ß": "ss", "æ": "ae", "œ": "oe", "ø": "o", "ł": "l", "đ": "d", "ð": "d", "þ": "th",
+    "ħ": "h", "ı": "i", "ŧ": "t", "ŋ": "n",
+}
+# (text, search terms) that tokenize() and js/search.js must agree on
+TOKENIZER_FIXTURE = [
+    ("Fahrräder für die Straße", ["fahrrader", "strasse"]),
+    ("GROẞE Räder", ["grosse", "rader"]),
+    ("Ærø Øresund", ["aero", "oresund"]),
+    ("Łódź Wrocław", ["lodz", "wroclaw"]),
+    ("Œuvre Þórr Đorđe", ["oeuvre", "thorr", "dorde"]),
+    ("İstanbul ıssız", ["istanbul", "issiz"]),
+    ("ﬁets E‑Bike 750Wh", ["fiet", "bike", "750wh"]),
+]
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = set(STOPWORDS)
+_FOLDING = str.maketrans(FOLDING)
+
+# Runs js/search.js under node: fixture texts on stdin, search terms on stdout
+_NODE_TOKENIZE = """
+const fs = require('fs');
+const vm = require('vm');
+const input = JSON.parse(fs.readFileSync(0, 'utf8'));
+const context = {window: {}};
+vm.runInNewContext(fs.readFileSync(process.argv[1], 'utf8') + '\\nwindow.SearchIndex = SearchIndex;', context);
+const index = new context.window.SearchIndex();
+index.configure({search: input.config});
+process.stdout.write(JSON.stringify(input.texts.map(text => index.tokenize(text).map(token => index.stem(token)))));
+"""
+
+
+def fold(text):
+    """
+    Lowercase, strip accents and fold the letters in FOLDING
+    (e-bike -> e bike, Fahrräder -> fahrrader, Straße -> strasse).
+    """
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.category(c).startswith("M")).translate(_FOLDING)
+
+
+def stem(token):
+    """Light suffix stemming: batteries -> battery, folding -> fold, bikes -> bike."""
+    if len(token) <= 4 or not token.isalpha() or token.endswith("ss"):
+        return token
+    for suffix, replacement in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)] + replacement
+    return token
+
+
+def tokenize(text):
+    """Search terms of a text, in order, with repeats."""
+    terms = []
+    for token in _TOKEN.findall(fold(text or "")):
+        if token in _STOPWORDS or (len(token) == 1 and not token.isdigit()):
+            continue
+        terms.append(stem(token))
+    return terms
+
+
+def check_tokenizer(search_js=None):
+    """
+    Problems found running tokenize(), and js/search.js if node is
+    installed, over TOKENIZER_FIXTURE; an empty list if both agree with it.
+    """
+    expected = [terms for _, terms in TOKENIZER_FIXTURE]
+    results = {"tokenize()": [tokenize(text) for text, _ in TOKENIZER_FIXTURE]}
+    if search_js is not None and os.path.exists(search_js) and shutil.which("node"):
+        config = {"version": 1, "stopwords": STOPWORDS, "folding": FOLDING, "prefix_length": PREFIX_LENGTH,
+                  "shards": []}
+        payload = json.dumps({"config": config, "texts": [text for text, _ in TOKENIZER_FIXTURE]})
+        try:
+            output = subprocess.run(["node", "-e", _NODE_TOKENIZE, str(search_js)], input=payload, capture_output=True,
+                                    text=True, encoding="utf-8", check=True).stdout
+            results[str(search_js)] = json.loads(output)
+        except (OSError, ValueError, subprocess.CalledProcessError) as e:
+            return [f"{search_js}: could not run the tokenizer ({e})"]
+
+    problems = []
+    for source, terms in results.items():
+        for (text, want), got in zip(TOKENIZER_FIXTURE, terms):
+            if got != want:
+                problems.append(f"{source}: {text!r} -> {got}, expected {want}")
+    return problems
+
+
+def prefix_key(term):
+    return term[:PREFIX_LENGTH]
+
+
+def _spec_token(value, unit):
+    return f"{int(round(value))}{unit}"
+
+
+def index_documents(columns, count):
+    """term -> {document: score} over the bundle's (decoded) columns."""
+    index = defaultdict(dict)
+    for doc in range(count):
+        scores = defaultdict(int)
+        for field, weight in FIELD_WEIGHTS.items():
+            occurrences = defaultdict(int)
+            for term in tokenize(columns.get(field, [None] * count)[doc]):
+                occurrences[term] += 1
+            for term, n in occurrences.items():
+                scores[term] += weight * min(n, MAX_OCCURRENCES)
+        for column, unit in SPEC_TOKENS.items():
+            value = columns.get(column, [None] * count)[doc]
+            if value is not None:
+                scores[_spec_token(value, unit)] += SPEC_WEIGHT
+        for term, score in scores.items():
+            index[term][doc] = score
+    return index
+
+
+def encode_postings(postings):
+    """{document: score} -> [first document, score, delta, score, ...]"""
+    encoded = []
+    previous = 0
+    for doc in sorted(postings):
+        encoded.extend((doc - previous, postings[doc]))
+        previous = doc
+    return encoded
+
+
+def build_search_index(columns, count, build):
+    """
+    Write the search shards for the bundle's columns.
+
+    Args:
+        columns: Column name -> list of decoded values, one per bundle row
+        count: Number of rows
+        build: IncrementalBuild writing into the docs directory
+
+    Returns:
+        (manifest entry, relative paths of the shard files)
+    """
+    index = index_documents(columns, count)
+    groups = defaultdict(dict)
+    for term in sorted(index):
+        groups[prefix_key(term)][term] = encode_postings(index[term])
+
+    shards = []
+    current, size = {}, 0
+    for key in sorted(groups):
+        current[key] = groups[key]
+        size += len(json.dumps(groups[key], separators=(",", ":")))
+        if size >= SHARD_TARGET_BYTES:
+            shards.append(current)
+            current, size = {}, 0
+    if current:
+        shards.append(current)
+
+    entries = []
+    paths = []
+    for shard in shards:
+        keys = sorted(shard)
+        terms = {term: postings for key in keys for term, postings in shard[key].items()}
+        content = json.dumps({"terms": terms}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        digest = hashlib.sha256(content).hexdigest()[:10]
+        rel_path = f"data/search/{keys[0]}.{digest}.json"
+        build.add_bytes(rel_path, content)
+        entries.append({"first": keys[0], "last": keys[-1], "path": rel_path[len("data/"):], "size": len(content)})
+        paths.append(rel_path)
+
+    manifest = {
+        "version": 1,
+        "documents": count,
+        "terms": len(index),
+        "prefix_length": PREFIX_LENGTH,
+        "stopwords": STOPWORDS,
+        "folding": FOLDING,
+        "shards": entries,
+    }
+    return manifest, paths
@@ -5,7 +5,7 @@ This package contains crawlers for various e-bike manufacturer websites.
 Designed to run in GitHub Actions for automated data collection.
 """
 
-from .crawler import run_crawler
+from .crawler import merge_shards, replay_archive, run_crawler, run_shard
 
 __version__ = "2.0.0"
-__all__ = ['run_crawler'] 
\ No newline at end of file
+__all__ = ['run_crawler', 'run_shard', 'merge_shards', 'replay_archive'] 
\ No newline at end of file
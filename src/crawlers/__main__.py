@@ -0,0 +1,42 @@
+"""
+Command line entry point of the crawler package.
+
+    python -m src.crawlers crawl [--sites a,b] [--shard I/N] ...
+    python -m src.crawlers merge [SHARD_DIR] [--images]
+    python -m src.crawlers history ...
+    python -m src.crawlers price-index ...
+    python -m src.crawlers match [--show]
+    python -m src.crawlers normalize [--data DIR]
+    python -m src.crawlers replay [--since YYYY-MM-DD] [--until YYYY-MM-DD] [--sites a,b]
+
+Each command takes the options of the module it runs; see `<command> --help`.
+"""
+
+import sys
+from typing import List, Optional
+
+from . import crawler, history, matching, normalize, price_index
+
+COMMANDS = {
+    "crawl": crawler.main,
+    "merge": crawler.merge_main,
+    "history": history.main,
+    "price-index": price_index.main,
+    "match": matching.main,
+    "normalize": normalize.main,
+    "replay": crawler.replay_main,
+}
+
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in COMMANDS:
+        print(f"usage: python -m src.crawlers {{{','.join(COMMANDS)}}} ...", file=sys.stderr)
+        sys.exit(2)
+    # Show the full command in usage and error messages
+    sys.argv[0] = f"python -m src.crawlers {argv[0]}"
+    COMMANDS[argv[0]](argv[1:])
+
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,51 @@ Website configurations for e-bike crawlers.
 
 This configuration defines websites to crawl, their URL patterns,
 and CSS selectors for extracting product data.
+
+Optional per-website crawl tuning keys:
+    concurrency: Maximum number of product requests in flight (default 4)
+    max_products: Cap on products crawled per run (default: no cap)
+    discovery.max_pages: Cap on listing pages followed (default: no cap)
+    discovery.sitemap: Sitemap or sitemap index URL to discover products from
+        instead of the listing pages; products whose <lastmod> is newer than
+        their last crawl are queued first
+    discovery.sitemap_filter: Regex selecting which nested sitemaps of an
+        index to follow (default: all)
+    parse_only: SoupStrainer keyword arguments limiting product page parsing to
+        the subtree holding the selectors, e.g. {"name": "main"}; pages where
+        it yields no product name are parsed in full
+    politeness: Per-host pacing overrides for the site's hosts, e.g.
+        {"initial_delay": 2, "min_delay": 1, "max_delay": 60}. Keys and
+        defaults are in politeness.DEFAULT_POLICY; robots.txt Crawl-delay
+        is always honored as the lower bound unless respect_robots is False.
+    structured_source: Read product data from structured JSON instead of
+        scraping HTML (see structured.py), with the selectors as fallback:
+            catalog: Bulk catalog type ("shopify")
+            catalog_url: Paginated catalog endpoint, e.g. a collection's
+                products.json; replaces discovery and product page fetches
+            product_types: Optional catalog product types to keep
+            json_ld: Read fetched product pages from their JSON-LD Product
 """
 
+# Fallback selectors for Shopify storefronts (Dawn-based themes), used when
+# neither the catalog nor the product page JSON-LD yields the product
+SHOPIFY_SELECTORS = {
+    "name": ".product__title h1, h1.product__title, h1",
+    "price": ".price__sale .price-item--sale, .price__regular .price-item--regular, .product__price",
+    "description": ".product__description",
+    "battery": ".product__description li:contains('Battery'), td:contains('Battery') + td",
+    "motor_type": ".product__description li:contains('Motor'), td:contains('Motor') + td",
+    "max_speed": ".product__description li:contains('Speed'), td:contains('Speed') + td",
+    "range": ".product__description li:contains('Range'), td:contains('Range') + td",
+    "weight": ".product__description li:contains('Weight'), td:contains('Weight') + td",
+    "max_load": ".product__description li:contains('Payload'), td:contains('Payload') + td",
+    "images": ".product__media img"
+}
+
+# Dawn-based themes render the product title, price, description and media
+# inside <main id="MainContent">; header, navigation and footer are skipped
+SHOPIFY_PARSE_ONLY = {"name": "main"}
+
 WEBSITES = {
     "trek_international": {
         "name": "Trek International",
@@ -74,5 +117,113 @@ WEBSITES = {
             "max_load": ".specs .spec-item:contains('Capacity') .spec-value, td:contains('Capacity') + td",
             "images": "img.cms-image"
         }
+    },
+    "aventon": {
+        "name": "Aventon",
+        "base_url": "https://www.aventon.com",
+        "product_url_template": "https://www.aventon.com/products/{product_id}",
+        "languages": ["en-US"],
+        "structured_source": {
+            "catalog": "shopify",
+            "catalog_url": "https://www.aventon.com/collections/ebikes/products.json",
+            "json_ld": True
+        },
+        "discovery": {
+            "url": "https://www.aventon.com/collections/ebikes",
+            "product_link_selector": "a[href*='/products/']",
+            "pagination_selector": "a[rel='next'], .pagination .next a"
+        },
+        "selectors": SHOPIFY_SELECTORS,
+        "parse_only": SHOPIFY_PARSE_ONLY
+    },
+    "lectric_ebikes": {
+        "name": "Lectric eBikes",
+        "base_url": "https://lectricebikes.com",
+        "product_url_template": "https://lectricebikes.com/products/{product_id}",
+        "languages": ["en-US"],
+        "structured_source": {
+            "catalog": "shopify",
+            "catalog_url": "https://lectricebikes.com/collections/ebikes/products.json",
+            "json_ld": True
+        },
+        "discovery": {
+            "url": "https://lectricebikes.com/collections/ebikes",
+            "product_link_selector": "a[href*='/products/']",
+            "pagination_selector": "a[rel='next'], .pagination .next a"
+        },
+        "selectors": SHOPIFY_SELECTORS,
+        "parse_only": SHOPIFY_PARSE_ONLY
+    },
+    "engwe_us": {
+        "name": "Engwe US",
+        "base_url": "https://engwe-bikes.com",
+        "product_url_template": "https://engwe-bikes.com/collections/all-ebikes/products/{product_id}",
+        "languages": ["en-US"],
+        "structured_source": {
+            "catalog": "shopify",
+            "catalog_url": "https://engwe-bikes.com/collections/all-ebikes/products.json",
+            "json_ld": True
+        },
+        "discovery": {
+            "url": "https://engwe-bikes.com/collections/all-ebikes",
+            "product_link_selector": "a[href*='/products/']",
+            "pagination_selector": "a[rel='next'], .pagination .next a"
+        },
+        "selectors": SHOPIFY_SELECTORS,
+        "parse_only": SHOPIFY_PARSE_ONLY
+    },
+    "engwe_eu": {
+        "name": "Engwe EU",
+        "base_url": "https://engwe-bikes-eu.com",
+        "product_url_template": "https://engwe-bikes-eu.com/products/{product_id}",
+        "languages": ["en-GB"],
+        "structured_source": {
+            "catalog": "shopify",
+            "catalog_url": "https://engwe-bikes-eu.com/collections/e-bikes/products.json",
+            "json_ld": True
+        },
+        "discovery": {
+            "url": "https://engwe-bikes-eu.com/collections/e-bikes",
+            "product_link_selector": "a[href*='/products/']",
+            "pagination_selector": "a[rel='next'], .pagination .next a"
+        },
+        "selectors": SHOPIFY_SELECTORS,
+        "parse_only": SHOPIFY_PARSE_ONLY
+    },
+    "rad_power_bikes_us": {
+        "name": "Rad Power Bikes (US)",
+        "base_url": "https://www.radpowerbikes.com",
+        "product_url_template": "https://www.radpowerbikes.com/products/{product_id}",
+        "languages": ["en-US"],
+        "structured_source": {
+            "catalog": "shopify",
+            "catalog_url": "https://www.radpowerbikes.com/collections/electric-bikes/products.json",
+            "json_ld": True
+        },
+        "discovery": {
+            "url": "https://www.radpowerbikes.com/collections/electric-bikes",
+            "product_link_selector": "a[href*='/products/']",
+            "pagination_selector": "a[rel='next'], .pagination .next a"
+        },
+        "selectors": SHOPIFY_SELECTORS,
+        "parse_only": SHOPIFY_PARSE_ONLY
+    },
+    "fiido": {
+        "name": "Fiido",
+        "base_url": "https://fiido.com",
+        "product_url_template": "https://fiido.com/products/{product_id}",
+        "languages": ["en-US"],
+        "structured_source": {
+            "catalog": "shopify",
+            "catalog_url": "https://fiido.com/collections/e-bikes/products.json",
+            "json_ld": True
+        },
+        "discovery": {
+            "url": "https://fiido.com/collections/e-bikes",
+            "product_link_selector": "a[href*='/products/']",
+            "pagination_selector": "a[rel='next'], .pagination .next a"
+        },
+        "selectors": SHOPIFY_SELECTORS,
+        "parse_only": SHOPIFY_PARSE_ONLY
     }
-} 
\ No newline at end of file
+}
@@ -6,24 +6,49 @@ It fetches e-bike data from manufacturer websites and saves to CSV files.
 """
 
 import os
+import argparse
 import csv
 import json
 import time
 import logging
 import datetime
 import re
-import hashlib
+import shutil
+import sys
 import requests
 from pathlib import Path
-from typing import Dict, List, Any, Optional
-import shutil
+from typing import Callable, Dict, List, Any, Iterable, Iterator, NamedTuple, Optional, Tuple
+import threading
+from collections import deque
+from itertools import islice
+from concurrent.futures import Future, ThreadPoolExecutor
 from urllib.parse import urlparse, urljoin
 
-from bs4 import BeautifulSoup
-import pandas as pd
+from bs4 import BeautifulSoup, SoupStrainer
 
 # Import website configurations
 from .config.websites import WEBSITES
+from .http_cache import CachedResponse, CachedSession, ResponseCache, DEFAULT_CACHE_MAX_BYTES
+from .extraction import get_plan, make_soup, product_record
+from .incremental import (
+    FingerprintStore, extraction_fingerprint, fingerprint, has_changes, record_fingerprint, write_change_feed,
+)
+from .frontier import CrawlFrontier
+from .history import HistoryStore
+from .price_index import PriceIndex
+from .images import ImageStore, generate_thumbnails, process_images
+from .politeness import PolitenessScheduler
+from .structured import read_catalog
+from .sitemap import iter_sitemap, prioritize
+from .metrics import METRICS, ThreadProfiler, current_site, site_scope, timed
+from .writer import RecordWriter
+from .matching import update_matches
+from .pipeline import ParsePool, default_parse_workers
+from .page_archive import ArchiveEntry, PageArchive
+from .shards import (
+    ShardWriter, check_gaps, frontier_path, merge_records, parse_shard, plan_shards, product_part, read_manifests,
+    save_frontiers, saved_splits, site_weights,
+)
 
 # Configure logging for GitHub Actions
 logging.basicConfig(
@@ -36,44 +61,168 @@ logger = logging.getLogger("ebike_crawler")
 # Define paths relative to repository root
 BASE_DIR = Path(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 CURRENT_DATA_DIR = BASE_DIR / "data" / "current"
-ARCHIVE_DATA_DIR = BASE_DIR / "data" / "archive"
+HISTORY_DIR = BASE_DIR / "data" / "history"
+PRICE_INDEX_DIR = BASE_DIR / "data" / "price_index"
+IMAGE_DIR = BASE_DIR / "data" / "images"
 WEB_DATA_DIR = BASE_DIR / "src" / "web" / "data"
+THUMBNAIL_DIR = WEB_DATA_DIR / "thumbs"
+HTTP_CACHE_DIR = BASE_DIR / ".cache" / "http"
+STATE_DIR = BASE_DIR / "data" / "state"
+CHANGES_DIR = BASE_DIR / "data" / "changes"
+FRONTIER_DB = STATE_DIR / "frontier.sqlite"
+METRICS_DIR = BASE_DIR / "data" / "metrics"
+SHARD_OUTPUT_DIR = BASE_DIR / "data" / "shards"
+SHARD_FRONTIER_DIR = STATE_DIR / "shard_frontiers"
+MATCH_INDEX_DIR = STATE_DIR / "matching"
+PAGE_ARCHIVE_DIR = BASE_DIR / "data" / "pages"
+REPLAY_DIR = BASE_DIR / "data" / "replay"
+
+# Concurrency limits: number of websites crawled in parallel, and the default
+# number of in-flight product requests per website (override per site with
+# the "concurrency" key in WEBSITES).
+MAX_PARALLEL_SITES = 4
+DEFAULT_SITE_CONCURRENCY = 4
+
+# Wall-clock deadline (time.monotonic()) after which no new product pages are
+# fetched; unfinished work stays in the frontier for the next --resume run.
+_deadline: Optional[float] = None
+
+_http_session: Optional[CachedSession] = None
+_http_session_lock = threading.Lock()
+
+_politeness: Optional[PolitenessScheduler] = None
+_politeness_lock = threading.Lock()
+
+# Parsing stage of the current run (see pipeline.py); outside of a run,
+# pages are parsed in the thread that fetched them.
+_parse_pool: Optional[ParsePool] = None
+_INLINE_PARSE_POOL = ParsePool()
+
+# Archive of every page fetched in the current run (see page_archive.py)
+_page_archive: Optional[PageArchive] = None
+
+def get_http_session() -> CachedSession:
+    """Return the shared pooled HTTP session, creating it on first use."""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            cache_max_bytes = int(os.environ.get("EBIKE_HTTP_CACHE_MAX_BYTES", DEFAULT_CACHE_MAX_BYTES))
+            cache = ResponseCache(HTTP_CACHE_DIR, max_bytes=cache_max_bytes)
+            pool_size = MAX_PARALLEL_SITES * max(
+                [DEFAULT_SITE_CONCURRENCY] + [config.get("concurrency", 0) for config in WEBSITES.values()]
+            )
+            _http_session = CachedSession(cache, pool_size=pool_size)
+        return _http_session
+
+def time_budget_exhausted() -> bool:
+    """Return True once the run's --max-runtime budget is used up."""
+    return _deadline is not None and time.monotonic() >= _deadline
 
 def setup_directories():
     """Ensure all required directories exist."""
     CURRENT_DATA_DIR.mkdir(parents=True, exist_ok=True)
-    ARCHIVE_DATA_DIR.mkdir(parents=True, exist_ok=True)
+    HISTORY_DIR.mkdir(parents=True, exist_ok=True)
     WEB_DATA_DIR.mkdir(parents=True, exist_ok=True)
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    CHANGES_DIR.mkdir(parents=True, exist_ok=True)
 
-def get_soup(url: str, retries: int = 3, delay: int = 2) -> Optional[BeautifulSoup]:
+def get_politeness() -> PolitenessScheduler:
+    """Return the shared per-host politeness scheduler, configured from WEBSITES."""
+    global _politeness
+    session = get_http_session()
+    with _politeness_lock:
+        if _politeness is None:
+            scheduler = PolitenessScheduler(session.session)
+            for config in WEBSITES.values():
+                for url in (config["base_url"], config["product_url_template"],
+                            config.get("discovery", {}).get("url", "")):
+                    if url:
+                        scheduler.configure(url, config.get("politeness"))
+            _politeness = scheduler
+        return _politeness
+
+def fetch_page(url: str, retries: int = 3, kind: str = "page") -> Optional[CachedResponse]:
     """
-    Fetch HTML content from a URL and parse it with BeautifulSoup.
+    Fetch a URL through the shared pooled session.
+    
+    Connections are reused and unchanged pages are served from the local
+    cache on a 304. Requests are paced by the host's politeness scheduler,
+    and failed attempts are retried with jittered exponential backoff
+    (longer if the server sent Retry-After).
     
     Args:
         url: URL to fetch
-        retries: Number of retry attempts
-        delay: Delay between retries in seconds
+        retries: Number of attempts
+        kind: Kind of the page in the page archive ("product" for product pages)
         
     Returns:
-        BeautifulSoup object or None if failed
+        Response object or None if failed
     """
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
+    session = get_http_session()
+    politeness = get_politeness()
     
     for attempt in range(retries):
+        with METRICS.span("politeness_wait"):
+            politeness.wait(url)
+        started = time.monotonic()
+        if attempt:
+            METRICS.inc("http_retries_total")
         try:
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            return BeautifulSoup(response.text, "html.parser")
+            with METRICS.span("http_request"):
+                response = session.get(url, timeout=10)
         except requests.RequestException as e:
+            error_response = getattr(e, "response", None)
+            status = error_response.status_code if error_response is not None else None
+            headers = error_response.headers if error_response is not None else None
+            METRICS.inc("http_requests_total", status=status or "error")
+            retry_after = politeness.record(url, time.monotonic() - started, status, headers)
             logger.warning(f"Attempt {attempt+1}/{retries} failed for {url}: {e}")
+            if status is not None and status < 500 and status not in (408, 429):
+                break  # Client errors will not go away by retrying
             if attempt < retries - 1:
-                time.sleep(delay)
+                with METRICS.span("retry_backoff"):
+                    time.sleep(politeness.backoff(url, attempt, retry_after))
+            continue
+        METRICS.inc("http_requests_total", status=response.status_code)
+        METRICS.inc("http_response_bytes_total", len(response.content))
+        if response.from_cache:
+            METRICS.inc("http_cache_hits_total")
+        politeness.record(url, time.monotonic() - started, response.status_code)
+        archive_page(url, response, kind)
+        return response
     
-    logger.error(f"Failed to fetch {url} after {retries} attempts")
+    logger.error(f"Failed to fetch {url} after {attempt+1} attempts")
     return None
 
+def archive_page(url: str, response: CachedResponse, kind: str = "page"):
+    """Add a fetched page to the run's page archive, if the run keeps one."""
+    if _page_archive is None:
+        return
+    try:
+        with METRICS.span("archive_page"):
+            _page_archive.add(current_site(), url, response.content, response.status_code, response.encoding, kind)
+    except Exception as e:
+        logger.warning(f"Could not archive {url}: {e}")
+
+@timed()
+def get_soup(url: str, retries: int = 3,
+             parse_only: Optional[SoupStrainer] = None) -> Optional[BeautifulSoup]:
+    """
+    Fetch HTML content from a URL and parse it with BeautifulSoup.
+    
+    Args:
+        url: URL to fetch
+        retries: Number of attempts
+        parse_only: Optional SoupStrainer limiting which elements are parsed
+        
+    Returns:
+        BeautifulSoup object or None if failed
+    """
+    response = fetch_page(url, retries=retries)
+    if response is None:
+        return None
+    return make_soup(response.text, parse_only=parse_only)
+
 def extract_text(soup: BeautifulSoup, selector: str) -> str:
     """Extract text from an element using a CSS selector."""
     element = soup.select_one(selector)
@@ -138,9 +287,57 @@ def extract_product_id_from_url(url: str, base_url: str, product_url_template: s
     logger.warning(f"Could not extract product ID from {url}")
     return None
 
-def discover_product_ids(website_config: Dict[str, Any]) -> List[str]:
+def _last_crawled(website_config: Dict[str, Any], fingerprints: Optional[FingerprintStore],
+                  product_id: str) -> Optional[datetime.datetime]:
+    """When a product was last crawled, from its stored record."""
+    if not fingerprints:
+        return None
+    entry = fingerprints.lookup(build_product_url(website_config, product_id, website_config["languages"][0]))
+    crawl_date = entry["record"].get("crawl_date") if entry else None
+    if not crawl_date:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(crawl_date).astimezone(datetime.timezone.utc)
+    except ValueError:
+        return None
+
+def discover_from_sitemap(website_config: Dict[str, Any],
+                          fingerprints: Optional[FingerprintStore] = None) -> List[str]:
+    """
+    Discover product IDs from the website's sitemap, changed products first.
+    
+    Sitemaps are streamed, so memory stays flat however many URLs they list.
+    Only URLs matching the product URL template are kept; their <lastmod>
+    is compared to the last crawl of each product to order the queue.
     """
-    Discover product IDs by crawling product listing pages.
+    discovery_config = website_config["discovery"]
+    base_url = website_config["base_url"]
+    product_url_template = website_config["product_url_template"]
+    template_prefix = urlparse(product_url_template).path.split("{product_id}")[0]
+    politeness = get_politeness()
+    
+    entries = {}
+    for entry in iter_sitemap(discovery_config["sitemap"], get_http_session().session,
+                              sitemap_filter=discovery_config.get("sitemap_filter"),
+                              before_request=politeness.wait):
+        if template_prefix not in entry.loc:
+            continue
+        product_id = extract_product_id_from_url(entry.loc, base_url, product_url_template)
+        if product_id and product_id not in entries:
+            entries[product_id] = entry.lastmod
+    
+    logger.info(f"Found {len(entries)} product URLs in the sitemap of {website_config['name']}")
+    return prioritize(entries.items(), lambda product_id: _last_crawled(website_config, fingerprints, product_id))
+
+@timed()
+def discover_product_ids(website_config: Dict[str, Any],
+                         fingerprints: Optional[FingerprintStore] = None) -> List[str]:
+    """
+    Discover product IDs from the sitemap, or by crawling product listing pages.
+    
+    Websites with "discovery.sitemap" are discovered from it (falling back to
+    the listing pages if it yields nothing), ordered so that products changed
+    since their last crawl come first.
     """
     product_ids = set()
     discovery_config = website_config.get("discovery", {})
@@ -149,6 +346,12 @@ def discover_product_ids(website_config: Dict[str, Any]) -> List[str]:
         logger.warning(f"No discovery configuration found for {website_config['name']}")
         return []
     
+    if discovery_config.get("sitemap"):
+        sitemap_ids = discover_from_sitemap(website_config, fingerprints)
+        if sitemap_ids:
+            return sitemap_ids
+        logger.warning(f"No products found in the sitemap of {website_config['name']}, using listing pages")
+    
     discovery_url = discovery_config.get("url")
     if not discovery_url:
         logger.warning(f"No discovery URL found for {website_config['name']}")
@@ -162,7 +365,7 @@ def discover_product_ids(website_config: Dict[str, Any]) -> List[str]:
     logger.debug(f"Starting discovery for {website_config['name']} with URL: {discovery_url}")
     
     pagination_selector = discovery_config.get("pagination_selector")
-    max_pages = 5  # Reduced for GitHub Actions
+    max_pages = discovery_config.get("max_pages")  # None means follow pagination to the end
     pages_crawled = 0
     current_url = discovery_url
     
@@ -171,7 +374,14 @@ def discover_product_ids(website_config: Dict[str, Any]) -> List[str]:
     
     logger.info(f"Starting product discovery for {website_config['name']} at {discovery_url}")
     
-    while current_url and pages_crawled < max_pages:
+    visited = set()
+    
+    while current_url and (max_pages is None or pages_crawled < max_pages):
+        if current_url in visited:
+            logger.debug(f"Pagination loop detected at {current_url}, stopping discovery")
+            break
+        visited.add(current_url)
+        
         logger.debug(f"Crawling product listing page: {current_url}")
         
         soup = get_soup(current_url)
@@ -207,155 +417,883 @@ def discover_product_ids(website_config: Dict[str, Any]) -> List[str]:
         
         current_url = next_page
         pages_crawled += 1
-        time.sleep(2)  # Be nice to servers
     
     logger.info(f"Discovered {len(product_ids)} product IDs for {website_config['name']}")
     return list(product_ids)
 
+@timed()
 def parse_product_page(soup: BeautifulSoup, selectors: Dict[str, str], product_id: str) -> Dict[str, Any]:
     """
     Parse a product page using the provided selectors.
+    
+    The selectors are compiled once into an extraction plan that evaluates
+    every field in a single pass over the document.
     """
-    product_data = {}
+    extracted = get_plan(selectors).extract(soup)
+    record_selector_hits(selectors, [field for field in selectors if extracted.get(field)])
+    return product_record(extracted)
+
+def record_selector_hits(selectors: Dict[str, str], hits: Iterable[str]):
+    """Count one lookup of every selector field and a hit for each field in `hits`."""
+    for field in selectors:
+        METRICS.inc("selector_lookups_total", field=field)
+    for field in hits:
+        METRICS.inc("selector_hits_total", field=field)
+
+def build_product_url(website_config: Dict[str, Any], product_id: str, lang: str) -> str:
+    """Build the product page URL for a product ID and language."""
+    product_url = website_config["product_url_template"].format(product_id=product_id)
     
-    # Extract basic product info
-    for field in ["name", "price", "description"]:
-        if field in selectors:
-            value = extract_text(soup, selectors[field])
-            if field == "price":
-                # Clean price (remove currency symbols, commas, etc.)
-                value = re.sub(r'[^\d.,]', '', value)
-                try:
-                    value = float(value.replace(',', ''))
-                    product_data[field] = value
-                except ValueError:
-                    logger.warning(f"Could not parse price: {value}")
-            else:
-                product_data[field] = value
-    
-    # Extract specifications
-    for field in ["battery", "motor_type", "max_speed", "range", "weight", "max_load"]:
-        if field in selectors:
-            value = extract_text(soup, selectors[field])
-            if value:
-                product_data[field] = value
-    
-    # Extract image URLs (store URLs directly, no local downloads)
-    if "images" in selectors:
-        images = []
-        for img in soup.select(selectors["images"]):
-            src = img.get('src', '')
-            if src and src not in images:
-                if src.startswith('//'):
-                    src = 'https:' + src
-                images.append(src)
-            
-            data_src = img.get('data-src', '')
-            if data_src and data_src not in images:
-                if data_src.startswith('//'):
-                    data_src = 'https:' + data_src
-                images.append(data_src)
-        
-        if images:
-            product_data["images"] = images
+    if lang != website_config["languages"][0]:
+        if "?" in product_url:
+            product_url += f"&lang={lang}"
+        else:
+            product_url += f"?lang={lang}"
+    
+    return product_url
+
+def get_parse_pool() -> ParsePool:
+    """Return the run's parse pool, or one that parses in the calling thread outside of a run."""
+    return _parse_pool or _INLINE_PARSE_POOL
+
+class FetchedProduct(NamedTuple):
+    """A product after the fetch stage: its record, or the pending parse of its page."""
+    url: str
+    page_fingerprint: str
+    record: Optional[Dict[str, Any]]
+    source: str
+    parsed: Optional[Future]
+
+def fetch_product(website_config: Dict[str, Any], product_id: str, lang: str,
+                  fingerprints: Optional[FingerprintStore] = None,
+                  catalog_record: Optional[Dict[str, Any]] = None) -> Optional[FetchedProduct]:
+    """
+    Fetch stage of crawl_product: fetch the page and queue it for parsing.
+    
+    Blocks while the parse pool's queue is full. Unchanged pages and catalog
+    records need no parsing and come back with their record.
+    
+    Returns:
+        FetchedProduct, or None if the page could not be fetched
+    """
+    product_url = build_product_url(website_config, product_id, lang)
+    
+    if catalog_record is not None:
+        page_fingerprint = record_fingerprint(catalog_record)
+        page_text = None
+    else:
+        logger.info(f"Crawling {product_url}")
+        response = fetch_page(product_url, kind="product")
+        if response is None:
+            return None
+        page_fingerprint = fingerprint(response.content)
+        page_text = response.text
+    
+    product_data = fingerprints.unchanged_record(product_url, page_fingerprint) if fingerprints else None
+    if product_data is not None:
+        logger.debug(f"Page unchanged, skipping parse: {product_url}")
+        return FetchedProduct(product_url, page_fingerprint, product_data, "unchanged", None)
+    if catalog_record is not None:
+        return FetchedProduct(product_url, page_fingerprint, dict(catalog_record), "catalog", None)
+    parsed = get_parse_pool().submit(page_text, website_config)
+    return FetchedProduct(product_url, page_fingerprint, None, "html", parsed)
+
+def finish_product(website_config: Dict[str, Any], product_id: str, lang: str, fetched: FetchedProduct,
+                   fingerprints: Optional[FingerprintStore] = None) -> Dict[str, Any]:
+    """
+    Finish stage of crawl_product: wait for the parse and complete the record.
+    
+    Raises the parse's exception if parsing failed.
+    """
+    product_data = fetched.record
+    source = fetched.source
+    if fetched.parsed is not None:
+        result = fetched.parsed.result()
+        product_data = result["record"]
+        source = result["source"]
+        if source == "html":
+            METRICS.observe("parse_html", result["parse_s"])
+            METRICS.observe("parse_product_page", result["extract_s"])
+            record_selector_hits(website_config["selectors"], result["hits"])
+    METRICS.inc("products_total", source=source)
+    
+    if source != "unchanged":
+        # Add metadata
+        product_data["website"] = website_config["name"]
+        product_data["product_id"] = product_id
+        product_data["language"] = lang
+        product_data["url"] = fetched.url
+    
+    product_data["crawl_date"] = datetime.datetime.now().isoformat()
+    if fingerprints:
+        fingerprints.update(fetched.url, fetched.page_fingerprint, product_data)
     
     return product_data
 
-def crawl_website(website_config: Dict[str, Any]) -> List[Dict[str, Any]]:
+def crawl_product(website_config: Dict[str, Any], product_id: str, lang: str,
+                  fingerprints: Optional[FingerprintStore] = None,
+                  catalog_record: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Fetch and parse a single product page.
+    
+    When a fingerprint store is given and the page is byte-identical to the
+    previous run, the stored record is reused and the page is not parsed.
+    
+    With a record from the website's structured catalog, no page is fetched
+    at all. Websites with "json_ld" enabled are read from the page's JSON-LD
+    Product first; the CSS selectors only run if that lacks a name or price.
+    Pages are parsed by the run's parse pool (see pipeline.py).
+    
+    Returns:
+        Product data dict or None if the page could not be fetched
+    """
+    fetched = fetch_product(website_config, product_id, lang, fingerprints, catalog_record)
+    if fetched is None:
+        return None
+    return finish_product(website_config, product_id, lang, fetched, fingerprints)
+
+def crawl_website(website_config: Dict[str, Any],
+                  fingerprints: Optional[FingerprintStore] = None,
+                  frontier: Optional[CrawlFrontier] = None,
+                  part: Optional[Tuple[int, int]] = None,
+                  on_discovered: Optional[Callable[[List[str]], None]] = None) -> Iterator[Dict[str, Any]]:
     """
     Crawl a website for product data based on its configuration.
+    
+    Product pages are fetched by a thread pool bounded by the website's
+    "concurrency" setting and parsed by the run's parse pool, so fetch
+    threads move on to the next page while the previous one is parsed.
+    Records are yielded in discovery order as they complete, so callers
+    can stream them to disk. If a page cannot be
+    fetched, its last known record from the fingerprint store is carried
+    forward so a transient failure is not reported as a removal.
+    
+    With a frontier, discovered pages are queued persistently and every
+    finished record is checkpointed; the site's records are yielded from the
+    frontier once all pages are done. A site already discovered in the
+    current run skips discovery and only crawls its unfinished pages. If the
+    time budget runs out the crawl stops early, and callers must check
+    `time_budget_exhausted()` before treating the records as complete.
+    
+    Websites with a structured "catalog" source are discovered and read
+    from the bulk catalog; their product pages are only fetched for other
+    languages, or when the catalog cannot be read.
+    
+    With `part` = (k, M), only the k-th of M stable product ranges is
+    crawled (see shards.product_part). `on_discovered` is called with the
+    full list of discovered product IDs before the split, or on resume with
+    the product IDs already in the frontier.
     """
-    products = []
     website_name = website_config["name"]
     logger.info(f"Starting crawl for {website_name}")
     
-    # Discover product IDs
-    product_ids = discover_product_ids(website_config)
+    catalog: Dict[str, Dict[str, Any]] = {}
+    structured = website_config.get("structured_source", {})
+    site = current_site()
     
-    if not product_ids:
-        logger.warning(f"No product IDs discovered for {website_name}")
-        return []
+    if frontier and frontier.is_discovered(website_name):
+        tasks = frontier.pending(website_name)
+        logger.info(f"Resuming {website_name}: {len(tasks)} pages left")
+        if on_discovered:
+            on_discovered(frontier.product_ids(website_name))
+        if fingerprints:
+            for url, record, page_fingerprint in frontier.done(website_name):
+                fingerprints.update(url, page_fingerprint or "", record)
+    else:
+        # Discover product IDs, from the bulk catalog when the site has one
+        if structured.get("catalog"):
+            catalog = read_catalog(structured, fetch_page) or {}
+            if not catalog:
+                logger.warning(f"Catalog unavailable for {website_name}, falling back to HTML discovery")
+        product_ids = list(catalog) if catalog else discover_product_ids(website_config, fingerprints)
+        
+        if not product_ids:
+            logger.warning(f"No product IDs discovered for {website_name}")
+            return
+        
+        # Optional cap, e.g. for quick test runs
+        max_products = website_config.get("max_products")
+        if max_products and len(product_ids) > max_products:
+            product_ids = product_ids[:max_products]
+            logger.info(f"Limiting to {max_products} products for {website_name}")
+        
+        if on_discovered:
+            on_discovered(product_ids)
+        if part:
+            product_ids = [product_id for product_id in product_ids if product_part(product_id, part[1]) == part[0]]
+            logger.info(f"Crawling part {part[0] + 1} of {part[1]} of {website_name}: {len(product_ids)} products")
+        
+        tasks = [
+            (product_id, lang, build_product_url(website_config, product_id, lang))
+            for product_id in product_ids for lang in website_config["languages"]
+        ]
+        if frontier:
+            frontier.enqueue(website_name, tasks)
     
-    # Limit products for GitHub Actions (avoid timeout)
-    max_products = 10
-    if len(product_ids) > max_products:
-        product_ids = product_ids[:max_products]
-        logger.info(f"Limiting to {max_products} products for {website_name}")
+    def fetch_task(product_id: str, lang: str, product_url: str) -> Optional[FetchedProduct]:
+        with site_scope(site):
+            if time_budget_exhausted():
+                return None
+            try:
+                catalog_record = catalog.get(product_id) if lang == website_config["languages"][0] else None
+                return fetch_product(website_config, product_id, lang, fingerprints, catalog_record)
+            except Exception as e:
+                logger.error(f"Error crawling {product_url}: {e}", exc_info=True)
+                return None
     
-    for product_id in product_ids:
-        for lang in website_config["languages"]:
-            product_url = website_config["product_url_template"].format(product_id=product_id)
-            
-            if lang != website_config["languages"][0]:
-                if "?" in product_url:
-                    product_url += f"&lang={lang}"
-                else:
-                    product_url += f"?lang={lang}"
-            
-            logger.info(f"Crawling {product_url}")
-            
-            soup = get_soup(product_url)
-            if not soup:
-                continue
-            
-            product_data = parse_product_page(soup, website_config["selectors"], product_id)
+    def finish_task(product_id: str, lang: str, product_url: str,
+                    fetched: Optional[FetchedProduct]) -> Optional[Dict[str, Any]]:
+        with site_scope(site):
+            product_data = None
+            if fetched is not None:
+                try:
+                    product_data = finish_product(website_config, product_id, lang, fetched, fingerprints)
+                except Exception as e:
+                    logger.error(f"Error parsing {product_url}: {e}", exc_info=True)
             
-            # Add metadata
-            product_data["website"] = website_name
-            product_data["product_id"] = product_id
-            product_data["language"] = lang
-            product_data["url"] = product_url
-            product_data["crawl_date"] = datetime.datetime.now().isoformat()
+            if product_data is None and fingerprints and not time_budget_exhausted():
+                previous = fingerprints.lookup(product_url)
+                if previous:
+                    logger.warning(f"Keeping last known record for {product_url}")
+                    fingerprints.mark_seen(product_url)
+                    product_data = previous["record"]
             
-            products.append(product_data)
-            time.sleep(1)  # Be nice to servers
+            if frontier:
+                if product_data is not None:
+                    entry = fingerprints.lookup(product_url) if fingerprints else None
+                    frontier.complete(website_name, product_url, product_data, entry["page"] if entry else None)
+                else:
+                    frontier.fail(website_name, product_url)
+            return product_data
     
-    logger.info(f"Completed crawl for {website_name}, found {len(products)} products")
-    return products
+    count = 0
+    concurrency = website_config.get("concurrency", DEFAULT_SITE_CONCURRENCY)
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"crawl-{website_name}") as executor:
+        # Fetch threads hand pages to the parse pool and move on to the next
+        # page; records are finished here, in discovery order. Only a window
+        # of pages is in flight, so a stalled page at the head cannot let
+        # parsed pages behind it pile up; the next page is submitted as
+        # each one is consumed.
+        window = concurrency + get_parse_pool().max_pending
+        pending = iter(tasks)
+        futures = deque()
+        for task in islice(pending, window):
+            futures.append((task, executor.submit(fetch_task, *task)))
+        while futures:
+            task, future = futures.popleft()
+            for next_task in islice(pending, 1):
+                futures.append((next_task, executor.submit(fetch_task, *next_task)))
+            product_data = finish_task(*task, future.result())
+            if product_data and not frontier:
+                count += 1
+                yield product_data
+    
+    if time_budget_exhausted():
+        logger.warning(f"Time budget exhausted before {website_name} finished; progress is checkpointed")
+        return
+    
+    if frontier:
+        for _, product_data, _ in frontier.done(website_name):
+            count += 1
+            yield product_data
+    
+    logger.info(f"Completed crawl for {website_name}, found {count} products")
+
+def fingerprint_store(website_key: str) -> FingerprintStore:
+    """The website's fingerprint store, matched against its current extraction configuration."""
+    return FingerprintStore(STATE_DIR / "fingerprints" / f"{website_key}.sqlite",
+                            extraction_fingerprint(WEBSITES[website_key]))
 
-def save_to_csv(products: List[Dict[str, Any]], website_key: str):
+def csv_filename(website_key: str) -> str:
+    return f"{website_key}_{datetime.datetime.now().strftime('%Y%m%d')}.csv"
+
+@timed()
+def save_to_csv(products: Iterable[Dict[str, Any]], website_key: str):
     """
     Save product data to CSV in both data directory and web directory.
+    
+    `products` is a RecordWriter holding the crawled records, or any
+    iterable of records. The CSV is written once to the data directory and
+    linked into the web directory. Only the latest file per site is kept;
+    earlier runs are in the history store.
     """
-    if not products:
+    if not isinstance(products, RecordWriter):
+        with RecordWriter() as writer:
+            for record in products:
+                writer.write(record)
+            return save_to_csv(writer, website_key)
+    
+    if not products.count:
         logger.warning(f"No products to save for {website_key}")
         return
     
-    date_str = datetime.datetime.now().strftime("%Y%m%d")
-    filename = f"{website_key}_{date_str}.csv"
+    filename = csv_filename(website_key)
+    
+    # Latest snapshot in the data directory (history lives in HISTORY_DIR),
+    # with typed spec columns (battery_wh, range_km, ...) next to the raw text;
+    # the static site gets the same file
+    products.commit(CURRENT_DATA_DIR / filename, [WEB_DATA_DIR / filename])
+    
+    # Older dated files of this site are superseded by the history store
+    for directory in (CURRENT_DATA_DIR, WEB_DATA_DIR):
+        for old_file in directory.glob(f"{website_key}_[0-9]*.csv"):
+            if old_file.name != filename:
+                old_file.unlink()
+                logger.info(f"Removed superseded file {old_file}")
+
+def crawl_and_save(website_key: str, website_config: Dict[str, Any],
+                   frontier: Optional[CrawlFrontier] = None,
+                   image_store: Optional[ImageStore] = None) -> int:
+    """
+    Crawl a single website, write its change feed and save its products.
+    
+    With an image store, product images not seen before are downloaded.
+    
+    The site CSV is only rewritten when products were added, removed or
+    changed since the previous run. Returns the product count.
+    """
+    if frontier and frontier.is_saved(website_config["name"]):
+        logger.info(f"Skipping {website_key}: already saved in this run")
+        return 0
+    
+    with site_scope(website_key):
+        return _crawl_and_save(website_key, website_config, frontier, image_store)
+
+def _crawl_and_save(website_key: str, website_config: Dict[str, Any],
+                    frontier: Optional[CrawlFrontier], image_store: Optional[ImageStore]) -> int:
+    logger.info(f"Processing website: {website_key}")
+    
+    with fingerprint_store(website_key) as fingerprints, RecordWriter() as products:
+        for product_data in crawl_website(website_config, fingerprints, frontier):
+            products.write(product_data)
+        
+        if time_budget_exhausted():
+            # Partial crawl; the frontier resumes it and the old CSV stays in place
+            return 0
+        
+        count = save_site(website_key, products, fingerprints, image_store)
+    
+    if frontier:
+        frontier.mark_saved(website_config["name"])
+    return count
+
+def save_site(website_key: str, products: RecordWriter, fingerprints: FingerprintStore,
+              image_store: Optional[ImageStore] = None) -> int:
+    """
+    Record a finished crawl of a website: history, price index, change feed,
+    fingerprints, the site CSV and new images. Returns the product count.
+    
+    The change feed is computed from the fingerprint store, which holds the
+    records of this run and the previous one on disk.
+    """
+    logger.info(f"Found {products.count} products for {website_key}")
+    if not products.count:
+        # Nothing crawled (e.g. discovery failed); keep the previous state untouched
+        save_to_csv(products, website_key)
+        return 0
+    
+    HistoryStore(HISTORY_DIR).append(website_key, products)
+    PriceIndex(PRICE_INDEX_DIR).ingest_run(website_key, products, datetime.date.today())
     
-    # Save to data directory (for archival)
-    data_filepath = CURRENT_DATA_DIR / filename
-    if data_filepath.exists():
-        archive_path = ARCHIVE_DATA_DIR / filename
-        shutil.move(str(data_filepath), str(archive_path))
-        logger.info(f"Archived existing file to {archive_path}")
+    with fingerprints.changes() as delta:
+        changes_path = write_change_feed(CHANGES_DIR, website_key, delta)
+    logger.info(f"Change feed for {website_key}: {delta.summary} ({changes_path})")
+    fingerprints.save()
     
-    df = pd.DataFrame(products)
-    df.to_csv(data_filepath, index=False)
-    logger.info(f"Saved {len(products)} products to {data_filepath}")
+    if has_changes(delta) or not any(CURRENT_DATA_DIR.glob(f"{website_key}_[0-9]*.csv")):
+        save_to_csv(products, website_key)
+    else:
+        logger.info(f"No product changes for {website_key}, keeping existing CSV")
     
-    # Also save to web directory (for static site)
-    web_filepath = WEB_DATA_DIR / filename
-    df.to_csv(web_filepath, index=False)
-    logger.info(f"Saved {len(products)} products to {web_filepath}")
+    if image_store:
+        process_images(products, image_store, get_http_session().session, get_politeness())
+    return products.count
+
+def select_sites(sites: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """WEBSITES entries for a comma-separated list of keys (all if empty)."""
+    keys = [key.strip() for key in (sites or "").split(",") if key.strip()]
+    unknown = [key for key in keys if key not in WEBSITES]
+    if unknown:
+        raise ValueError(f"Unknown sites: {', '.join(unknown)} (known: {', '.join(WEBSITES)})")
+    return {key: WEBSITES[key] for key in keys} if keys else dict(WEBSITES)
+
+def finish_images(image_store: ImageStore):
+    """Render missing thumbnails and publish the thumbnail map for the static site."""
+    generate_thumbnails(image_store)
+    image_store.save()
+    with open(WEB_DATA_DIR / "thumbnails.json", "w") as f:
+        json.dump(image_store.thumbnail_map(), f, sort_keys=True)
+
+@timed()
+def finish_matches():
+    """Match products across websites and publish their canonical IDs for the static site."""
+    try:
+        update_matches(CURRENT_DATA_DIR, MATCH_INDEX_DIR, WEB_DATA_DIR / "matches.json")
+    except Exception as e:
+        logger.error(f"Error matching products across websites: {e}", exc_info=True)
 
-def run_crawler():
-    """Main function to run the crawler for all configured websites."""
+def run_crawler(max_parallel_sites: int = MAX_PARALLEL_SITES, resume: bool = False,
+                max_runtime: Optional[float] = None, images: bool = False, profile: bool = False,
+                sites: Optional[str] = None, parse_workers: Optional[int] = None,
+                parse_queue: Optional[int] = None, archive_pages: bool = True):
+    """
+    Main function to run the crawler for all configured websites.
+    
+    Args:
+        max_parallel_sites: Number of websites crawled concurrently
+        resume: Continue the last unfinished run from the crawl frontier
+        max_runtime: Seconds after which no new pages are fetched; the rest
+            is left in the frontier for a later --resume run
+        images: Download new product images into the content-addressed
+            store and render thumbnails for the static site
+        profile: Profile the run with cProfile (all threads) and write
+            METRICS_DIR/profile.pstats next to the metrics report
+        sites: Comma-separated WEBSITES keys to crawl instead of all
+        parse_workers: Processes parsing product pages (default: one per
+            CPU on multi-core machines; 0 parses in the fetch threads)
+        parse_queue: Pages queued for parsing before fetch threads wait
+            (default: 2 per parse worker)
+        archive_pages: Keep every fetched page in the page archive
+            (PAGE_ARCHIVE_DIR) for offline replay
+    """
+    global _deadline, _parse_pool, _page_archive
     logger.info("Starting e-bike crawler run in GitHub Actions")
     
+    websites = select_sites(sites)
     setup_directories()
+    METRICS.reset()
+    profiler = ThreadProfiler() if profile else None
+    if profiler:
+        profiler.start()
+    _deadline = time.monotonic() + max_runtime if max_runtime else None
+    frontier = CrawlFrontier(FRONTIER_DB)
+    run_id = frontier.start_run(resume=resume)
+    image_store = ImageStore(IMAGE_DIR, THUMBNAIL_DIR) if images else None
+    _parse_pool = ParsePool(default_parse_workers() if parse_workers is None else parse_workers, parse_queue)
+    _page_archive = PageArchive(PAGE_ARCHIVE_DIR) if archive_pages else None
+    
+    try:
+        with ThreadPoolExecutor(max_workers=max_parallel_sites, thread_name_prefix="site") as executor:
+            futures = {
+                website_key: executor.submit(crawl_and_save, website_key, website_config, frontier, image_store)
+                for website_key, website_config in websites.items()
+            }
+            for website_key, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Error crawling {website_key}: {e}", exc_info=True)
+        
+        if image_store:
+            finish_images(image_store)
+        finish_matches()
+        
+        if time_budget_exhausted():
+            logger.warning("Time budget exhausted; run again with --resume to continue")
+        else:
+            frontier.finish_run()
+    finally:
+        _parse_pool.close()
+        _parse_pool = None
+        if _page_archive:
+            _page_archive.close()
+            _page_archive = None
+        frontier.close()
+        if profiler:
+            profiler.stop(METRICS_DIR / "profile.pstats")
+        report = METRICS.write_report(METRICS_DIR, {"run_id": run_id, "sites": list(websites)})
+        logger.info(f"Run metrics written to {report}")
+    
+    logger.info("Crawler run completed")
+
+def unit_frontier(website_key: str, part: int, parts: int, output_dir: Path, resume: bool) -> CrawlFrontier:
+    """
+    The crawl frontier of a shard unit, in the shard output.
     
-    for website_key, website_config in WEBSITES.items():
+    With `resume`, the unit continues from its frontier in the output
+    directory or, failing that, from the one a previous merge saved; the
+    unit's last unfinished run is picked up. Otherwise it starts over.
+    """
+    path = frontier_path(output_dir, website_key, part, parts)
+    saved = frontier_path(SHARD_FRONTIER_DIR, website_key, part, parts)
+    if not resume:
+        for stale in path.parent.glob(path.name + "*"):
+            stale.unlink()
+    elif not path.exists() and saved.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(saved, path)
+        logger.info(f"Resuming {website_key} part {part + 1}/{parts} from {saved}")
+    frontier = CrawlFrontier(path)
+    frontier.start_run(resume=resume)
+    return frontier
+
+def crawl_unit(website_key: str, part: int, parts: int, output_dir: Path, resume: bool = False) -> int:
+    """
+    Crawl one shard unit (a website or one product range of it) into shard output files.
+    
+    Progress is checkpointed in the unit's frontier (see unit_frontier), so
+    a unit that runs out of time can be resumed by the next run.
+    """
+    website_config = WEBSITES[website_key]
+    # The shared fingerprint state is only read here; the merge step updates it
+    discovered: List[str] = []
+    frontier = unit_frontier(website_key, part, parts, output_dir, resume)
+    try:
+        with site_scope(website_key), fingerprint_store(website_key) as fingerprints, \
+                ShardWriter(output_dir, website_key, part, parts) as output:
+            for product_data in crawl_website(website_config, fingerprints, frontier, part=(part, parts),
+                                              on_discovered=discovered.extend):
+                entry = fingerprints.lookup(product_data["url"])
+                output.write(product_data, entry["page"] if entry else None)
+            complete = not time_budget_exhausted()
+            output.finish(discovered, website_config["languages"], complete=complete)
+            if complete:
+                frontier.finish_run()
+            return len(output.keys)
+    finally:
+        frontier.close()
+
+def run_shard(shard: Tuple[int, int], output_dir: Optional[Path] = None,
+              max_parallel_sites: int = MAX_PARALLEL_SITES, resume: bool = False,
+              max_runtime: Optional[float] = None, profile: bool = False, sites: Optional[str] = None,
+              parse_workers: Optional[int] = None, parse_queue: Optional[int] = None, archive_pages: bool = True):
+    """
+    Crawl one shard of a sharded crawl and write its partial outputs.
+    
+    Every shard computes the same plan from the sites' current CSVs (see
+    shards.plan_shards) and crawls only its own units. Nothing outside
+    `output_dir` is written except metrics; `merge_shards` turns the outputs
+    of all shards into the canonical per-site files.
+    
+    Args:
+        shard: (index, count) with a 0-based index
+        output_dir: Directory for this shard's outputs (default SHARD_OUTPUT_DIR)
+        max_parallel_sites: Number of units crawled concurrently
+        resume: Continue unfinished units from their frontiers; websites with
+            frontiers saved by the last merge keep that run's split
+        max_runtime: Seconds after which no new pages are fetched; unfinished
+            units are marked incomplete and refused by the merge, and their
+            progress is kept for the next resumed run
+        profile: Profile the run with cProfile (all threads)
+        sites: Comma-separated WEBSITES keys to crawl instead of all
+        parse_workers: Processes parsing product pages (see run_crawler)
+        parse_queue: Pages queued for parsing before fetch threads wait
+        archive_pages: Archive fetched pages under `output_dir`/pages; the
+            merge adds them to the page archive
+    """
+    global _deadline, _parse_pool, _page_archive
+    index, count = shard
+    output_dir = output_dir or SHARD_OUTPUT_DIR
+    websites = select_sites(sites)
+    splits = saved_splits(SHARD_FRONTIER_DIR) if resume else {}
+    units = plan_shards(site_weights(websites, CURRENT_DATA_DIR), count, splits)[index]
+    logger.info(f"Shard {index + 1}/{count}: " + ", ".join(f"{key} ({part + 1}/{parts})" for key, part, parts in units))
+    
+    METRICS.reset()
+    profiler = ThreadProfiler() if profile else None
+    if profiler:
+        profiler.start()
+    _deadline = time.monotonic() + max_runtime if max_runtime else None
+    _parse_pool = ParsePool(default_parse_workers() if parse_workers is None else parse_workers, parse_queue)
+    _page_archive = PageArchive(output_dir / "pages", writer=f"shard-{index + 1}-of-{count}") if archive_pages else None
+    
+    try:
+        with ThreadPoolExecutor(max_workers=max_parallel_sites, thread_name_prefix="site") as executor:
+            futures = {unit: executor.submit(crawl_unit, *unit, output_dir, resume) for unit in units}
+            for (website_key, part, parts), future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Error crawling {website_key} part {part + 1}/{parts}: {e}", exc_info=True)
+    finally:
+        _parse_pool.close()
+        _parse_pool = None
+        if _page_archive:
+            _page_archive.close()
+            _page_archive = None
+        if profiler:
+            profiler.stop(METRICS_DIR / "profile.pstats")
+        report = METRICS.write_report(METRICS_DIR, {"shard": f"{index + 1}/{count}", "units": units})
+        logger.info(f"Run metrics written to {report}")
+    
+    logger.info(f"Shard {index + 1}/{count} completed")
+
+def merge_shards(shard_dir: Optional[Path] = None, sites: Optional[str] = None, images: bool = False) -> List[str]:
+    """
+    Merge the outputs of all shards under `shard_dir` into the per-site files.
+    
+    Websites with a missing or unfinished part are not merged; their
+    previous CSV and state stay in place, and the frontiers of unfinished
+    parts are saved for the next resumed shard run. Pages archived by the
+    shards are added to the page archive. Returns the gaps found.
+    """
+    websites = select_sites(sites)
+    setup_directories()
+    shard_dir = shard_dir or SHARD_OUTPUT_DIR
+    manifests = read_manifests(shard_dir)
+    image_store = ImageStore(IMAGE_DIR, THUMBNAIL_DIR) if images else None
+    
+    problems = []
+    for website_key in websites:
+        if website_key not in manifests:
+            problems.append(f"{website_key}: no shard output")
+            continue
+        site_problems = check_gaps(website_key, manifests[website_key])
+        if site_problems:
+            problems.extend(site_problems)
+            saved = save_frontiers(website_key, manifests[website_key], SHARD_FRONTIER_DIR)
+            if saved:
+                logger.info(f"Saved {len(saved)} unfinished part(s) of {website_key} for the next resumed run")
+            continue
+        
+        with site_scope(website_key):
+            with fingerprint_store(website_key) as fingerprints, RecordWriter() as products:
+                for entry in merge_records(website_key, manifests[website_key]):
+                    record = entry["record"]
+                    fingerprints.update(record["url"], entry["page"] or "", record)
+                    products.write(record)
+                save_site(website_key, products, fingerprints, image_store)
+            save_frontiers(website_key, [], SHARD_FRONTIER_DIR)
+    
+    if image_store:
+        finish_images(image_store)
+    finish_matches()
+    import_archived_pages(shard_dir)
+    for problem in problems:
+        logger.error(f"Not merged: {problem}")
+    return problems
+
+@timed()
+def import_archived_pages(shard_dir: Path):
+    """Add the pages archived by the shards under `shard_dir` to the page archive."""
+    if not any(Path(shard_dir).rglob("*.pages")):
+        return
+    try:
+        with PageArchive(PAGE_ARCHIVE_DIR) as archive:
+            archive.import_segments(shard_dir)
+    except Exception as e:
+        logger.error(f"Error importing archived pages: {e}", exc_info=True)
+
+def archived_product(website_config: Dict[str, Any], url: str) -> Optional[Tuple[str, str]]:
+    """(product ID, language) of an archived product page URL, or None for other pages."""
+    lang = website_config["languages"][0]
+    page_url = url
+    match = re.search(r"[?&]lang=([^&]+)$", url)
+    if match:
+        lang = match.group(1)
+        page_url = url[:match.start()]
+    prefix, _, suffix = website_config["product_url_template"].partition("{product_id}")
+    if lang not in website_config["languages"] or not page_url.startswith(prefix) or not page_url.endswith(suffix):
+        return None
+    product_id = page_url[len(prefix):len(page_url) - len(suffix)]
+    if not product_id or "?" in product_id or build_product_url(website_config, product_id, lang) != url:
+        return None
+    return product_id, lang
+
+def replay_captures(website_config: Dict[str, Any], captures: Dict[str, ArchiveEntry], archive: PageArchive,
+                    pool: ParsePool, products: RecordWriter):
+    """
+    Re-extract the products of one site from archived captures (URL -> capture).
+    
+    The catalog of a catalog site is read from its archived responses;
+    product pages are parsed with the site's current configuration.
+    """
+    structured = website_config.get("structured_source", {})
+    catalog_pages: List[ArchiveEntry] = []
+    
+    def fetch_archived(url: str) -> Optional[CachedResponse]:
+        entry = captures.get(url)
+        if entry is None:
+            return None
+        catalog_pages.append(entry)
+        return archive.response(entry)
+    
+    def finish(product_id: str, lang: str, entry: ArchiveEntry, record: Dict[str, Any]):
+        record["website"] = website_config["name"]
+        record["product_id"] = product_id
+        record["language"] = lang
+        record["url"] = build_product_url(website_config, product_id, lang)
+        record["crawl_date"] = entry.fetched_at
+        products.write(record)
+    
+    replayed = set()
+    if structured.get("catalog"):
+        catalog = read_catalog(structured, fetch_archived) or {}
+        for product_id, record in catalog.items():
+            finish(product_id, website_config["languages"][0], catalog_pages[0], dict(record))
+            replayed.add(build_product_url(website_config, product_id, website_config["languages"][0]))
+    
+    def finish_next():
+        (product_id, lang), entry, future = pending.popleft()
         try:
-            logger.info(f"Processing website: {website_key}")
-            products = crawl_website(website_config)
-            logger.info(f"Found {len(products)} products for {website_key}")
-            save_to_csv(products, website_key)
+            result = future.result()
         except Exception as e:
-            logger.error(f"Error crawling {website_key}: {e}", exc_info=True)
+            logger.error(f"Error parsing archived {entry.url}: {e}", exc_info=True)
+            return
+        METRICS.inc("products_total", source=result["source"])
+        finish(product_id, lang, entry, result["record"])
     
-    logger.info("Crawler run completed")
+    pending = deque()
+    for url, entry in captures.items():
+        product = archived_product(website_config, url) if entry.kind == "product" else None
+        if product is None or url in replayed:
+            continue
+        try:
+            page_text = archive.response(entry).text
+        except Exception as e:
+            logger.error(f"Error reading archived {url}: {e}")
+            continue
+        pending.append((product, entry, pool.submit(page_text, website_config)))
+        # Keep at most a queue's worth of parsed records in flight
+        if len(pending) > pool.max_pending:
+            finish_next()
+    while pending:
+        finish_next()
+
+def replay_archive(since: Optional[str] = None, until: Optional[str] = None, sites: Optional[str] = None,
+                   output_dir: Optional[Path] = None, parse_workers: Optional[int] = None,
+                   parse_queue: Optional[int] = None) -> Dict[str, int]:
+    """
+    Re-extract products from the page archive, without network access.
+    
+    For every website and crawl day in the range, the day's last capture of
+    each product page is parsed with the website's current selectors and
+    JSON-LD settings, and the products are written to
+    `output_dir`/<site>_<YYYYMMDD>.csv. Nothing else is written, so the
+    output can be compared with the CSVs of the original crawl.
+    
+    Args:
+        since: First crawl day (YYYY-MM-DD), inclusive; default the first archived
+        until: Last crawl day (YYYY-MM-DD), inclusive; default the last archived
+        sites: Comma-separated WEBSITES keys to replay instead of all
+        output_dir: Directory for the replayed CSVs (default REPLAY_DIR)
+        parse_workers: Processes parsing pages (see run_crawler)
+        parse_queue: Pages queued for parsing at a time
+    
+    Returns:
+        Number of products per written file name
+    """
+    websites = select_sites(sites)
+    output_dir = output_dir or REPLAY_DIR
+    written: Dict[str, int] = {}
+    
+    with PageArchive(PAGE_ARCHIVE_DIR) as archive, \
+            ParsePool(default_parse_workers() if parse_workers is None else parse_workers, parse_queue) as pool:
+        for website_key, website_config in websites.items():
+            days: Dict[str, Dict[str, ArchiveEntry]] = {}
+            for entry in archive.entries(website_key, since, until):
+                # Entries come in fetch order, so each URL ends up with the day's last capture
+                days.setdefault(entry.fetched_at[:10], {})[entry.url] = entry
+            if not days:
+                logger.warning(f"No archived pages of {website_key} in the requested range")
+                continue
+            
+            for day, captures in sorted(days.items()):
+                with site_scope(website_key), RecordWriter() as products:
+                    replay_captures(website_config, captures, archive, pool, products)
+                    if not products.count:
+                        logger.warning(f"No products replayed for {website_key} on {day}")
+                        continue
+                    filename = f"{website_key}_{day.replace('-', '')}.csv"
+                    products.commit(output_dir / filename)
+                    written[filename] = products.count
+    
+    logger.info(f"Replayed {sum(written.values())} products into {len(written)} files in {output_dir}")
+    return written
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Crawl e-bike manufacturer websites")
+    parser.add_argument("--sites", help="comma-separated WEBSITES keys to crawl (default: all)")
+    parser.add_argument("--shard", type=parse_shard_arg, metavar="I/N",
+                        help="crawl only shard I of N and write partial outputs for the merge command")
+    parser.add_argument("--output", type=Path, default=None,
+                        help="directory for shard outputs (with --shard; default data/shards)")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the last unfinished crawl run instead of starting over "
+                             "(with --shard: the unfinished units saved by the last merge)")
+    parser.add_argument("--max-runtime", type=float, default=None,
+                        help="stop fetching new pages after this many seconds (checkpointed for --resume)")
+    parser.add_argument("--max-parallel-sites", type=int, default=MAX_PARALLEL_SITES,
+                        help="number of websites crawled concurrently")
+    parser.add_argument("--images", action="store_true",
+                        help="download new product images and render thumbnails")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile the run with cProfile and write data/metrics/profile.pstats")
+    parser.add_argument("--parse-workers", type=int, default=None,
+                        help="processes parsing product pages (default: one per CPU on multi-core machines, "
+                             "0 parses in the fetch threads)")
+    parser.add_argument("--parse-queue", type=int, default=None,
+                        help="pages queued for parsing before fetching waits (default: 2 per parse worker)")
+    parser.add_argument("--no-archive", dest="archive_pages", action="store_false",
+                        help="do not keep fetched pages in the page archive (data/pages)")
+    args = parser.parse_args(argv)
+    try:
+        select_sites(args.sites)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    if args.shard:
+        if args.images:
+            parser.error("--images applies to unsharded runs; pass --images to the merge command")
+        run_shard(args.shard, args.output, max_parallel_sites=args.max_parallel_sites, resume=args.resume,
+                  max_runtime=args.max_runtime, profile=args.profile, sites=args.sites,
+                  parse_workers=args.parse_workers, parse_queue=args.parse_queue, archive_pages=args.archive_pages)
+    else:
+        run_crawler(max_parallel_sites=args.max_parallel_sites, resume=args.resume, max_runtime=args.max_runtime,
+                    images=args.images, profile=args.profile, sites=args.sites,
+                    parse_workers=args.parse_workers, parse_queue=args.parse_queue,
+                    archive_pages=args.archive_pages)
+
+def parse_shard_arg(value: str) -> Tuple[int, int]:
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def merge_main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Merge the outputs of a sharded crawl into the per-site files")
+    parser.add_argument("shard_dir", nargs="?", type=Path, default=None,
+                        help="directory containing the outputs of all shards, searched recursively (default data/shards)")
+    parser.add_argument("--sites", help="comma-separated WEBSITES keys to merge (default: all)")
+    parser.add_argument("--images", action="store_true",
+                        help="download new product images and render thumbnails")
+    args = parser.parse_args(argv)
+    try:
+        select_sites(args.sites)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    problems = merge_shards(args.shard_dir, sites=args.sites, images=args.images)
+    if problems:
+        sys.exit(1)
+
+def replay_main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Re-extract products from archived pages without fetching")
+    parser.add_argument("--since", type=parse_date_arg, default=None, metavar="YYYY-MM-DD",
+                        help="first crawl day to replay (default: the first archived)")
+    parser.add_argument("--until", type=parse_date_arg, default=None, metavar="YYYY-MM-DD",
+                        help="last crawl day to replay (default: the last archived)")
+    parser.add_argument("--sites", help="comma-separated WEBSITES keys to replay (default: all)")
+    parser.add_argument("--output", type=Path, default=None,
+                        help="directory for the replayed CSVs (default data/replay)")
+    parser.add_argument("--parse-workers", type=int, default=None,
+                        help="processes parsing pages (default: one per CPU on multi-core machines)")
+    parser.add_argument("--parse-queue", type=int, default=None,
+                        help="pages queued for parsing at a time (default: 2 per parse worker)")
+    args = parser.parse_args(argv)
+    try:
+        select_sites(args.sites)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    replay_archive(args.since, args.until, sites=args.sites, output_dir=args.output,
+                   parse_workers=args.parse_workers, parse_queue=args.parse_queue)
+
+def parse_date_arg(value: str) -> str:
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid date (expected YYYY-MM-DD): {value}")
 
 if __name__ == "__main__":
-    run_crawler() 
\ No newline at end of file
+    main()
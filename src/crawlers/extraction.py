@@ -0,0 +1,238 @@
+"""
+Compiled extraction plans for product pages.
+
+The CSS selectors of a website configuration are compiled once into an
+ExtractionPlan. A plan evaluates every field in a single walk over the
+document instead of one select_one() tree walk per field, and can restrict
+parsing to the relevant part of the page with a SoupStrainer.
+"""
+
+import logging
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import soupsieve
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+
+logger = logging.getLogger("ebike_crawler.extraction")
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:  # pragma: no cover - depends on the environment
+    HTML_PARSER = "html.parser"
+
+# Fields extracted as the text of the first matching element
+TEXT_FIELDS = ["name", "price", "description", "battery", "motor_type", "max_speed", "range", "weight", "max_load"]
+# Fields extracted as attribute lists from every matching element
+IMAGE_FIELD = "images"
+IMAGE_ATTRIBUTES = ("src", "data-src")
+
+# soupsieve deprecated ":contains()" in favour of ":-soup-contains()"
+_CONTAINS_PATTERN = re.compile(r":contains\(")
+_TAG_PATTERN = re.compile(r"^[a-zA-Z][\w-]*")
+_CLASS_PATTERN = re.compile(r"\.([\w-]+)")
+_ID_PATTERN = re.compile(r"#([\w-]+)")
+
+
+def make_soup(html: str, parse_only: Optional[SoupStrainer] = None) -> BeautifulSoup:
+    """Parse HTML with the fastest available parser backend."""
+    return BeautifulSoup(html, HTML_PARSER, parse_only=parse_only)
+
+
+def _split_top_level(selector: str, separators: str) -> List[str]:
+    """Split a selector on separator characters outside of quotes and parentheses."""
+    parts, current, depth, quote = [], [], 0, None
+    for char in selector:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif depth == 0 and char in separators:
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    parts.append("".join(current))
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _selector_keys(selector: str) -> Optional[List[Tuple[Optional[str], frozenset, Optional[str]]]]:
+    """
+    Derive cheap pre-filter keys from a selector list.
+
+    For each alternative, the rightmost compound selector's tag name, classes
+    and id must all be present on an element for it to possibly match. Returns
+    None when some alternative has no usable key (every element is a candidate).
+    """
+    keys = []
+    for alternative in _split_top_level(selector, ","):
+        compound = _split_top_level(alternative, " >+~")[-1]
+        # Ignore pseudo-class arguments and attribute selectors, e.g. :contains('a.b')
+        simple = re.sub(r"\(.*\)|\[.*?\]", "", compound)
+        tag_match = _TAG_PATTERN.match(simple)
+        tag = tag_match.group(0).lower() if tag_match else None
+        classes = frozenset(_CLASS_PATTERN.findall(simple))
+        id_match = _ID_PATTERN.search(simple)
+        element_id = id_match.group(1) if id_match else None
+        if tag is None and not classes and element_id is None:
+            return None
+        keys.append((tag, classes, element_id))
+    return keys
+
+
+def _is_candidate(element: Tag, keys) -> bool:
+    if keys is None:
+        return True
+    element_classes = None
+    for tag, classes, element_id in keys:
+        if tag is not None and element.name != tag:
+            continue
+        if element_id is not None and element.get("id") != element_id:
+            continue
+        if classes:
+            if element_classes is None:
+                element_classes = set(element.get("class") or ())
+            if not classes <= element_classes:
+                continue
+        return True
+    return False
+
+
+def _compile_selector(field: str, selector: str):
+    try:
+        return soupsieve.compile(_CONTAINS_PATTERN.sub(":-soup-contains(", selector))
+    except soupsieve.SelectorSyntaxError as e:
+        logger.error(f"Invalid selector for field '{field}': {selector!r} ({e})")
+        return None
+
+
+class ExtractionPlan:
+    """
+    A website's selectors compiled for single-pass evaluation.
+
+    Args:
+        selectors: Field name to CSS selector mapping from config/websites.py
+        parse_only: Optional SoupStrainer keyword arguments (e.g. {"name": "main"})
+            restricting parsing to the subtree the selectors live in
+    """
+
+    def __init__(self, selectors: Dict[str, str], parse_only: Optional[Dict[str, Any]] = None):
+        # (field, compiled selector, pre-filter keys) per text field
+        self.text_fields: List[Tuple[str, Any, Any]] = []
+        for field in TEXT_FIELDS:
+            if field in selectors:
+                compiled = _compile_selector(field, selectors[field])
+                if compiled is not None:
+                    self.text_fields.append((field, compiled, _selector_keys(selectors[field])))
+
+        self.image_selector = None
+        self.image_keys = None
+        if IMAGE_FIELD in selectors:
+            self.image_selector = _compile_selector(IMAGE_FIELD, selectors[IMAGE_FIELD])
+            self.image_keys = _selector_keys(selectors[IMAGE_FIELD])
+
+        self.strainer = SoupStrainer(**parse_only) if parse_only else None
+
+    def parse(self, html: str) -> BeautifulSoup:
+        """Parse a page, restricted to the plan's strainer when configured."""
+        return make_soup(html, parse_only=self.strainer)
+
+    def extract(self, soup: BeautifulSoup) -> Dict[str, Any]:
+        """
+        Evaluate all fields in one document-order traversal.
+
+        Text fields take the first matching element, which is the same result
+        select_one() gives for a selector list. Image URLs are collected from
+        every matching element, de-duplicated in order of appearance.
+
+        Returns:
+            Dict of field name to raw text, plus "images" as a list of URLs
+        """
+        values: Dict[str, str] = {}
+        pending = list(self.text_fields)
+        images: List[str] = []
+        image_selector = self.image_selector
+        image_keys = self.image_keys
+
+        for element in soup.descendants:
+            if not isinstance(element, Tag):
+                continue
+
+            if pending:
+                matched = None
+                for entry in pending:
+                    field, compiled, keys = entry
+                    if _is_candidate(element, keys) and compiled.match(element):
+                        values[field] = element.get_text(strip=True)
+                        matched = matched or []
+                        matched.append(entry)
+                if matched:
+                    pending = [entry for entry in pending if entry not in matched]
+
+            if (image_selector is not None and _is_candidate(element, image_keys)
+                    and image_selector.match(element)):
+                for attribute in IMAGE_ATTRIBUTES:
+                    src = element.get(attribute, "")
+                    if src:
+                        if src.startswith("//"):
+                            src = "https:" + src
+                        if src not in images:
+                            images.append(src)
+            elif not pending and image_selector is None:
+                break
+
+        for field, _, _ in pending:
+            values[field] = ""
+        if images:
+            values[IMAGE_FIELD] = images
+        return values
+
+
+@lru_cache(maxsize=64)
+def _cached_plan(selector_items: Tuple[Tuple[str, str], ...], parse_only_items: Tuple[Tuple[str, Any], ...]) -> ExtractionPlan:
+    return ExtractionPlan(dict(selector_items), dict(parse_only_items) or None)
+
+
+def get_plan(selectors: Dict[str, str], parse_only: Optional[Dict[str, Any]] = None) -> ExtractionPlan:
+    """Return the compiled plan for a selector set, compiling it on first use."""
+    parse_only_items = tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in (parse_only or {}).items()))
+    return _cached_plan(tuple(sorted(selectors.items())), parse_only_items)
+
+
+def product_record(extracted: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn a plan's extracted fields into product data: price as a number, empty fields dropped."""
+    product_data = {}
+
+    # Extract basic product info
+    for field in ["name", "price", "description"]:
+        if field in extracted:
+            value = extracted[field]
+            if field == "price":
+                # Clean price (remove currency symbols, commas, etc.)
+                value = re.sub(r'[^\d.,]', '', value)
+                try:
+                    value = float(value.replace(',', ''))
+                    product_data[field] = value
+                except ValueError:
+                    logger.warning(f"Could not parse price: {value}")
+            else:
+                product_data[field] = value
+
+    # Extract specifications
+    for field in ["battery", "motor_type", "max_speed", "range", "weight", "max_load"]:
+        value = extracted.get(field)
+        if value:
+            product_data[field] = value
+
+    # Image URLs (store URLs directly, no local downloads)
+    if extracted.get(IMAGE_FIELD):
+        product_data[IMAGE_FIELD] = extracted[IMAGE_FIELD]
+
+    return product_data
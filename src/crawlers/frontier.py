@@ -0,0 +1,201 @@
+"""
+Persistent crawl frontier.
+
+A SQLite-backed work queue of discovered product URLs and their status.
+Finished records are checkpointed as soon as they complete, so a crawl
+that crashes or runs out of time can be resumed by the next run.
+"""
+
+import datetime
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("ebike_crawler.frontier")
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    finished_at TEXT
+);
+CREATE TABLE IF NOT EXISTS sites (
+    run_id TEXT NOT NULL,
+    website TEXT NOT NULL,
+    discovered_at TEXT,
+    saved_at TEXT,
+    PRIMARY KEY (run_id, website)
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    run_id TEXT NOT NULL,
+    website TEXT NOT NULL,
+    url TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    language TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    page_fingerprint TEXT,
+    record TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (run_id, website, url)
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (run_id, website, status);
+CREATE INDEX IF NOT EXISTS tasks_position ON tasks (run_id, website, position);
+"""
+
+
+def _now() -> str:
+    return datetime.datetime.now().isoformat()
+
+
+class CrawlFrontier:
+    """
+    Work queue of product pages for a crawl run.
+
+    Each task is one (product_id, language) URL of a website. All writes are
+    committed immediately; the connection is shared between crawler threads
+    behind a lock.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self.run_id: Optional[str] = None
+
+    def start_run(self, resume: bool = False) -> str:
+        """
+        Start a new run, or continue the most recent unfinished one if `resume`.
+
+        Starting a new run drops the task tables of finished runs.
+        """
+        with self._lock:
+            if resume:
+                row = self._conn.execute(
+                    "SELECT run_id FROM runs WHERE finished_at IS NULL ORDER BY started_at DESC LIMIT 1"
+                ).fetchone()
+                if row:
+                    self.run_id = row[0]
+                    logger.info(f"Resuming crawl run {self.run_id}")
+                    return self.run_id
+
+            self.run_id = datetime.datetime.now().strftime("%Y%m%dT%H%M%S%f")
+            with self._conn:
+                self._conn.execute("DELETE FROM tasks WHERE run_id IN (SELECT run_id FROM runs WHERE finished_at IS NOT NULL)")
+                self._conn.execute("DELETE FROM sites WHERE run_id IN (SELECT run_id FROM runs WHERE finished_at IS NOT NULL)")
+                self._conn.execute("DELETE FROM runs WHERE finished_at IS NOT NULL")
+                self._conn.execute("INSERT INTO runs (run_id, started_at) VALUES (?, ?)", (self.run_id, _now()))
+            logger.info(f"Started crawl run {self.run_id}")
+            return self.run_id
+
+    def finish_run(self):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (_now(), self.run_id))
+
+    def is_discovered(self, website: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT discovered_at FROM sites WHERE run_id = ? AND website = ?", (self.run_id, website)
+            ).fetchone()
+        return bool(row and row[0])
+
+    def is_saved(self, website: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT saved_at FROM sites WHERE run_id = ? AND website = ?", (self.run_id, website)
+            ).fetchone()
+        return bool(row and row[0])
+
+    def enqueue(self, website: str, tasks: List[Tuple[str, str, str]]):
+        """Record the discovered (product_id, language, url) tasks of a website."""
+        now = _now()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO tasks (run_id, website, url, product_id, language, position, status, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (self.run_id, website, url, product_id, lang, position, STATUS_PENDING, now)
+                    for position, (product_id, lang, url) in enumerate(tasks)
+                ],
+            )
+            self._conn.execute(
+                "INSERT INTO sites (run_id, website, discovered_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (run_id, website) DO UPDATE SET discovered_at = excluded.discovered_at",
+                (self.run_id, website, now),
+            )
+
+    def product_ids(self, website: str) -> List[str]:
+        """Discovered product IDs of a website, in discovery order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT product_id FROM tasks WHERE run_id = ? AND website = ? GROUP BY product_id ORDER BY MIN(position)",
+                (self.run_id, website),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def pending(self, website: str) -> List[Tuple[str, str, str]]:
+        """Tasks of a website that are not done yet, in discovery order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT product_id, language, url FROM tasks WHERE run_id = ? AND website = ? AND status != ? "
+                "ORDER BY position",
+                (self.run_id, website, STATUS_DONE),
+            ).fetchall()
+        return [tuple(row) for row in rows]
+
+    def complete(self, website: str, url: str, record: Dict[str, Any], page_fingerprint: Optional[str] = None):
+        """Checkpoint a finished record."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE tasks SET status = ?, attempts = attempts + 1, record = ?, page_fingerprint = ?, updated_at = ? "
+                "WHERE run_id = ? AND website = ? AND url = ?",
+                (STATUS_DONE, json.dumps(record, ensure_ascii=False, default=str), page_fingerprint, _now(),
+                 self.run_id, website, url),
+            )
+
+    def fail(self, website: str, url: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE tasks SET status = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE run_id = ? AND website = ? AND url = ?",
+                (STATUS_FAILED, _now(), self.run_id, website, url),
+            )
+
+    def done(self, website: str, batch_size: int = 500) -> Iterator[Tuple[str, Dict[str, Any], Optional[str]]]:
+        """(url, record, page_fingerprint) of finished tasks, in discovery order, read in batches."""
+        position = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT url, record, page_fingerprint, position FROM tasks "
+                    "WHERE run_id = ? AND website = ? AND status = ? AND position > ? ORDER BY position LIMIT ?",
+                    (self.run_id, website, STATUS_DONE, position, batch_size),
+                ).fetchall()
+            for url, record, page_fingerprint, position in rows:
+                yield url, json.loads(record), page_fingerprint
+            if len(rows) < batch_size:
+                return
+
+    def mark_saved(self, website: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sites (run_id, website, saved_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (run_id, website) DO UPDATE SET saved_at = excluded.saved_at",
+                (self.run_id, website, _now()),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,249 @@
+"""
+Columnar, partitioned history store for crawled products.
+
+Every run appends the products that changed since the previous run to a
+Parquet file partitioned by site and crawl date:
+
+    data/history/site=<website_key>/date=<YYYY-MM-DD>/part-<HHMMSSffffff>.parquet
+
+String columns are dictionary-encoded and unchanged rows are not written
+again, so the repeated descriptions of the old dated CSV files are stored
+once. Products that disappear get a tombstone row (deleted=True).
+"""
+
+import argparse
+import ast
+import csv
+import datetime
+import hashlib
+import json
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = logging.getLogger("ebike_crawler.history")
+
+# Columns stored for every product row, in order
+PRODUCT_COLUMNS = [
+    "name", "price", "description", "battery", "motor_type", "max_speed", "range", "weight", "max_load",
+    "images", "original_images", "website", "product_id", "language", "url", "crawl_date",
+]
+LIST_COLUMNS = {"images", "original_images"}
+# Columns that do not make a product row different from the previous one
+VOLATILE_COLUMNS = {"crawl_date"}
+
+SCHEMA = pa.schema(
+    [
+        pa.field(column, pa.float64() if column == "price"
+                 else pa.list_(pa.string()) if column in LIST_COLUMNS
+                 else pa.string())
+        for column in PRODUCT_COLUMNS
+    ]
+    + [pa.field("row_hash", pa.string()), pa.field("deleted", pa.bool_())]
+)
+
+_DATED_CSV = re.compile(r"^(?P<site>.+)_(?P<date>\d{8})\.csv$")
+
+
+def _normalize(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Coerce a crawled record (or CSV row) to the store schema."""
+    row = {}
+    for column in PRODUCT_COLUMNS:
+        value = record.get(column)
+        if value is None or (isinstance(value, float) and value != value) or value == "":
+            row[column] = None
+        elif column == "price":
+            try:
+                row[column] = float(value)
+            except (TypeError, ValueError):
+                row[column] = None
+        elif column in LIST_COLUMNS:
+            if isinstance(value, str):
+                try:
+                    value = ast.literal_eval(value) if value.startswith("[") else [value]
+                except (ValueError, SyntaxError):
+                    value = [value]
+            row[column] = [str(v) for v in value]
+        else:
+            row[column] = str(value)
+    return row
+
+
+def _row_hash(row: Dict[str, Any]) -> str:
+    stable = {k: v for k, v in row.items() if k not in VOLATILE_COLUMNS}
+    return hashlib.sha1(json.dumps(stable, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _key(row: Dict[str, Any]) -> str:
+    return f"{row.get('product_id')}|{row.get('language')}"
+
+
+class HistoryStore:
+    """Append-only product history partitioned by site and date."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.state_dir = self.root / "_state"
+
+    def _site_dir(self, website_key: str) -> Path:
+        return self.root / f"site={website_key}"
+
+    def _state_path(self, website_key: str) -> Path:
+        return self.state_dir / f"{website_key}.json"
+
+    def _latest_hashes(self, website_key: str) -> Dict[str, str]:
+        """Row hash of the latest live version of each product, keyed by product_id|language."""
+        path = self._state_path(website_key)
+        if path.exists():
+            return json.loads(path.read_text())
+        # State missing: rebuild it from the stored partitions
+        table = self.snapshot(website_key)
+        if table is None:
+            return {}
+        return {_key(row): row["row_hash"] for row in table.to_pylist()}
+
+    def append(self, website_key: str, records: Iterable[Dict[str, Any]],
+               crawl_date: Optional[datetime.date] = None) -> int:
+        """
+        Append one full crawl of a site, writing only new or changed rows.
+
+        Products present in the previous crawl but missing from `records` are
+        written as tombstones. Returns the number of rows written.
+        """
+        crawl_date = crawl_date or datetime.date.today()
+        latest = self._latest_hashes(website_key)
+        current: Dict[str, str] = {}
+        rows = []
+
+        for record in records:
+            row = _normalize(record)
+            row["row_hash"] = _row_hash(row)
+            row["deleted"] = False
+            key = _key(row)
+            current[key] = row["row_hash"]
+            if latest.get(key) != row["row_hash"]:
+                rows.append(row)
+
+        for key in latest.keys() - current.keys():
+            product_id, _, language = key.partition("|")
+            tombstone = {column: None for column in PRODUCT_COLUMNS}
+            tombstone.update(product_id=product_id, language=language, crawl_date=crawl_date.isoformat(),
+                             row_hash=None, deleted=True)
+            rows.append(tombstone)
+
+        if rows:
+            partition = self._site_dir(website_key) / f"date={crawl_date.isoformat()}"
+            partition.mkdir(parents=True, exist_ok=True)
+            path = partition / f"part-{datetime.datetime.now().strftime('%H%M%S%f')}.parquet"
+            table = pa.Table.from_pylist(rows, schema=SCHEMA)
+            tmp_path = path.with_name(path.name + ".tmp")
+            pq.write_table(table, tmp_path, use_dictionary=True, compression="zstd")
+            os.replace(tmp_path, path)
+            logger.info(f"Appended {len(rows)} history rows for {website_key} to {path}")
+        else:
+            logger.info(f"No history changes for {website_key}")
+
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        state_path = self._state_path(website_key)
+        tmp_state = state_path.with_name(state_path.name + ".tmp")
+        tmp_state.write_text(json.dumps(current, sort_keys=True))
+        os.replace(tmp_state, state_path)
+        return len(rows)
+
+    def sites(self) -> List[str]:
+        if not self.root.exists():
+            return []
+        return sorted(p.name.split("=", 1)[1] for p in self.root.glob("site=*") if p.is_dir())
+
+    def partitions(self, website_key: Optional[str] = None, start: Optional[datetime.date] = None,
+                   end: Optional[datetime.date] = None) -> List[Tuple[str, datetime.date, Path]]:
+        """
+        List (site, date, file) partitions in date order, pruned by path only.
+
+        No Parquet file is opened to decide which partitions match.
+        """
+        sites = [website_key] if website_key else self.sites()
+        result = []
+        for site in sites:
+            for date_dir in self._site_dir(site).glob("date=*"):
+                date = datetime.date.fromisoformat(date_dir.name.split("=", 1)[1])
+                if (start and date < start) or (end and date > end):
+                    continue
+                for path in sorted(date_dir.glob("part-*.parquet")):
+                    result.append((site, date, path))
+        result.sort(key=lambda item: (item[1], item[0], item[2].name))
+        return result
+
+    def read(self, website_key: Optional[str] = None, start: Optional[datetime.date] = None,
+             end: Optional[datetime.date] = None, columns: Optional[List[str]] = None) -> Optional[pa.Table]:
+        """
+        Read history rows for one site (or all) within an inclusive date range.
+
+        Adds `site` and `date` columns from the partition path. Returns None if
+        nothing matches.
+        """
+        tables = []
+        for site, date, path in self.partitions(website_key, start, end):
+            table = pq.read_table(path, columns=columns)
+            table = table.append_column("site", pa.array([site] * table.num_rows, pa.string()))
+            table = table.append_column("date", pa.array([date] * table.num_rows, pa.date32()))
+            tables.append(table)
+        if not tables:
+            return None
+        return pa.concat_tables(tables)
+
+    def snapshot(self, website_key: str, as_of: Optional[datetime.date] = None) -> Optional[pa.Table]:
+        """Latest live version of every product of a site on or before `as_of`."""
+        table = self.read(website_key, end=as_of)
+        if table is None:
+            return None
+        latest: Dict[str, Dict[str, Any]] = {}
+        for row in table.to_pylist():  # rows are in date/part order, later rows win
+            latest[_key(row)] = row
+        live = [row for row in latest.values() if not row["deleted"]]
+        if not live:
+            return None
+        return pa.Table.from_pylist(live, schema=table.schema)
+
+    def import_csv(self, path: Path, website_key: Optional[str] = None,
+                   crawl_date: Optional[datetime.date] = None) -> int:
+        """Import a legacy `<site>_<YYYYMMDD>.csv` file; site and date default to the filename."""
+        path = Path(path)
+        match = _DATED_CSV.match(path.name)
+        if match:
+            website_key = website_key or match.group("site")
+            crawl_date = crawl_date or datetime.datetime.strptime(match.group("date"), "%Y%m%d").date()
+        if not website_key or not crawl_date:
+            raise ValueError(f"Cannot infer site and date from {path.name}")
+        with open(path, newline="", encoding="utf-8") as f:
+            records = list(csv.DictReader(f))
+        return self.append(website_key, records, crawl_date)
+
+
+def main(argv: Optional[List[str]] = None):
+    """Import legacy dated CSV files into the history store, oldest first."""
+    from .crawler import HISTORY_DIR
+
+    parser = argparse.ArgumentParser(description="Import dated CSV files into the product history store")
+    parser.add_argument("paths", nargs="+", help="CSV files or directories containing <site>_<YYYYMMDD>.csv files")
+    parser.add_argument("--root", default=str(HISTORY_DIR), help="history store directory")
+    args = parser.parse_args(argv)
+
+    files = []
+    for path in map(Path, args.paths):
+        files.extend(path.glob("*.csv") if path.is_dir() else [path])
+    dated = sorted((m.group("date"), str(p), p) for p in files if (m := _DATED_CSV.match(p.name)))
+
+    store = HistoryStore(Path(args.root))
+    for _, _, path in dated:
+        rows = store.import_csv(path)
+        print(f"{path}: {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+HTTP session layer for the e-bike crawler.
+
+Provides a pooled, keep-alive requests session that revalidates pages with
+If-None-Match / If-Modified-Since and serves 304 responses from a size-bounded
+on-disk cache of gzip-compressed bodies.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger("ebike_crawler.http")
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+DEFAULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_POOL_SIZE = 32
+
+
+class CachedResponse:
+    """Minimal response object returned by CachedSession.get()."""
+
+    __slots__ = ("url", "status_code", "content", "encoding", "headers", "from_cache")
+
+    def __init__(self, url: str, status_code: int, content: bytes, encoding: Optional[str],
+                 headers: Mapping[str, str], from_cache: bool = False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.encoding = encoding
+        self.headers = headers
+        self.from_cache = from_cache
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+
+class ResponseCache:
+    """
+    On-disk cache of response bodies keyed by URL.
+
+    Each entry is a `<key>.json` metadata file (validators, encoding, size)
+    next to a `<key>.gz` body. Entries are evicted least-recently-used first
+    once the total body size exceeds `max_bytes`; metadata mtimes record the
+    last access so the LRU order survives between runs.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[int, float]] = {}  # key -> (size, last_access)
+        self._total_bytes = 0
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        for meta_path in self.cache_dir.glob("*.json"):
+            body_path = meta_path.with_suffix(".gz")
+            if not body_path.exists():
+                meta_path.unlink(missing_ok=True)
+                continue
+            size = body_path.stat().st_size
+            self._entries[meta_path.stem] = (size, meta_path.stat().st_mtime)
+            self._total_bytes += size
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str) -> Tuple[Path, Path]:
+        return self.cache_dir / f"{key}.json", self.cache_dir / f"{key}.gz"
+
+    def get_meta(self, url: str) -> Optional[Dict[str, str]]:
+        """Return stored metadata for a URL, or None if it is not cached."""
+        key = self.key(url)
+        if key not in self._entries:
+            return None
+        meta_path, _ = self._paths(key)
+        try:
+            return json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            return None
+
+    def validators(self, url: str) -> Dict[str, str]:
+        """Build conditional request headers for a cached URL."""
+        meta = self.get_meta(url)
+        headers = {}
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def load(self, url: str) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        """Load a cached body and its metadata, marking the entry as recently used."""
+        key = self.key(url)
+        meta_path, body_path = self._paths(key)
+        now = time.time()
+        try:
+            meta = json.loads(meta_path.read_text())
+            body = gzip.decompress(body_path.read_bytes())
+            # Fails if another process evicted the entry after the read
+            os.utime(meta_path, (now, now))
+        except (OSError, ValueError, EOFError):
+            return None
+
+        with self._lock:
+            if key in self._entries:
+                self._entries[key] = (self._entries[key][0], now)
+        return body, meta
+
+    def store(self, url: str, content: bytes, headers: Mapping[str, str], encoding: Optional[str]):
+        """Store a response body if the server supplied cache validators."""
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+
+        key = self.key(url)
+        meta_path, body_path = self._paths(key)
+        compressed = gzip.compress(content, compresslevel=6)
+        meta = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "encoding": encoding,
+            "content_type": headers.get("Content-Type"),
+            "stored_at": time.time(),
+        }
+
+        # Write to temp files first so a crash never leaves a torn entry
+        tmp_body = body_path.with_suffix(f".gz.{threading.get_ident()}.tmp")
+        tmp_meta = meta_path.with_suffix(f".json.{threading.get_ident()}.tmp")
+        tmp_body.write_bytes(compressed)
+        tmp_meta.write_text(json.dumps(meta))
+        os.replace(tmp_body, body_path)
+        os.replace(tmp_meta, meta_path)
+
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous:
+                self._total_bytes -= previous[0]
+            self._entries[key] = (len(compressed), time.time())
+            self._total_bytes += len(compressed)
+            self._evict()
+
+    def _evict(self):
+        """Drop least-recently-used entries until the cache fits in max_bytes. Caller holds the lock."""
+        if self._total_bytes <= self.max_bytes:
+            return
+        for key, (size, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            for path in self._paths(key):
+                path.unlink(missing_ok=True)
+            del self._entries[key]
+            self._total_bytes -= size
+            logger.debug(f"Evicted cache entry {key}")
+
+
+class CachedSession:
+    """
+    Thread-safe pooled HTTP session with conditional revalidation.
+
+    A single instance is shared by all crawler threads; the connection pool is
+    sized so that every in-flight request can keep its connection alive.
+    """
+
+    def __init__(self, cache: Optional[ResponseCache] = None, pool_size: int = DEFAULT_POOL_SIZE,
+                 headers: Optional[Dict[str, str]] = None):
+        self.cache = cache
+        self.session = requests.Session()
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url: str, timeout: int = 10) -> CachedResponse:
+        """
+        Fetch a URL, revalidating against the cache when possible.
+
+        Raises:
+            requests.RequestException: On network errors or non-2xx/304 responses
+        """
+        headers = self.cache.validators(url) if self.cache else {}
+        response = self.session.get(url, headers=headers, timeout=timeout)
+
+        if response.status_code == 304 and self.cache:
+            cached = self.cache.load(url)
+            if cached:
+                body, meta = cached
+                logger.debug(f"Cache hit (304) for {url}")
+                return CachedResponse(url, 304, body, meta.get("encoding"), response.headers, from_cache=True)
+            # Body went missing underneath us; refetch unconditionally
+            response = self.session.get(url, timeout=timeout)
+
+        response.raise_for_status()
+        encoding = response.encoding or response.apparent_encoding
+        if self.cache:
+            self.cache.store(url, response.content, response.headers, encoding)
+        return CachedResponse(url, response.status_code, response.content, encoding, response.headers)
+
+    def close(self):
+        self.session.close()
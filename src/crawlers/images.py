@@ -0,0 +1,216 @@
+"""
+Content-addressed product image pipeline.
+
+Product images are downloaded concurrently, paced per host by the crawl's
+politeness scheduler, and stored once by the SHA-256
+of their bytes, however many products, languages or runs reference them:
+
+    data/images/objects/<ab>/<sha256>.<ext>   original image
+    data/images/index.json                    image URL -> sha256
+
+Responsive WebP thumbnails are rendered in a process pool for new hashes
+only and written where the static site can serve them:
+
+    src/web/data/thumbs/<width>/<sha256>.webp
+"""
+
+import hashlib
+import json
+import logging
+import mimetypes
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+from urllib.parse import urlparse
+
+import requests
+
+from .politeness import PolitenessScheduler
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - thumbnails are skipped without Pillow
+    Image = None
+
+logger = logging.getLogger("ebike_crawler.images")
+
+THUMBNAIL_WIDTHS = (320, 640)
+THUMBNAIL_QUALITY = 80
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+DEFAULT_DOWNLOAD_WORKERS = 8
+
+
+def _extension(url: str, content_type: Optional[str]) -> str:
+    if content_type:
+        extension = mimetypes.guess_extension(content_type.split(";")[0].strip())
+        if extension:
+            return ".jpg" if extension == ".jpe" else extension
+    suffix = Path(urlparse(url).path).suffix.lower()
+    return suffix if suffix in {".jpg", ".jpeg", ".png", ".webp", ".gif", ".avif"} else ".bin"
+
+
+def _render_thumbnails(source: str, targets: Sequence[tuple]) -> List[int]:
+    """Render (width, path) thumbnails of one image. Runs in a worker process."""
+    rendered = []
+    with Image.open(source) as image:
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        for width, target in targets:
+            thumbnail = image.copy()
+            if thumbnail.width > width:
+                height = max(1, round(thumbnail.height * width / thumbnail.width))
+                thumbnail = thumbnail.resize((width, height), Image.LANCZOS)
+            Path(target).parent.mkdir(parents=True, exist_ok=True)
+            tmp_target = f"{target}.tmp"
+            thumbnail.save(tmp_target, "WEBP", quality=THUMBNAIL_QUALITY, method=4)
+            os.replace(tmp_target, target)
+            rendered.append(width)
+    return rendered
+
+
+class ImageStore:
+    """Deduplicated image objects plus the URL -> hash index."""
+
+    def __init__(self, root: Path, thumbnail_dir: Path):
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+        self.index_path = self.root / "index.json"
+        self.thumbnail_dir = Path(thumbnail_dir)
+        self._lock = threading.Lock()
+        self.urls: Dict[str, str] = {}
+        self.objects: Dict[str, Dict] = {}
+        if self.index_path.exists():
+            index = json.loads(self.index_path.read_text())
+            self.urls = index.get("urls", {})
+            self.objects = index.get("objects", {})
+
+    def object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / f"{digest}{self.objects[digest]['ext']}"
+
+    def thumbnail_path(self, digest: str, width: int) -> Path:
+        return self.thumbnail_dir / str(width) / f"{digest}.webp"
+
+    def add(self, url: str, content: bytes, content_type: Optional[str]) -> str:
+        """Store image bytes under their content hash; returns the hash."""
+        digest = hashlib.sha256(content).hexdigest()
+        with self._lock:
+            is_new = digest not in self.objects
+            if is_new:
+                self.objects[digest] = {"ext": _extension(url, content_type), "bytes": len(content), "thumbs": []}
+            self.urls[url] = digest
+        if is_new:
+            path = self.object_path(digest)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(path.name + ".tmp")
+            tmp_path.write_bytes(content)
+            os.replace(tmp_path, path)
+        return digest
+
+    def save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            data = {"urls": self.urls, "objects": self.objects}
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        tmp_path.write_text(json.dumps(data, sort_keys=True, indent=1))
+        os.replace(tmp_path, self.index_path)
+
+    def thumbnail_map(self, width: int = THUMBNAIL_WIDTHS[0]) -> Dict[str, str]:
+        """Image URL -> thumbnail file name (relative to the thumbnail dir) for rendered images."""
+        return {
+            url: f"{width}/{digest}.webp"
+            for url, digest in self.urls.items()
+            if width in self.objects.get(digest, {}).get("thumbs", [])
+        }
+
+
+def download_images(store: ImageStore, urls: Iterable[str], session: requests.Session,
+                    politeness: Optional[PolitenessScheduler] = None,
+                    max_workers: int = DEFAULT_DOWNLOAD_WORKERS) -> Dict[str, str]:
+    """
+    Download image URLs not yet in the store, concurrently.
+
+    With a politeness scheduler, every download waits for its host's next
+    slot and reports its outcome, like the crawler's page requests.
+
+    Returns:
+        Mapping of newly stored URL -> content hash
+    """
+    pending = sorted({u for u in urls if u and "{" not in u and u not in store.urls})
+    if not pending:
+        return {}
+
+    def fetch(url: str) -> Optional[str]:
+        if politeness:
+            politeness.wait(url)
+        started = time.monotonic()
+        try:
+            response = session.get(url, timeout=20)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            if politeness:
+                error_response = getattr(e, "response", None)
+                politeness.record(url, time.monotonic() - started,
+                                  error_response.status_code if error_response is not None else None,
+                                  error_response.headers if error_response is not None else None)
+            logger.warning(f"Could not download image {url}: {e}")
+            return None
+        if politeness:
+            politeness.record(url, time.monotonic() - started, response.status_code)
+        if len(response.content) > MAX_IMAGE_BYTES:
+            logger.warning(f"Skipping oversized image {url} ({len(response.content)} bytes)")
+            return None
+        return store.add(url, response.content, response.headers.get("Content-Type"))
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="images") as executor:
+        results = dict(zip(pending, executor.map(fetch, pending)))
+    stored = {url: digest for url, digest in results.items() if digest}
+    logger.info(f"Downloaded {len(stored)}/{len(pending)} new images")
+    return stored
+
+
+def generate_thumbnails(store: ImageStore, widths: Sequence[int] = THUMBNAIL_WIDTHS,
+                        max_workers: Optional[int] = None) -> int:
+    """
+    Render missing thumbnails in a process pool. Returns the number of images processed.
+
+    Workers are spawned rather than forked: the crawler's threads and HTTP
+    session are still alive, and a forked child could inherit their locks held.
+    """
+    if Image is None:
+        logger.warning("Pillow is not installed; skipping thumbnail generation")
+        return 0
+
+    jobs = {}
+    for digest, meta in store.objects.items():
+        missing = [w for w in widths if w not in meta.get("thumbs", [])]
+        if missing:
+            jobs[digest] = [(w, str(store.thumbnail_path(digest, w))) for w in missing]
+    if not jobs:
+        return 0
+
+    processed = 0
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = {
+            digest: executor.submit(_render_thumbnails, str(store.object_path(digest)), targets)
+            for digest, targets in jobs.items()
+        }
+        for digest, future in futures.items():
+            try:
+                rendered = future.result()
+            except Exception as e:
+                logger.warning(f"Could not render thumbnails for {digest}: {e}")
+                continue
+            store.objects[digest]["thumbs"] = sorted(set(store.objects[digest].get("thumbs", [])) | set(rendered))
+            processed += 1
+    logger.info(f"Rendered thumbnails for {processed}/{len(jobs)} images")
+    return processed
+
+
+def process_images(products: Iterable[Dict], store: ImageStore, session: requests.Session,
+                   politeness: Optional[PolitenessScheduler] = None) -> int:
+    """Download any new images referenced by the products. Returns the number of new URLs stored."""
+    urls = [url for product in products for url in product.get("images") or []]
+    return len(download_images(store, urls, session, politeness))
@@ -0,0 +1,276 @@
+"""
+Incremental crawl support.
+
+Keeps a per-site store of page and record fingerprints from the previous
+run so unchanged pages can skip parsing, and computes the change feed
+(added / removed / changed products with per-field diffs) between runs.
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger("ebike_crawler.incremental")
+
+# Fields that change on every run and must not count as a product change
+VOLATILE_FIELDS = {"crawl_date"}
+
+
+def fingerprint(content: bytes) -> str:
+    """Content fingerprint of a fetched page."""
+    return hashlib.sha256(content).hexdigest()
+
+
+def record_fingerprint(record: Dict[str, Any]) -> str:
+    """Fingerprint of an extracted product record, ignoring volatile fields."""
+    stable = {k: v for k, v in record.items() if k not in VOLATILE_FIELDS}
+    payload = json.dumps(stable, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def extraction_fingerprint(website_config: Dict[str, Any]) -> str:
+    """Fingerprint of the configuration that turns a website's pages into records."""
+    extraction = {
+        "selectors": website_config.get("selectors", {}),
+        "parse_only": website_config.get("parse_only"),
+        "json_ld": bool(website_config.get("structured_source", {}).get("json_ld")),
+    }
+    payload = json.dumps(extraction, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def record_key(record: Dict[str, Any]) -> Tuple[str, str]:
+    return record.get("product_id", ""), record.get("language", "")
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    url TEXT PRIMARY KEY,
+    product_id TEXT NOT NULL,
+    language TEXT NOT NULL,
+    page TEXT NOT NULL,
+    extraction TEXT NOT NULL,
+    record_hash TEXT NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_key ON entries (product_id, language);
+CREATE TEMP TABLE run_entries AS SELECT * FROM entries WHERE 0;
+CREATE UNIQUE INDEX temp.run_entries_url ON run_entries (url);
+CREATE INDEX temp.run_entries_key ON run_entries (product_id, language);
+"""
+
+_COLUMNS = "url, product_id, language, page, extraction, record_hash, record"
+
+
+class FingerprintStore:
+    """
+    Page fingerprints and records for one website, keyed by product URL.
+
+    Each entry holds the page fingerprint, the fingerprint of the extraction
+    configuration the record was produced with and the extracted record
+    itself, so an unchanged page can reuse the previous record without being
+    parsed again. Records extracted with a different configuration (e.g.
+    before a selector fix) are never reused.
+
+    Entries live in SQLite: those of the previous run in the file, those of
+    the current run in a temp table until `save()`, so neither run's records
+    are held in memory. The connection is shared between crawler threads
+    behind a lock.
+
+    Args:
+        path: SQLite file of the store; a JSON store of the same name from
+            earlier versions is imported once
+        extraction: extraction_fingerprint() of the website's current configuration
+    """
+
+    def __init__(self, path: Path, extraction: str = ""):
+        self.path = Path(path)
+        self.extraction = extraction
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        legacy_path = self.path.with_suffix(".json")
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        if legacy_path.exists():
+            self._import_json(legacy_path)
+
+    def __enter__(self) -> "FingerprintStore":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _import_json(self, legacy_path: Path):
+        try:
+            entries = json.loads(legacy_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable fingerprint store {legacy_path}: {e}")
+            entries = {}
+        with self._conn:
+            self._conn.executemany(
+                f"INSERT OR IGNORE INTO entries ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [self._row(url, entry["page"], entry.get("extraction", ""), entry["record"])
+                 for url, entry in entries.items()],
+            )
+        legacy_path.unlink()
+        logger.info(f"Imported {len(entries)} fingerprints from {legacy_path}")
+
+    @staticmethod
+    def _row(url: str, page_fingerprint: str, extraction: str, record: Dict[str, Any]) -> Tuple:
+        product_id, language = record_key(record)
+        return (url, str(product_id), str(language), page_fingerprint, extraction, record_fingerprint(record),
+                json.dumps(record, ensure_ascii=False, default=str))
+
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        """The entry of a URL from this run, or else from the previous run."""
+        with self._lock:
+            row = None
+            for table in ("run_entries", "entries"):
+                row = self._conn.execute(f"SELECT page, extraction, record FROM {table} WHERE url = ?", (url,)).fetchone()
+                if row is not None:
+                    break
+        if row is None:
+            return None
+        return {"page": row[0], "extraction": row[1], "record": json.loads(row[2])}
+
+    def unchanged_record(self, url: str, page_fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Return the previous record if the page and the extraction configuration are unchanged."""
+        entry = self.lookup(url)
+        if entry and entry["page"] == page_fingerprint and entry["extraction"] == self.extraction:
+            return entry["record"]
+        return None
+
+    def update(self, url: str, page_fingerprint: str, record: Dict[str, Any]):
+        row = self._row(url, page_fingerprint, self.extraction, record)
+        with self._lock, self._conn:
+            self._conn.execute(f"INSERT OR REPLACE INTO run_entries ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+
+    def mark_seen(self, url: str):
+        """Carry the previous run's entry of a URL over to this run."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR IGNORE INTO run_entries ({_COLUMNS}) SELECT {_COLUMNS} FROM entries WHERE url = ?", (url,)
+            )
+
+    def changes(self) -> "ChangeFeed":
+        """
+        Added, removed and changed products of this run against the previous one.
+
+        Products are matched on (product_id, language); records with the same
+        hash are unchanged without being compared field by field.
+        """
+        feed = ChangeFeed()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT r.product_id, r.language, r.url, r.record, r.record_hash, e.record, e.record_hash "
+                "FROM run_entries r LEFT JOIN entries e ON e.product_id = r.product_id AND e.language = r.language "
+                "ORDER BY r.product_id, r.language"
+            )
+            for product_id, language, url, record, record_hash, old_record, old_hash in rows:
+                if old_record is None:
+                    feed.add("added", json.loads(record))
+                    continue
+                fields = {} if record_hash == old_hash else _field_diff(json.loads(old_record), json.loads(record))
+                if fields:
+                    feed.add("changed", {"product_id": product_id, "language": language, "url": url, "fields": fields})
+                else:
+                    feed.summary["unchanged"] += 1
+
+            rows = self._conn.execute(
+                "SELECT product_id, language, url FROM entries e WHERE NOT EXISTS "
+                "(SELECT 1 FROM run_entries r WHERE r.product_id = e.product_id AND r.language = e.language) "
+                "ORDER BY product_id, language"
+            )
+            for product_id, language, url in rows:
+                feed.add("removed", {"product_id": product_id, "language": language, "url": url})
+        return feed
+
+    def save(self):
+        """Replace the stored entries with this run's; products no longer discovered are dropped."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute(f"INSERT INTO entries ({_COLUMNS}) SELECT {_COLUMNS} FROM run_entries")
+            self._conn.execute("DELETE FROM run_entries")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _field_diff(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    fields = {}
+    for field in sorted((old.keys() | new.keys()) - VOLATILE_FIELDS):
+        if old.get(field) != new.get(field):
+            fields[field] = {"old": old.get(field), "new": new.get(field)}
+    return fields
+
+
+class ChangeFeed:
+    """
+    Added, removed and changed products between two runs.
+
+    Entries are spooled to temp files as they are found, so a run that adds
+    every product is not held in memory; `summary` has the counts. Changed
+    products carry a per-field diff of old and new values.
+    """
+
+    SECTIONS = ("added", "removed", "changed")
+
+    def __init__(self):
+        self.summary = {"added": 0, "removed": 0, "changed": 0, "unchanged": 0}
+        self._spools = {section: tempfile.TemporaryFile("w+", encoding="utf-8") for section in self.SECTIONS}
+
+    def __enter__(self) -> "ChangeFeed":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, section: str, entry: Dict[str, Any]):
+        self._spools[section].write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+        self.summary[section] += 1
+
+    def entries(self, section: str) -> Iterator[str]:
+        """The JSON-encoded entries of a section, in order."""
+        spool = self._spools[section]
+        spool.flush()
+        spool.seek(0)
+        for line in spool:
+            yield line.rstrip("\n")
+
+    def close(self):
+        for spool in self._spools.values():
+            spool.close()
+
+
+def has_changes(delta: ChangeFeed) -> bool:
+    summary = delta.summary
+    return bool(summary["added"] or summary["removed"] or summary["changed"])
+
+
+def write_change_feed(changes_dir: Path, website_key: str, delta: ChangeFeed) -> Path:
+    """Write a run's delta to `<changes_dir>/<website_key>_<YYYYMMDD>.json`, one entry per line."""
+    now = datetime.datetime.now()
+    path = Path(changes_dir) / f"{website_key}_{now.strftime('%Y%m%d')}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    header = {"website": website_key, "generated_at": now.isoformat(), "summary": delta.summary}
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("{\n")
+        for key, value in header.items():
+            f.write(f" {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)},\n")
+        for number, section in enumerate(ChangeFeed.SECTIONS):
+            f.write(f' "{section}": [')
+            for position, entry in enumerate(delta.entries(section)):
+                f.write(("," if position else "") + "\n  " + entry)
+            f.write("\n ]" + ("," if number < len(ChangeFeed.SECTIONS) - 1 else "") + "\n")
+        f.write("}\n")
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,374 @@
+"""
+Cross-site product matching.
+
+Links rows that describe the same bike, across websites (engwe_us vs
+engwe_eu, other retailers) and languages, to one canonical product ID.
+
+Rows of one website with the same product_id are one product in several
+languages and are joined directly. Across websites, every product gets a
+MinHash signature with one block each for shingles of its normalized
+name, the start of its description and its bucketed key specs. The name
+block is split into bands for locality-sensitive hashing, so only
+products sharing a band bucket are compared. A candidate pair is accepted
+when the weighted similarity of the blocks reaches the threshold, the
+model numbers in the names agree and the specs do not contradict each
+other. Accepted pairs are joined most similar first, and a cluster holds at
+most one product per website.
+
+The index is stored as
+
+    data/state/matching/records.tsv       key, text hash, canonical ID, specs
+    data/state/matching/signatures.npy    one MinHash signature per record
+
+Updates only compute signatures for new or changed products, and products
+keep their canonical ID as long as their cluster does.
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import zlib
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .normalize import SPEC_COLUMNS, parse_spec
+
+logger = logging.getLogger("ebike_crawler.matching")
+
+# Signature block per feature kind: (permutations, weight in the similarity)
+BLOCKS = {"name": (32, 0.6), "description": (16, 0.2), "specs": (16, 0.2)}
+NUM_PERM = sum(perms for perms, _ in BLOCKS.values())
+# LSH bands over the name block
+BANDS = 8
+THRESHOLD = 0.6
+# Relative difference above which two values of the same spec contradict a match
+SPEC_TOLERANCE = 0.15
+DESCRIPTION_WORDS = 60
+# Band buckets with more products than this are degenerate (e.g. empty names) and skipped
+MAX_BUCKET = 100
+
+_PRIME = (1 << 31) - 1
+_DATED_CSV = re.compile(r"^(?P<site>.+)_(?P<date>\d{8})\.csv$")
+# Words that say nothing about which bike it is
+_STOPWORDS = {
+    "the", "a", "an", "and", "with", "for", "of", "in", "on", "to", "by",
+    "e", "bike", "bikes", "ebike", "ebikes", "electric", "bicycle", "new",
+}
+# Spec -> bucket width used in shingles, in the canonical unit
+_SPEC_BUCKETS = {"battery": 100, "range": 20, "max_speed": 5, "weight": 5, "max_load": 25}
+
+
+def product_key(record: Dict[str, Any]) -> str:
+    """Key of a product across its languages: website|product_id."""
+    return f"{record.get('website', '')}|{record.get('product_id', '')}"
+
+
+def _words(text: str) -> List[str]:
+    return [w for w in re.findall(r"[a-z0-9]+", (text or "").lower()) if w not in _STOPWORDS]
+
+
+def _float(value: Any) -> Optional[float]:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value == value else None
+
+
+def _specs(record: Dict[str, Any]) -> Dict[str, float]:
+    """Key specs in canonical units, from the normalized columns or parsed from the raw text."""
+    specs = {}
+    for field, (column, _) in SPEC_COLUMNS.items():
+        value = _float(record.get(column))
+        if value is None:
+            value, _ = parse_spec(field, record.get(field))
+        if value is not None:
+            specs[field] = value
+    return specs
+
+
+def model_tokens(name: str) -> List[str]:
+    """Name words containing a digit (model numbers, versions), which must agree for a match."""
+    return sorted({w for w in _words(name) if any(c.isdigit() for c in w)})
+
+
+def shingles(record: Dict[str, Any], specs: Dict[str, float]) -> Dict[str, List[str]]:
+    """
+    Features of a product per signature block: name words, word bigrams
+    and character trigrams; description word bigrams; spec buckets.
+    """
+    name = _words(record.get("name"))
+    joined = "".join(name)
+    name_features = {f"n:{w}" for w in name}
+    name_features.update(f"n2:{a} {b}" for a, b in zip(name, name[1:]))
+    name_features.update(f"c:{joined[i:i + 3]}" for i in range(max(len(joined) - 2, 0)))
+    description = _words(record.get("description"))[:DESCRIPTION_WORDS]
+    return {
+        "name": sorted(name_features),
+        "description": sorted({f"{a} {b}" for a, b in zip(description, description[1:])}),
+        "specs": sorted(f"{field}:{int(value // _SPEC_BUCKETS[field])}" for field, value in specs.items()),
+    }
+
+
+class MatchIndex:
+    """Persistent MinHash/LSH index assigning canonical product IDs."""
+
+    def __init__(self, root: Path, bands: int = BANDS, threshold: float = THRESHOLD):
+        if BLOCKS["name"][0] % bands:
+            raise ValueError("The name block size must be a multiple of bands")
+        self.root = Path(root)
+        self.records_path = self.root / "records.tsv"
+        self.signatures_path = self.root / "signatures.npy"
+        self.num_perm = NUM_PERM
+        self.bands = bands
+        self.threshold = threshold
+        self._blocks: Dict[str, Tuple[int, int]] = {}
+        start = 0
+        for block, (perms, _) in BLOCKS.items():
+            self._blocks[block] = (start, start + perms)
+            start += perms
+        rng = np.random.RandomState(1)
+        self._a = rng.randint(1, _PRIME, size=NUM_PERM).astype(np.uint64)
+        self._b = rng.randint(0, _PRIME, size=NUM_PERM).astype(np.uint64)
+        self._load()
+
+    def _load(self):
+        # key -> (text hash, canonical ID, specs)
+        self.entries: Dict[str, Tuple[str, str, Dict[str, float]]] = {}
+        self.signatures: Dict[str, np.ndarray] = {}
+        # key -> model tokens of the name, set by update()
+        self.models: Dict[str, List[str]] = {}
+        if not self.records_path.exists() or not self.signatures_path.exists():
+            return
+        matrix = np.load(self.signatures_path)
+        if matrix.ndim != 2 or matrix.shape[1] != self.num_perm:
+            logger.warning(f"Ignoring match index with {matrix.shape} signatures; rebuilding")
+            return
+        with open(self.records_path, encoding="utf-8") as f:
+            for row, line in enumerate(f):
+                key, text_hash, canonical, specs = line.rstrip("\n").split("\t")
+                self.entries[key] = (text_hash, canonical, json.loads(specs))
+                self.signatures[key] = matrix[row]
+
+    def save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        keys = sorted(self.entries)
+        matrix = np.array([self.signatures[k] for k in keys], dtype=np.uint32).reshape(len(keys), self.num_perm)
+        tmp_path = self.signatures_path.with_name("signatures.tmp.npy")
+        np.save(tmp_path, matrix)
+        os.replace(tmp_path, self.signatures_path)
+        tmp_path = self.records_path.with_name(self.records_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for key in keys:
+                text_hash, canonical, specs = self.entries[key]
+                f.write(f"{key}\t{text_hash}\t{canonical}\t{json.dumps(specs, sort_keys=True)}\n")
+        os.replace(tmp_path, self.records_path)
+
+    def signature(self, features: Dict[str, List[str]]) -> np.ndarray:
+        """
+        MinHash signature: per permutation, the minimum of (a * x + b) mod p
+        over the feature hashes, with a block of permutations per feature kind.
+        Empty blocks are filled with p.
+        """
+        signature = np.full(self.num_perm, _PRIME, dtype=np.uint32)
+        for block, (start, stop) in self._blocks.items():
+            if features[block]:
+                hashes = np.array([zlib.crc32(f.encode("utf-8")) % _PRIME for f in features[block]], dtype=np.uint64)
+                permuted = (self._a[start:stop, None] * hashes[None, :] + self._b[start:stop, None]) % _PRIME
+                signature[start:stop] = permuted.min(axis=1)
+        return signature
+
+    def similarity(self, a: np.ndarray, b: np.ndarray) -> float:
+        """Weighted estimated Jaccard similarity over the blocks both signatures have."""
+        total = weight_sum = 0.0
+        for block, (start, stop) in self._blocks.items():
+            if a[start] == _PRIME or b[start] == _PRIME:
+                continue
+            weight = BLOCKS[block][1]
+            total += weight * float(np.mean(a[start:stop] == b[start:stop]))
+            weight_sum += weight
+        return total / weight_sum if weight_sum else 0.0
+
+    def update(self, records: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Match the current set of records and assign canonical IDs.
+
+        `records` is every current row of every website; products that are
+        no longer present are dropped from the index. Returns counts.
+        """
+        # Languages of a product are one entry; the first language's text is used
+        products: Dict[str, Dict[str, Any]] = {}
+        for record in records:
+            products.setdefault(product_key(record), record)
+
+        signed = 0
+        previous = self.entries
+        self.entries = {}
+        self.models = {}
+        signatures = {}
+        for key, record in products.items():
+            specs = _specs(record)
+            features = shingles(record, specs)
+            text_hash = hashlib.sha1(json.dumps(features, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+            old = previous.get(key)
+            if old and old[0] == text_hash and key in self.signatures:
+                signatures[key] = self.signatures[key]
+            else:
+                signatures[key] = self.signature(features)
+                signed += 1
+            self.entries[key] = (text_hash, old[1] if old else "", specs)
+            self.models[key] = model_tokens(record.get("name"))
+        self.signatures = signatures
+
+        clusters = self._cluster()
+        self._assign_ids(clusters)
+        summary = {
+            "products": len(self.entries),
+            "signed": signed,
+            "clusters": len(clusters),
+            "multi_site": sum(1 for members in clusters if len({m.split("|", 1)[0] for m in members}) > 1),
+        }
+        logger.info(f"Matched {summary['products']} products into {summary['clusters']} canonical products "
+                    f"({summary['multi_site']} on several websites, {signed} signatures computed)")
+        return summary
+
+    def _similar(self, a: str, b: str) -> bool:
+        if a.split("|", 1)[0] == b.split("|", 1)[0]:
+            # Distinct product IDs of one website are distinct products
+            return False
+        if self.similarity(self.signatures[a], self.signatures[b]) < self.threshold:
+            return False
+        if self.models[a] != self.models[b]:
+            return False
+        specs_a, specs_b = self.entries[a][2], self.entries[b][2]
+        for field in specs_a.keys() & specs_b.keys():
+            low, high = sorted((specs_a[field], specs_b[field]))
+            if high and (high - low) / high > SPEC_TOLERANCE:
+                return False
+        return True
+
+    def _cluster(self) -> List[List[str]]:
+        """
+        Union candidate pairs from shared LSH band buckets into clusters.
+
+        Pairs are joined most similar first, and never when the two clusters
+        already hold products of the same website, so a product joins its best
+        match per website and two products of one website never share a
+        cluster through a third.
+        """
+        keys = sorted(self.entries)
+        parent = {key: key for key in keys}
+        websites = {key: {key.split("|", 1)[0]} for key in keys}
+
+        def find(key: str) -> str:
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        start, stop = self._blocks["name"]
+        rows = (stop - start) // self.bands
+        candidates = set()
+        for band in range(self.bands):
+            buckets: Dict[bytes, List[str]] = defaultdict(list)
+            low = start + band * rows
+            for key in keys:
+                if self.signatures[key][start] == _PRIME:
+                    continue
+                buckets[self.signatures[key][low:low + rows].tobytes()].append(key)
+            for members in buckets.values():
+                if len(members) > MAX_BUCKET:
+                    continue
+                for i, a in enumerate(members):
+                    candidates.update((a, b) for b in members[i + 1:])
+
+        pairs = sorted((-self.similarity(self.signatures[a], self.signatures[b]), a, b)
+                       for a, b in candidates if self._similar(a, b))
+        for _, a, b in pairs:
+            root_a, root_b = find(a), find(b)
+            if root_a == root_b or websites[root_a] & websites[root_b]:
+                continue
+            root, child = min(root_a, root_b), max(root_a, root_b)
+            parent[child] = root
+            websites[root] |= websites.pop(child)
+
+        clusters: Dict[str, List[str]] = defaultdict(list)
+        for key in keys:
+            clusters[find(key)].append(key)
+        return list(clusters.values())
+
+    def _assign_ids(self, clusters: List[List[str]]):
+        """Keep the most common previous canonical ID of each cluster; new clusters get a new ID."""
+        taken = set()
+        for members in sorted(clusters, key=lambda m: (-len(m), m[0])):
+            counts = Counter(self.entries[m][1] for m in members if self.entries[m][1])
+            canonical = next((c for c, _ in sorted(counts.items(), key=lambda i: (-i[1], i[0])) if c not in taken), None)
+            if canonical is None:
+                digest = hashlib.sha1(members[0].encode("utf-8")).hexdigest()
+                canonical = next(f"p{digest[i:i + 12]}" for i in range(0, 28) if f"p{digest[i:i + 12]}" not in taken)
+            taken.add(canonical)
+            for member in members:
+                text_hash, _, specs = self.entries[member]
+                self.entries[member] = (text_hash, canonical, specs)
+
+    def canonical_ids(self) -> Dict[str, str]:
+        """website|product_id -> canonical product ID."""
+        return {key: canonical for key, (_, canonical, _) in sorted(self.entries.items())}
+
+
+def read_current_records(data_dir: Path) -> Iterable[Dict[str, str]]:
+    """Rows of the latest CSV of every website in `data_dir`."""
+    latest: Dict[str, Tuple[str, Path]] = {}
+    for path in Path(data_dir).glob("*.csv"):
+        match = _DATED_CSV.match(path.name)
+        if match and (match.group("site") not in latest or match.group("date") > latest[match.group("site")][0]):
+            latest[match.group("site")] = (match.group("date"), path)
+    for _, path in sorted(latest.values(), key=lambda item: item[1].name):
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+
+
+def update_matches(data_dir: Path, index_dir: Path, output_path: Path) -> Dict[str, int]:
+    """Match the current CSVs and write the key -> canonical ID map for the static site."""
+    index = MatchIndex(index_dir)
+    summary = index.update(read_current_records(data_dir))
+    index.save()
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index.canonical_ids(), f, ensure_ascii=False, sort_keys=True)
+    os.replace(tmp_path, output_path)
+    return summary
+
+
+def main(argv: Optional[List[str]] = None):
+    from .crawler import CURRENT_DATA_DIR, MATCH_INDEX_DIR, WEB_DATA_DIR
+
+    parser = argparse.ArgumentParser(description="Match products across websites and languages")
+    parser.add_argument("--data", default=str(CURRENT_DATA_DIR), help="directory with the current site CSVs")
+    parser.add_argument("--root", default=str(MATCH_INDEX_DIR), help="match index directory")
+    parser.add_argument("--output", default=str(WEB_DATA_DIR / "matches.json"),
+                        help="where to write the website|product_id -> canonical ID map")
+    parser.add_argument("--show", action="store_true", help="print products matched across websites")
+    args = parser.parse_args(argv)
+
+    summary = update_matches(Path(args.data), Path(args.root), Path(args.output))
+    print(json.dumps(summary))
+    if args.show:
+        clusters: Dict[str, List[str]] = defaultdict(list)
+        for key, canonical in MatchIndex(Path(args.root)).canonical_ids().items():
+            clusters[canonical].append(key)
+        for canonical, members in sorted(clusters.items()):
+            if len({m.split("|", 1)[0] for m in members}) > 1:
+                print(f"{canonical}: {', '.join(members)}")
+
+
+if __name__ == "__main__":
+    main()
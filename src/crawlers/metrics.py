@@ -0,0 +1,225 @@
+"""
+Crawler instrumentation: timing spans, counters and the per-run report.
+
+Spans and counters are labelled with the website being crawled. The site
+is bound per thread with `site_scope()`; crawler worker threads re-bind the
+site of the thread that started them.
+
+At the end of a run the registry is written as
+
+    data/metrics/run_metrics.json   spans, counters and selector hit rates
+    data/metrics/run_metrics.prom   the same in Prometheus text format
+
+Optionally the run is profiled with cProfile across all threads.
+"""
+
+import cProfile
+import functools
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger("ebike_crawler.metrics")
+
+_local = threading.local()
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def current_site() -> str:
+    return getattr(_local, "site", "") or "-"
+
+
+@contextmanager
+def site_scope(site: str) -> Iterator[None]:
+    """Label everything recorded by this thread with `site` for the duration."""
+    previous = getattr(_local, "site", None)
+    _local.site = site
+    try:
+        yield
+    finally:
+        _local.site = previous
+
+
+class Metrics:
+    """Thread-safe registry of spans (count/total/max seconds) and counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.spans: Dict[Tuple[str, str], list] = defaultdict(lambda: [0, 0.0, 0.0])
+            self.counters: Dict[Tuple[str, LabelKey], float] = defaultdict(float)
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            stats = self.spans[(name, current_site())]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    def timed(self, name: Optional[str] = None) -> Callable:
+        """Decorator recording every call of a function as a span."""
+        def decorator(func: Callable) -> Callable:
+            span_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def inc(self, name: str, value: float = 1, **labels: Any):
+        key = (name, tuple(sorted({"site": current_site(), **{k: str(v) for k, v in labels.items()}}.items())))
+        with self._lock:
+            self.counters[key] += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = [
+                {"name": name, "site": site, "count": count, "total_s": round(total, 6), "max_s": round(longest, 6)}
+                for (name, site), (count, total, longest) in sorted(self.spans.items())
+            ]
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+            duration = time.time() - self.started_at
+
+        lookups: Dict[Tuple[str, str], float] = defaultdict(float)
+        hits: Dict[Tuple[str, str], float] = defaultdict(float)
+        for counter in counters:
+            labels = counter["labels"]
+            if counter["name"] == "selector_lookups_total":
+                lookups[(labels["site"], labels["field"])] += counter["value"]
+            elif counter["name"] == "selector_hits_total":
+                hits[(labels["site"], labels["field"])] += counter["value"]
+        selector_hit_rates = [
+            {"site": site, "field": field, "lookups": int(count), "hit_rate": round(hits[(site, field)] / count, 4)}
+            for (site, field), count in sorted(lookups.items())
+        ]
+        return {
+            "started_at": self.started_at,
+            "duration_s": round(duration, 3),
+            "spans": spans,
+            "counters": counters,
+            "selector_hit_rates": selector_hit_rates,
+        }
+
+    def to_prometheus(self, snapshot: Optional[Dict[str, Any]] = None) -> str:
+        snapshot = snapshot or self.snapshot()
+        lines = [
+            "# HELP ebike_crawler_run_duration_seconds Wall time of the crawl run.",
+            "# TYPE ebike_crawler_run_duration_seconds gauge",
+            f"ebike_crawler_run_duration_seconds {snapshot['duration_s']}",
+        ]
+        # Every sample of a family has to follow its own TYPE line
+        for metric, kind, field in (("ebike_crawler_span_seconds_total", "counter", "total_s"),
+                                    ("ebike_crawler_span_calls_total", "counter", "count"),
+                                    ("ebike_crawler_span_max_seconds", "gauge", "max_s")):
+            lines.append(f"# TYPE {metric} {kind}")
+            for span in snapshot["spans"]:
+                labels = _labels({"span": span["name"], "site": span["site"]})
+                lines.append(f"{metric}{labels} {span[field]}")
+
+        typed = set()
+        for counter in snapshot["counters"]:
+            metric = f"ebike_crawler_{counter['name']}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{_labels(counter['labels'])} {counter['value']:g}")
+
+        lines.append("# TYPE ebike_crawler_selector_hit_ratio gauge")
+        for rate in snapshot["selector_hit_rates"]:
+            labels = _labels({"site": rate["site"], "field": rate["field"]})
+            lines.append(f"ebike_crawler_selector_hit_ratio{labels} {rate['hit_rate']}")
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, directory: Path, extra: Optional[Dict[str, Any]] = None) -> Path:
+        """Write run_metrics.json and run_metrics.prom; returns the JSON path."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        snapshot = self.snapshot()
+        snapshot.update(extra or {})
+        for name, content in (("run_metrics.json", json.dumps(snapshot, indent=1)),
+                              ("run_metrics.prom", self.to_prometheus(snapshot))):
+            path = directory / name
+            tmp_path = path.with_name(path.name + ".tmp")
+            tmp_path.write_text(content)
+            os.replace(tmp_path, path)
+        _log_summary(snapshot)
+        return directory / "run_metrics.json"
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _log_summary(snapshot: Dict[str, Any]):
+    """Log where the time went and which selectors never matched."""
+    totals: Dict[str, float] = defaultdict(float)
+    for span in snapshot["spans"]:
+        totals[span["name"]] += span["total_s"]
+    summary = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in sorted(totals.items(), key=lambda i: -i[1]))
+    logger.info(f"Time by span (summed over threads): {summary}")
+    for rate in snapshot["selector_hit_rates"]:
+        if rate["hit_rate"] == 0:
+            logger.warning(f"Selector for {rate['field']} on {rate['site']} matched none of {rate['lookups']} pages")
+
+
+class ThreadProfiler:
+    """cProfile over the calling thread and every thread started while it runs."""
+
+    def __init__(self):
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    def _start_in_thread(self, *args):
+        # Called as the new thread's first profile event; swap in a real profiler
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+
+    def start(self):
+        threading.setprofile(self._start_in_thread)
+        self._start_in_thread()
+
+    def stop(self, path: Path) -> Path:
+        threading.setprofile(None)
+        self._profiles[0].disable()
+        stats = pstats.Stats(self._profiles[0])
+        for profile in self._profiles[1:]:
+            stats.add(profile)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        stats.dump_stats(str(path))
+        logger.info(f"Profile of {len(self._profiles)} threads written to {path} (view with python -m pstats)")
+        return path
+
+
+METRICS = Metrics()
+timed = METRICS.timed
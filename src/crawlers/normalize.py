@@ -0,0 +1,289 @@
+"""
+Spec normalization.
+
+Turns the raw spec strings scraped from product pages ("48V 14Ah",
+"Up to 60 mi", "76.72lbs (34.8KG)", ...) into typed numeric columns in
+canonical units, each with a parse-confidence flag:
+
+    battery   -> battery_wh      (Wh)
+    range     -> range_km        (km)
+    max_speed -> max_speed_kmh   (km/h)
+    weight    -> weight_kg       (kg)
+    max_load  -> max_load_kg     (kg)
+
+Only the distinct raw values of a column are parsed, with vectorized
+pandas string/regex operations (pandas is imported on first use, so the
+crawler does not pay for it at startup; without it the same regexes run
+value by value). `python -m src.crawlers normalize` checks that both paths
+agree, and CI runs it after every merge. Results are cached by raw string, so values
+repeated across rows, sites and runs are parsed once per process. The CSV
+writer parses a site's distinct values before writing its rows with
+`normalize_record`; `normalize_specs` does the same for a DataFrame.
+"""
+
+import argparse
+import logging
+import re
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger("ebike_crawler.normalize")
+
+KM_PER_MILE = 1.609344
+KG_PER_LB = 0.45359237
+
+# Confidence flags
+CONFIDENCE_HIGH = "high"      # value given in the canonical unit
+CONFIDENCE_MEDIUM = "medium"  # converted from another unit or derived (V x Ah)
+CONFIDENCE_LOW = "low"        # parsed, but outside the plausible range for e-bikes
+
+_NUMBER = r"(\d+(?:[.,]\d+)?)"
+
+# source field -> (normalized column, plausible (min, max))
+SPEC_COLUMNS = {
+    "battery": ("battery_wh", (100, 3000)),
+    "range": ("range_km", (5, 400)),
+    "max_speed": ("max_speed_kmh", (10, 80)),
+    "weight": ("weight_kg", (5, 100)),
+    "max_load": ("max_load_kg", (50, 400)),
+}
+
+# Raw values compare_paths() always checks, besides the crawled ones
+CHECK_VALUES = {
+    "battery": ["48V 14Ah", "36v 10.4ah", "720Wh", "52 V / 20 Ah", "Samsung cells"],
+    "range": ["Up to 60 mi", "100km", "45-70 km", "80 kilometers", "unlimited"],
+    "max_speed": ["25 km/h", "20mph", "28 kph", "45kmh"],
+    "weight": ["76.72lbs (34.8KG)", "22,5 kg", "60 pounds", "5000 kg"],
+    "max_load": ["330 lbs", "150kg", "9999 kg"],
+}
+
+# (field, raw string) -> (value, confidence)
+_cache: Dict[Tuple[str, str], Tuple[Optional[float], Optional[str]]] = {}
+
+
+def _unit(pattern: str) -> "re.Pattern":
+    """A number followed by a unit pattern."""
+    return re.compile(_NUMBER + r"\s*" + pattern)
+
+
+_WATT_HOURS = _unit(r"wh\b")
+_VOLTS = _unit(r"v(?![a-z])")
+_AMP_HOURS = _unit(r"ah\b")
+
+# field -> (canonical unit, other unit, factor from the other unit)
+_UNITS = {
+    # "km" but not "km/h"
+    "range": (_unit(r"(?:km(?!\s*/\s*h)|kilomet)"), _unit(r"(?:mi\b|miles?\b)"), KM_PER_MILE),
+    "max_speed": (_unit(r"(?:km\s*/\s*h|kmh\b|kph\b)"), _unit(r"mph\b"), KM_PER_MILE),
+    "weight": (_unit(r"kgs?\b"), _unit(r"(?:lbs?\b|pounds?\b)"), KG_PER_LB),
+    "max_load": (_unit(r"kgs?\b"), _unit(r"(?:lbs?\b|pounds?\b)"), KG_PER_LB),
+}
+
+
+def _number(text: str, pattern: "re.Pattern") -> Optional[float]:
+    """The first number followed by the unit, as a float."""
+    match = pattern.search(text)
+    return float(match.group(1).replace(",", ".")) if match else None
+
+
+def _parse(field: str, text: str) -> Tuple[Optional[float], Optional[str]]:
+    if field == "battery":
+        wh = _number(text, _WATT_HOURS)
+        if wh is not None:
+            return wh, CONFIDENCE_HIGH
+        volts, amp_hours = _number(text, _VOLTS), _number(text, _AMP_HOURS)
+        if volts is not None and amp_hours is not None:
+            return volts * amp_hours, CONFIDENCE_MEDIUM
+        return None, None
+
+    canonical, other, factor = _UNITS[field]
+    value = _number(text, canonical)
+    if value is not None:
+        return value, CONFIDENCE_HIGH
+    value = _number(text, other)
+    if value is not None:
+        return value * factor, CONFIDENCE_MEDIUM
+    return None, None
+
+
+def _pandas():
+    """pandas, or None if it is not installed."""
+    try:
+        import pandas as pd
+    except ImportError:
+        return None
+    return pd
+
+
+def _extract(text: "pd.Series", pattern: "re.Pattern") -> "pd.Series":
+    """Vectorized `_number`: the first number followed by the unit, as floats (NaN if absent)."""
+    pd = _pandas()
+    extracted = text.str.extract(pattern, expand=False)
+    return pd.to_numeric(extracted.str.replace(",", ".", regex=False), errors="coerce")
+
+
+def _parse_vectorized(field: str, pending: List[str]) -> Iterable[Tuple[Optional[float], Optional[str]]]:
+    """`_parse` over many lowercased values at once, with pandas str.extract."""
+    pd = _pandas()
+    text = pd.Series(pending, dtype="object")
+    if field == "battery":
+        primary = _extract(text, _WATT_HOURS)
+        secondary = _extract(text, _VOLTS) * _extract(text, _AMP_HOURS)
+    else:
+        canonical, other, factor = _UNITS[field]
+        primary = _extract(text, canonical)
+        secondary = _extract(text, other) * factor
+    value = primary.fillna(secondary)
+    confidence = np.where(primary.notna(), CONFIDENCE_HIGH, np.where(secondary.notna(), CONFIDENCE_MEDIUM, None))
+    for parsed, flag in zip(value, confidence):
+        yield (None, None) if parsed != parsed else (float(parsed), flag)
+
+
+def parse_distinct(field: str, raw_values: Iterable[str]):
+    """Parse the raw values of a field that are not cached yet and cache the results."""
+    pending = list({raw for raw in raw_values if (field, raw) not in _cache})
+    if not pending:
+        return
+    lowered = [raw.lower() for raw in pending]
+    if len(pending) > 1 and _pandas() is not None:
+        results = _parse_vectorized(field, lowered)
+    else:
+        results = (_parse(field, text) for text in lowered)
+
+    for raw, (value, confidence) in zip(pending, results):
+        _store(field, raw, value, confidence)
+
+
+def _finish(field: str, value: Optional[float], confidence: Optional[str]) -> Tuple[Optional[float], Optional[str]]:
+    """Round a parsed value and flag it if implausible."""
+    if value is not None:
+        low, high = SPEC_COLUMNS[field][1]
+        if not low <= value <= high:
+            confidence = CONFIDENCE_LOW
+        value = round(value, 2)
+    return value, confidence
+
+
+def _store(field: str, raw: str, value: Optional[float], confidence: Optional[str]):
+    _cache[(field, raw)] = _finish(field, value, confidence)
+
+
+def _present(raw: Any) -> bool:
+    # None and NaN (raw != raw) are missing values
+    return raw is not None and raw == raw and raw != ""
+
+
+def parse_spec(field: str, raw: Any) -> Tuple[Optional[float], Optional[str]]:
+    """(value in the canonical unit, confidence) for one raw spec value; (None, None) if unparseable."""
+    if not _present(raw):
+        return None, None
+    key = (field, str(raw))
+    if key not in _cache:
+        _store(field, key[1], *_parse(field, key[1].lower()))
+    return _cache[key]
+
+
+def normalized_columns(fields: Iterable[str]) -> List[str]:
+    """Columns added for a set of record fields, in output order."""
+    fields = set(fields)
+    columns = []
+    for field, (column, _) in SPEC_COLUMNS.items():
+        if field in fields:
+            columns.extend([column, f"{column}_confidence"])
+    return columns
+
+
+def normalize_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normalized spec values of one crawled record.
+
+    For every raw spec field present, returns `<column>` with the value in
+    the canonical unit (None if unparseable) and `<column>_confidence`.
+    """
+    normalized = {}
+    for field, (column, _) in SPEC_COLUMNS.items():
+        if field in record:
+            normalized[column], normalized[f"{column}_confidence"] = parse_spec(field, record[field])
+    return normalized
+
+
+def normalize_specs(df: "pd.DataFrame") -> "pd.DataFrame":
+    """
+    Add normalized numeric spec columns to a crawled products DataFrame.
+
+    Same columns as `normalize_record`, with NaN for unparseable values.
+    Only the distinct values of each column are parsed; the results are
+    joined back onto the rows.
+    """
+    pd = _pandas()
+    df = df.copy()
+    for field, (column, _) in SPEC_COLUMNS.items():
+        if field not in df.columns:
+            continue
+        raw = df[field].where(df[field].notna(), None).astype("object")
+        present = raw.dropna().astype(str)
+        present = present[present != ""]
+        distinct = present.unique()
+        parse_distinct(field, distinct)
+
+        values = pd.Series({v: _cache[(field, v)][0] for v in distinct}, dtype=float)
+        flags = pd.Series({v: _cache[(field, v)][1] for v in distinct}, dtype="object")
+        df[column] = present.map(values).reindex(df.index).astype(float)
+        df[f"{column}_confidence"] = present.map(flags).reindex(df.index)
+        logger.debug(f"Normalized {field}: {int(df[column].notna().sum())}/{len(present)} values parsed")
+    return df
+
+
+def compare_paths(records: Iterable[Dict[str, Any]]) -> List[str]:
+    """
+    Parse the spec values of `records` and CHECK_VALUES both vectorized and
+    value by value, without the cache. Returns the values the two paths
+    disagree on; needs pandas.
+    """
+    if _pandas() is None:
+        return ["pandas is not installed, so the vectorized path cannot run"]
+    values = {field: set(CHECK_VALUES.get(field, ())) for field in SPEC_COLUMNS}
+    for record in records:
+        for field, found in values.items():
+            if _present(record.get(field)):
+                found.add(str(record[field]))
+
+    problems = []
+    for field, found in values.items():
+        raw_values = sorted(found)
+        lowered = [raw.lower() for raw in raw_values]
+        vectorized = [_finish(field, *result) for result in _parse_vectorized(field, lowered)]
+        scalar = [_finish(field, *_parse(field, text)) for text in lowered]
+        problems.extend(
+            f"{field}: {raw!r} -> {a} vectorized, {b} per value"
+            for raw, a, b in zip(raw_values, vectorized, scalar) if a != b
+        )
+        logger.info(f"Compared {len(raw_values)} {field} values")
+    return problems
+
+
+def main(argv: Optional[List[str]] = None):
+    """Check that both normalization paths agree on the current CSVs; exit status 1 if not."""
+    from .crawler import CURRENT_DATA_DIR
+    from .matching import read_current_records
+
+    parser = argparse.ArgumentParser(description="Compare vectorized and per-value spec normalization")
+    parser.add_argument("--data", default=str(CURRENT_DATA_DIR), help="directory with the current site CSVs")
+    args = parser.parse_args(argv)
+
+    problems = compare_paths(read_current_records(Path(args.data)))
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    if problems:
+        sys.exit(1)
+    print("Vectorized and per-value normalization agree")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+"""
+Append-only, compressed archive of fetched pages.
+
+Every page the crawler fetches is kept, so extraction can be re-run offline
+(see crawler.replay_archive) when a selector breaks or a field is added.
+Layout under the archive root (data/pages):
+
+    <site>/<YYYYMMDDTHHMMSS>-<writer>.pages   append-only segments, one per run and writer
+    <site>/dictionaries/<id>.<codec>.dict     compression dictionaries (needed to read old records)
+    index.sqlite                              (url, fetch time) -> segment and offset
+
+A segment is a sequence of WARC-like records, each a JSON header line
+followed by the compressed body:
+
+    PAGE {"type": "response", "url": ..., "fetched_at": ..., "kind": ..., "length": N, ...}\\n
+    <N bytes>\\n
+
+The kind is "product" for product pages and "page" for everything else
+(listings, sitemaps, catalogs). Bodies are compressed one by one, so every record can be read by offset.
+The codec is zstd with a dictionary trained per site on its first
+TRAIN_SAMPLES pages, or zlib with a preset dictionary when zstandard is not
+installed. A page whose content is unchanged since its last capture gets
+a "revisit" record without a body, and its index entry points at the
+earlier body.
+"""
+
+import datetime
+import json
+import logging
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from .http_cache import CachedResponse
+from .incremental import fingerprint
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+logger = logging.getLogger("ebike_crawler.page_archive")
+
+# Codec of new records; records keep the codec they were written with
+ARCHIVE_CODEC = "zstd" if zstandard is not None else "zlib"
+# Pages of a site compressed without a dictionary before one is trained
+TRAIN_SAMPLES = 32
+ZSTD_LEVEL = 9
+ZSTD_DICT_SIZE = 64 * 1024
+ZLIB_LEVEL = 6
+# zlib only uses the last 32KB of a preset dictionary
+ZLIB_DICT_SIZE = 32 * 1024
+
+RECORD_PREFIX = b"PAGE "
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    site TEXT NOT NULL,
+    url TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    encoding TEXT,
+    fingerprint TEXT NOT NULL,
+    segment TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    codec TEXT NOT NULL,
+    dictionary TEXT,
+    revisit INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS pages_url ON pages (url, fetched_at);
+CREATE INDEX IF NOT EXISTS pages_site ON pages (site, fetched_at);
+CREATE TABLE IF NOT EXISTS dictionaries (
+    id TEXT PRIMARY KEY,
+    site TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+"""
+
+_ENTRY_COLUMNS = "site, url, fetched_at, kind, status, encoding, fingerprint, segment, offset, length, codec, dictionary"
+
+
+class ArchiveEntry(NamedTuple):
+    """Index entry of an archived page; segment, offset and length locate its body."""
+    site: str
+    url: str
+    fetched_at: str
+    kind: str
+    status: int
+    encoding: Optional[str]
+    fingerprint: str
+    segment: str
+    offset: int
+    length: int
+    codec: str
+    dictionary: Optional[str]
+
+
+def compress(data: bytes, codec: str, dictionary: Optional[bytes] = None) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed")
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dict_data).compress(data)
+    if codec == "zlib":
+        compressor = zlib.compressobj(ZLIB_LEVEL, zdict=dictionary) if dictionary else zlib.compressobj(ZLIB_LEVEL)
+        return compressor.compress(data) + compressor.flush()
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def decompress(data: bytes, codec: str, dictionary: Optional[bytes] = None) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd records (pip install zstandard)")
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(data)
+    if codec == "zlib":
+        decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+        return decompressor.decompress(data) + decompressor.flush()
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def train_dictionary(samples: List[bytes], codec: str) -> bytes:
+    """
+    Build a compression dictionary from sample pages of one site.
+
+    zstd trains a dictionary of the samples' common content. zlib takes a
+    preset dictionary: the start and end of the latest sample, where the
+    site's templates repeat.
+    """
+    if codec == "zstd":
+        return zstandard.train_dictionary(ZSTD_DICT_SIZE, samples).as_bytes()
+    sample = samples[-1]
+    half = ZLIB_DICT_SIZE // 2
+    return sample if len(sample) <= ZLIB_DICT_SIZE else sample[:half] + sample[-half:]
+
+
+def read_segment(path: Path) -> Iterator[Tuple[Dict[str, Any], bytes]]:
+    """Yield (header, body) of every record of a segment; stops at a truncated record."""
+    with open(path, "rb") as f:
+        while True:
+            line = f.readline()
+            if not line:
+                return
+            if not line.startswith(RECORD_PREFIX) or not line.endswith(b"\n"):
+                logger.warning(f"Stopping at a damaged record in {path} (offset {f.tell() - len(line)})")
+                return
+            header = json.loads(line[len(RECORD_PREFIX):])
+            body = f.read(header["length"])
+            if len(body) < header["length"] or f.read(1) != b"\n":
+                logger.warning(f"Stopping at a truncated record in {path}")
+                return
+            yield header, body
+
+
+class PageArchive:
+    """
+    Writes and reads the page archive under `root`.
+
+    Safe to share between threads. Each site's records of this run go to
+    one new segment named after the run's start time and `writer`.
+    """
+
+    def __init__(self, root: Path, writer: str = "main"):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.writer = writer
+        self._started = datetime.datetime.now().strftime("%Y%m%dT%H%M%S")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.root / "index.sqlite"), check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._segments: Dict[str, Any] = {}
+        # site -> (dictionary ID, bytes) used for new records
+        self._current: Dict[str, Tuple[Optional[str], Optional[bytes]]] = {}
+        # site -> pages collected to train its dictionary (None once training failed)
+        self._samples: Dict[str, Optional[List[bytes]]] = {}
+        self._dictionaries: Dict[Tuple[str, str], bytes] = {}
+
+    def __enter__(self) -> "PageArchive":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            for segment in self._segments.values():
+                segment.close()
+            self._segments.clear()
+            self._conn.close()
+
+    # --- writing ---------------------------------------------------------------
+
+    def add(self, site: str, url: str, content: bytes, status: int = 200, encoding: Optional[str] = None,
+            kind: str = "page", fetched_at: Optional[str] = None) -> ArchiveEntry:
+        """Archive a fetched page; content identical to the URL's last capture becomes a revisit."""
+        fetched_at = fetched_at or datetime.datetime.now().isoformat()
+        page_fingerprint = fingerprint(content)
+        with self._lock:
+            existing = self._query("WHERE url = ? AND fetched_at = ?", (url, fetched_at))
+            if existing:
+                return existing[0]
+            latest = self._query("WHERE url = ? ORDER BY fetched_at DESC LIMIT 1", (url,))
+            if latest and latest[0].fingerprint == page_fingerprint:
+                return self._add_revisit(site, latest[0], fetched_at, kind, status, encoding)
+            dictionary_id, dictionary = self._dictionary_for(site, content)
+
+        body = compress(content, ARCHIVE_CODEC, dictionary)
+        header = {
+            "type": "response", "url": url, "fetched_at": fetched_at, "kind": kind, "status": status, "encoding": encoding,
+            "fingerprint": page_fingerprint, "codec": ARCHIVE_CODEC, "dictionary": dictionary_id,
+            "size": len(content), "length": len(body),
+        }
+        with self._lock:
+            segment, offset = self._append(site, header, body)
+            entry = ArchiveEntry(site, url, fetched_at, kind, status, encoding, page_fingerprint, segment, offset,
+                                 len(body), ARCHIVE_CODEC, dictionary_id)
+            self._insert(entry, revisit=False)
+        return entry
+
+    def _add_revisit(self, site: str, previous: ArchiveEntry, fetched_at: str, kind: str, status: int,
+                     encoding: Optional[str]) -> ArchiveEntry:
+        header = {
+            "type": "revisit", "url": previous.url, "fetched_at": fetched_at, "kind": kind, "status": status,
+            "encoding": encoding, "fingerprint": previous.fingerprint, "refers_to": previous.fetched_at, "length": 0,
+        }
+        self._append(site, header, b"")
+        entry = previous._replace(site=site, fetched_at=fetched_at, kind=kind, status=status, encoding=encoding)
+        self._insert(entry, revisit=True)
+        return entry
+
+    def _append(self, site: str, header: Dict[str, Any], body: bytes) -> Tuple[str, int]:
+        segment = self._segments.get(site)
+        if segment is None:
+            path = self.root / site / f"{self._started}-{self.writer}.pages"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            segment = self._segments[site] = open(path, "ab")
+        line = RECORD_PREFIX + json.dumps(header, ensure_ascii=False).encode("utf-8") + b"\n"
+        offset = segment.tell() + len(line)
+        segment.write(line + body + b"\n")
+        segment.flush()
+        return Path(segment.name).relative_to(self.root).as_posix(), offset
+
+    def _insert(self, entry: ArchiveEntry, revisit: bool):
+        with self._conn:
+            self._conn.execute(
+                f"INSERT INTO pages ({_ENTRY_COLUMNS}, revisit) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*entry, int(revisit)),
+            )
+
+    def _dictionary_for(self, site: str, content: bytes) -> Tuple[Optional[str], Optional[bytes]]:
+        """The site's dictionary for new records, training one once enough pages were seen."""
+        if site not in self._current:
+            row = self._conn.execute(
+                "SELECT id FROM dictionaries WHERE site = ? AND codec = ? ORDER BY created_at DESC LIMIT 1",
+                (site, ARCHIVE_CODEC),
+            ).fetchone()
+            self._current[site] = (row[0], self._dictionary(site, row[0])) if row else (None, None)
+        if self._current[site][0] is not None:
+            return self._current[site]
+
+        samples = self._samples.setdefault(site, [])
+        if samples is None:
+            return None, None
+        samples.append(content)
+        if len(samples) < TRAIN_SAMPLES:
+            return None, None
+        try:
+            dictionary = train_dictionary(samples, ARCHIVE_CODEC)
+        except Exception as e:
+            logger.warning(f"Could not train a compression dictionary for {site}: {e}")
+            self._samples[site] = None
+            return None, None
+        dictionary_id = fingerprint(dictionary)[:16]
+        path = self._dictionary_path(site, dictionary_id, ARCHIVE_CODEC)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(dictionary)
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO dictionaries (id, site, codec, created_at) VALUES (?, ?, ?, ?)",
+                (dictionary_id, site, ARCHIVE_CODEC, datetime.datetime.now().isoformat()),
+            )
+        logger.info(f"Trained a {len(dictionary) // 1024}KB {ARCHIVE_CODEC} dictionary for {site} "
+                    f"from {len(samples)} pages")
+        del self._samples[site]
+        self._current[site] = (dictionary_id, dictionary)
+        return self._current[site]
+
+    def import_segments(self, source_root: Path) -> int:
+        """
+        Add the records of another archive's segments (e.g. a shard's) to this archive.
+
+        Bodies are recompressed with this archive's dictionaries, and pages
+        unchanged since their last capture become revisits. Already imported
+        captures are skipped. Returns the number of captures added.
+        """
+        added = 0
+        for path in sorted(Path(source_root).rglob("*.pages")):
+            site = path.parent.name
+            for header, body in read_segment(path):
+                if header["type"] != "response":
+                    with self._lock:
+                        latest = self._query("WHERE url = ? AND fingerprint = ? ORDER BY fetched_at DESC LIMIT 1",
+                                             (header["url"], header["fingerprint"]))
+                        if latest and not self._query("WHERE url = ? AND fetched_at = ?",
+                                                      (header["url"], header["fetched_at"])):
+                            self._add_revisit(site, latest[0], header["fetched_at"], header["kind"],
+                                              header["status"], header["encoding"])
+                            added += 1
+                    continue
+                dictionary = None
+                if header["dictionary"]:
+                    dictionary = self._dictionary_path(site, header["dictionary"], header["codec"], path.parent.parent)
+                    dictionary = dictionary.read_bytes()
+                content = decompress(body, header["codec"], dictionary)
+                self.add(site, header["url"], content, header["status"], header["encoding"], header["kind"],
+                         header["fetched_at"])
+                added += 1
+        logger.info(f"Imported {added} archived pages from {source_root}")
+        return added
+
+    # --- reading ---------------------------------------------------------------
+
+    def _query(self, where: str, params: Tuple = ()) -> List[ArchiveEntry]:
+        rows = self._conn.execute(f"SELECT {_ENTRY_COLUMNS} FROM pages {where}", params).fetchall()
+        return [ArchiveEntry(*row) for row in rows]
+
+    def entries(self, site: str, since: Optional[str] = None, until: Optional[str] = None) -> List[ArchiveEntry]:
+        """
+        Captures of a site's pages in fetch order.
+
+        Args:
+            site: Website key
+            since: First day (YYYY-MM-DD), inclusive
+            until: Last day (YYYY-MM-DD), inclusive
+        """
+        where, params = "WHERE site = ?", [site]
+        if since:
+            where += " AND fetched_at >= ?"
+            params.append(since)
+        if until:
+            next_day = datetime.date.fromisoformat(until) + datetime.timedelta(days=1)
+            where += " AND fetched_at < ?"
+            params.append(next_day.isoformat())
+        with self._lock:
+            return self._query(where + " ORDER BY fetched_at, rowid", tuple(params))
+
+    def read(self, entry: ArchiveEntry) -> bytes:
+        """The page content of an archived capture."""
+        with open(self.root / entry.segment, "rb") as f:
+            f.seek(entry.offset)
+            body = f.read(entry.length)
+        dictionary = self._dictionary(entry.site, entry.dictionary, entry.codec) if entry.dictionary else None
+        return decompress(body, entry.codec, dictionary)
+
+    def response(self, entry: ArchiveEntry) -> CachedResponse:
+        """An archived capture as a response object, for code that expects fetch_page() results."""
+        return CachedResponse(entry.url, entry.status, self.read(entry), entry.encoding, {}, from_cache=True)
+
+    def _dictionary_path(self, site: str, dictionary_id: str, codec: str, root: Optional[Path] = None) -> Path:
+        return (root or self.root) / site / "dictionaries" / f"{dictionary_id}.{codec}.dict"
+
+    def _dictionary(self, site: str, dictionary_id: str, codec: str = ARCHIVE_CODEC) -> bytes:
+        key = (site, dictionary_id)
+        if key not in self._dictionaries:
+            self._dictionaries[key] = self._dictionary_path(site, dictionary_id, codec).read_bytes()
+        return self._dictionaries[key]
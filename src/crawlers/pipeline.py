@@ -0,0 +1,132 @@
+"""
+Parsing stage of the crawl, decoupled from fetching.
+
+Fetching product pages is I/O bound and runs in each website's thread
+pool. Parsing them (JSON-LD, BeautifulSoup and the extraction plan) is
+CPU-bound pure Python, which threads cannot spread over more than one core.
+A ParsePool runs the parsing in worker processes instead:
+
+    fetch threads --submit(html)--> bounded queue --> worker processes
+    crawl_website <------------- parse futures <------------+
+
+At most `max_pending` pages are queued or being parsed at a time. When the
+workers fall behind, submit() blocks the fetch thread until a page is
+done, so fetching slows to the parse rate and the page bodies held in
+memory stay bounded. A pool without workers parses in the calling thread.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, Optional
+
+from .extraction import get_plan, product_record
+from .metrics import METRICS
+from .structured import json_ld_product
+
+logger = logging.getLogger("ebike_crawler.pipeline")
+
+# Default queue depth: pages queued or being parsed per worker process
+QUEUE_PER_WORKER = 2
+
+
+def default_parse_workers() -> int:
+    """One worker process per CPU on multi-core machines; 0 (parse in the fetch threads) on one core."""
+    cpus = os.cpu_count() or 1
+    return cpus if cpus > 1 else 0
+
+
+def parse_page(page_text: str, selectors: Dict[str, str], parse_only: Optional[Dict[str, Any]],
+               json_ld: bool) -> Dict[str, Any]:
+    """
+    Extract the product data of a fetched product page.
+
+    Runs in a worker process, so it only returns plain data; the caller
+    records the timings and selector hits in the crawl metrics.
+
+    Returns:
+        Dict with "record" (product data without crawl metadata), "source"
+        ("json_ld" or "html"), "hits" (selector fields that matched) and
+        "parse_s"/"extract_s" (seconds spent parsing the HTML and running
+        the extraction plan, 0 if the selectors were not needed)
+    """
+    product_data = json_ld_product(page_text) if json_ld else {}
+    result = {"record": product_data, "source": "json_ld", "hits": [], "parse_s": 0.0, "extract_s": 0.0}
+    if not product_data.get("name") or "price" not in product_data:
+        plan = get_plan(selectors, parse_only)
+        started = time.perf_counter()
+        soup = plan.parse(page_text)
+        parsed = time.perf_counter()
+        extracted = plan.extract(soup)
+        if plan.strainer is not None and not extracted.get("name"):
+            # The container is missing (e.g. after a theme change): use the whole page
+            plan = get_plan(selectors)
+            extracted = plan.extract(plan.parse(page_text))
+        scraped = product_record(extracted)
+        result.update(
+            record={**scraped, **{k: v for k, v in product_data.items() if v}},
+            source="html",
+            hits=[field for field in selectors if extracted.get(field)],
+            parse_s=parsed - started,
+            extract_s=time.perf_counter() - parsed,
+        )
+    return result
+
+
+class ParsePool:
+    """
+    Bounded parsing stage shared by all websites of a run.
+
+    Args:
+        workers: Number of worker processes; 0 parses in the calling thread
+        max_pending: Pages queued or being parsed before submit() blocks
+            (default QUEUE_PER_WORKER per worker)
+    """
+
+    def __init__(self, workers: int = 0, max_pending: Optional[int] = None):
+        self.workers = max(workers, 0)
+        self.max_pending = max(max_pending or self.workers * QUEUE_PER_WORKER, 1)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        if self.workers:
+            # Spawned workers do not inherit the locks held by the crawler's threads
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            logger.info(f"Parsing product pages in {self.workers} processes (queue depth {self.max_pending})")
+
+    def __enter__(self) -> "ParsePool":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, page_text: str, website_config: Dict[str, Any]) -> Future:
+        """Queue a page for parsing, waiting while the queue is full. Returns a future of parse_page()'s result."""
+        args = (page_text, website_config["selectors"], website_config.get("parse_only"),
+                bool(website_config.get("structured_source", {}).get("json_ld")))
+        if self._executor is None:
+            future = Future()
+            try:
+                future.set_result(parse_page(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        if not self._slots.acquire(blocking=False):
+            METRICS.inc("parse_queue_full_total")
+            with METRICS.span("parse_queue_wait"):
+                self._slots.acquire()
+        try:
+            future = self._executor.submit(parse_page, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,236 @@
+"""
+Adaptive per-host politeness scheduler.
+
+Every request to a host waits for that host's next free slot. The spacing
+between slots adapts to how the host behaves (AIMD):
+
+    fast, successful response   -> request rate grows additively
+    429 / 5xx / timeout / slow  -> request rate is halved
+
+The rate never exceeds the robots.txt Crawl-delay / Request-rate of the
+host, and a Retry-After header pauses the whole host, not just the thread
+that received it. Retries use jittered exponential backoff.
+
+Limits are configured per website with the "politeness" key in WEBSITES.
+"""
+
+import datetime
+import email.utils
+import logging
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+logger = logging.getLogger("ebike_crawler.politeness")
+
+DEFAULT_POLICY = {
+    "initial_delay": 1.0,     # seconds between requests to a host at start
+    "min_delay": 0.25,        # fastest allowed spacing (robots.txt may raise it)
+    "max_delay": 30.0,        # slowest spacing after repeated throttling
+    "target_latency": 2.0,    # responses slower than this count as congestion
+    "rate_increase": 0.2,     # requests/second added after each good response
+    "backoff_base": 2.0,      # first retry waits about this many seconds
+    "backoff_max": 60.0,
+    "respect_robots": True,
+}
+
+# Responses that mean "slow down" rather than "this page is broken"
+THROTTLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+def robots_delay(robots_txt: str, user_agent: str) -> Optional[float]:
+    """
+    Seconds between requests required by robots.txt for a user agent.
+
+    Uses the group naming the agent's product token, else the "*" group, and
+    the stricter of Crawl-delay and Request-rate. Unlike urllib.robotparser,
+    fractional Crawl-delay values are accepted.
+    """
+    token = user_agent.split("/")[0].strip().lower()
+    groups = []  # (agents, {field: value})
+    agents, rules, in_rules = [], {}, False
+    for line in robots_txt.splitlines():
+        field, _, value = line.split("#", 1)[0].partition(":")
+        field, value = field.strip().lower(), value.strip()
+        if not field:
+            continue
+        if field == "user-agent":
+            if in_rules:
+                groups.append((agents, rules))
+                agents, rules, in_rules = [], {}, False
+            agents.append(value.lower())
+        else:
+            in_rules = True
+            rules.setdefault(field, value)
+    if agents:
+        groups.append((agents, rules))
+
+    specific = [r for a, r in groups if any(agent and agent != "*" and agent in token for agent in a)]
+    default = [r for a, r in groups if "*" in a]
+    rules = (specific or default or [{}])[0]
+
+    delays = []
+    try:
+        delays.append(float(rules.get("crawl-delay", "")))
+    except ValueError:
+        pass
+    rate = re.match(r"(\d+)\s*/\s*(\d+)\s*([smh]?)", rules.get("request-rate", ""))
+    if rate and int(rate.group(1)):
+        seconds = int(rate.group(2)) * {"": 1, "s": 1, "m": 60, "h": 3600}[rate.group(3)]
+        delays.append(seconds / int(rate.group(1)))
+    delays = [d for d in delays if d > 0]
+    return max(delays) if delays else None
+
+
+class HostThrottle:
+    """Request spacing and adaptive rate of a single host."""
+
+    def __init__(self, host: str, policy: Dict[str, Any], robots_delay: Optional[float] = None):
+        self.host = host
+        self.policy = policy
+        self.min_delay = max(policy["min_delay"], robots_delay or 0.0)
+        self.max_delay = max(policy["max_delay"], self.min_delay)
+        self.delay = min(max(policy["initial_delay"], self.min_delay), self.max_delay)
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Claim the next request slot; returns how long the caller must sleep."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.delay
+            return slot - now
+
+    def record(self, latency: float, status: Optional[int], retry_after: Optional[float] = None):
+        """Adapt the rate to the outcome of a request (status None: network error)."""
+        with self._lock:
+            throttled = status is None or status in THROTTLE_STATUSES
+            if throttled or latency > self.policy["target_latency"]:
+                # Multiplicative decrease of the rate (an unthrottled host starts at 10 requests/s)
+                self.delay = min(max(self.delay * 2, 0.1), self.max_delay)
+            elif status < 400 and self.delay > 0:
+                # Additive increase of the rate
+                rate = 1.0 / self.delay + self.policy["rate_increase"]
+                self.delay = max(1.0 / rate, self.min_delay)
+            if retry_after:
+                self._next_slot = max(self._next_slot, time.monotonic() + retry_after)
+                logger.info(f"{self.host} asked to retry after {retry_after:.0f}s")
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Jittered exponential backoff before retry number `attempt` (0-based)."""
+        ceiling = min(self.policy["backoff_max"], self.policy["backoff_base"] * 2 ** attempt)
+        wait = random.uniform(ceiling / 2, ceiling)
+        return max(wait, retry_after or 0.0)
+
+
+class PolitenessScheduler:
+    """Shared registry of host throttles, created lazily with robots.txt limits."""
+
+    def __init__(self, session: Optional[requests.Session] = None):
+        self.session = session or requests.Session()
+        self._policies: Dict[str, Dict[str, Any]] = {}
+        self._hosts: Dict[str, HostThrottle] = {}
+        # Hosts whose robots.txt is being fetched, by the first thread that needed them
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, url: str, policy: Optional[Dict[str, Any]] = None):
+        """Set the politeness policy of the host serving `url`."""
+        host = urlparse(url).netloc
+        with self._lock:
+            self._policies[host] = {**DEFAULT_POLICY, **(policy or {})}
+            self._hosts.pop(host, None)
+
+    def host(self, url: str) -> HostThrottle:
+        """
+        The throttle of the host serving `url`, created on first use.
+
+        The first thread to need a host fetches its robots.txt without
+        holding the scheduler lock, so a slow robots.txt only delays requests
+        to that host; other threads needing the same host wait for the result.
+        """
+        parsed = urlparse(url)
+        with self._lock:
+            throttle = self._hosts.get(parsed.netloc)
+            if throttle is not None:
+                return throttle
+            pending = self._pending.get(parsed.netloc)
+            owner = pending is None
+            if owner:
+                pending = self._pending[parsed.netloc] = Future()
+            policy = self._policies.get(parsed.netloc, DEFAULT_POLICY)
+        if not owner:
+            return pending.result()
+
+        try:
+            robots_delay = self._robots_delay(parsed) if policy["respect_robots"] else None
+            throttle = HostThrottle(parsed.netloc, policy, robots_delay)
+        except BaseException as e:
+            with self._lock:
+                self._pending.pop(parsed.netloc, None)
+            pending.set_exception(e)
+            raise
+        with self._lock:
+            self._hosts[parsed.netloc] = throttle
+            self._pending.pop(parsed.netloc, None)
+        pending.set_result(throttle)
+        logger.debug(f"Throttle for {parsed.netloc}: {throttle.delay:.2f}s (floor {throttle.min_delay:.2f}s)")
+        return throttle
+
+    def _robots_delay(self, parsed) -> Optional[float]:
+        """Minimum spacing from robots.txt Crawl-delay / Request-rate, if any."""
+        robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
+        try:
+            response = self.session.get(robots_url, timeout=10)
+        except requests.RequestException as e:
+            logger.debug(f"Could not fetch {robots_url}: {e}")
+            return None
+        if response.status_code != 200:
+            return None
+
+        user_agent = self.session.headers.get("User-Agent", "*")
+        delay = robots_delay(response.text, user_agent)
+        if delay:
+            logger.info(f"robots.txt of {parsed.netloc} limits crawling to one request per {delay:.2f}s")
+        return delay
+
+    def wait(self, url: str):
+        """Block until the host of `url` may receive another request."""
+        pause = self.host(url).reserve()
+        if pause > 0:
+            time.sleep(pause)
+
+    def record(self, url: str, latency: float, status: Optional[int],
+               headers: Optional[Dict[str, str]] = None) -> Optional[float]:
+        """Report a request outcome; returns the Retry-After delay if the host sent one."""
+        retry_after = None
+        if status in THROTTLE_STATUSES and headers:
+            retry_after = parse_retry_after(headers.get("Retry-After"))
+        self.host(url).record(latency, status, retry_after)
+        return retry_after
+
+    def backoff(self, url: str, attempt: int, retry_after: Optional[float] = None) -> float:
+        return self.host(url).backoff(attempt, retry_after)
@@ -0,0 +1,304 @@
+"""
+Price-history time-series index.
+
+Maps (website, product_id, language) to a compact, append-only series of
+price and availability change points:
+
+    data/price_index/keys.tsv     series_id, website, product_id, language
+    data/price_index/points.bin   fixed-size records (series, day, price, available)
+    data/price_index/offsets.bin  int64 start of every series in points.bin, plus the end
+
+A point is only added when a product's price or availability changes,
+so the whole catalog's history stays small. The points file is kept
+sorted by (series, day) when it is written, and is memory-mapped as is:
+a product's history is a slice of the map at its offsets, and catalog-wide
+queries are a few vectorized passes over it.
+"""
+
+import argparse
+import csv
+import datetime
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("ebike_crawler.price_index")
+
+POINT_DTYPE = np.dtype([("series", "<u4"), ("day", "<i4"), ("price", "<f4"), ("available", "u1")])
+EPOCH = datetime.date(1970, 1, 1)
+
+_DATED_CSV = re.compile(r"^(?P<site>.+)_(?P<date>\d{8})\.csv$")
+
+Key = Tuple[str, str, str]
+
+
+def to_day(date: datetime.date) -> int:
+    return (date - EPOCH).days
+
+
+def from_day(day: int) -> datetime.date:
+    return EPOCH + datetime.timedelta(days=int(day))
+
+
+def _price(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+class PriceIndex:
+    """
+    Append-only price and availability index over all crawl runs.
+
+    Runs must be ingested in chronological order per website.
+    """
+
+    # Sites are crawled in parallel threads but share one index
+    _write_lock = threading.Lock()
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.keys_path = self.root / "keys.tsv"
+        self.points_path = self.root / "points.bin"
+        self.offsets_path = self.root / "offsets.bin"
+        self._load()
+
+    def _load(self):
+        self.keys: List[Key] = []
+        self.key_ids: Dict[Key, int] = {}
+        if self.keys_path.exists():
+            with open(self.keys_path, encoding="utf-8") as f:
+                for line in f:
+                    series_id, website, product_id, language = line.rstrip("\n").split("\t")
+                    key = (website, product_id, language)
+                    self.key_ids[key] = int(series_id)
+                    self.keys.append(key)
+
+        if self.points_path.exists() and self.points_path.stat().st_size:
+            self.points = np.memmap(self.points_path, dtype=POINT_DTYPE, mode="r")
+        else:
+            self.points = np.zeros(0, dtype=POINT_DTYPE)
+
+        # Contiguous slice [starts[i], starts[i + 1]) holds series i
+        starts = np.fromfile(self.offsets_path, dtype="<i8") if self.offsets_path.exists() else None
+        if starts is None or len(starts) != len(self.keys) + 1 or starts[-1] != len(self.points):
+            # Missing or stale offsets (an interrupted write, or an index from before
+            # they existed): sort in memory; the next ingest rewrites the files
+            if len(self.points):
+                logger.warning(f"Price index offsets out of date in {self.root}, sorting points in memory")
+            self.points = self.points[np.lexsort((self.points["day"], self.points["series"]))]
+            starts = np.searchsorted(self.points["series"], np.arange(len(self.keys) + 1))
+        self._starts = starts
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def series(self, website: str, product_id: str, language: str) -> np.ndarray:
+        """All change points of one product, oldest first."""
+        series_id = self.key_ids.get((website, product_id, language))
+        if series_id is None:
+            return np.zeros(0, dtype=POINT_DTYPE)
+        return self.points[self._starts[series_id]:self._starts[series_id + 1]]
+
+    def price_on(self, website: str, product_id: str, language: str, date: datetime.date) -> Optional[float]:
+        points = self.series(website, product_id, language)
+        position = np.searchsorted(points["day"], to_day(date), side="right") - 1
+        if position < 0 or not points["available"][position]:
+            return None
+        price = float(points["price"][position])
+        return None if price != price else price
+
+    def window(self, website: str, product_id: str, language: str,
+               start: datetime.date, end: datetime.date) -> Optional[Dict[str, Any]]:
+        """Min, max, first and last known price of a product within [start, end]."""
+        points = self.series(website, product_id, language)
+        if not len(points):
+            return None
+        lo = max(np.searchsorted(points["day"], to_day(start), side="right") - 1, 0)
+        hi = np.searchsorted(points["day"], to_day(end), side="right")
+        window = points[lo:hi]
+        prices = window["price"][(window["available"] == 1) & ~np.isnan(window["price"])]
+        if not len(prices):
+            return None
+        return {"min": float(prices.min()), "max": float(prices.max()),
+                "first": float(prices[0]), "last": float(prices[-1]), "changes": int(len(window))}
+
+    def _changes(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Indexes of points that follow an earlier point of the same series, and those previous points."""
+        if len(self.points) < 2:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        current = np.nonzero(self.points["series"][1:] == self.points["series"][:-1])[0] + 1
+        return current, current - 1
+
+    def price_drops(self, since: Optional[datetime.date] = None, min_percent: float = 0.0) -> List[Dict[str, Any]]:
+        """Price decreases of at least `min_percent`, optionally only on or after `since`, largest first."""
+        current, previous = self._changes()
+        old, new = self.points["price"][previous], self.points["price"][current]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            percent = (old - new) / old * 100
+        mask = (new < old) & (percent >= min_percent) & (self.points["available"][current] == 1)
+        if since:
+            mask &= self.points["day"][current] >= to_day(since)
+        selected = current[mask]
+        order = np.argsort(-percent[mask], kind="stable")
+        return [self._describe(i, old_price=float(self.points["price"][i - 1])) for i in selected[order]]
+
+    def latest_changes(self, n: int = 20) -> List[Dict[str, Any]]:
+        """The `n` most recent price or availability changes across the catalog."""
+        current, _ = self._changes()
+        order = np.argsort(-self.points["day"][current], kind="stable")[:n]
+        return [self._describe(i, old_price=float(self.points["price"][i - 1])) for i in current[order]]
+
+    def _describe(self, index: int, **extra) -> Dict[str, Any]:
+        point = self.points[index]
+        website, product_id, language = self.keys[int(point["series"])]
+        price = float(point["price"])
+        description = {
+            "website": website, "product_id": product_id, "language": language,
+            "date": from_day(point["day"]).isoformat(),
+            "price": None if price != price else price,
+            "available": bool(point["available"]),
+        }
+        description.update({k: (None if v != v else v) for k, v in extra.items()})
+        return description
+
+    def ingest_run(self, website: str, records: Iterable[Dict[str, Any]], date: datetime.date) -> int:
+        """
+        Add one full crawl of a website, adding only changed points.
+
+        Products of the website that are missing from `records` are recorded
+        as unavailable. The points file is rewritten in (series, day) order
+        with the new points at the end of their series. Returns the number of
+        points added.
+        """
+        with self._write_lock:
+            self._load()
+            day = to_day(date)
+            new_keys: List[Key] = []
+            appended = []
+            seen = set()
+
+            for record in records:
+                key = (website, str(record.get("product_id", "")), str(record.get("language", "")))
+                if key in seen:
+                    continue
+                seen.add(key)
+                price = _price(record.get("price"))
+                series_id = self.key_ids.get(key)
+                if series_id is None:
+                    series_id = len(self.keys) + len(new_keys)
+                    new_keys.append(key)
+                    appended.append((series_id, day, price, 1))
+                    continue
+                last = self._last_point(series_id)
+                if last is None or not last["available"] or not _same_price(last["price"], price):
+                    appended.append((series_id, day, price, 1))
+
+            for key, series_id in self.key_ids.items():
+                if key[0] == website and key not in seen:
+                    last = self._last_point(series_id)
+                    if last is not None and last["available"]:
+                        appended.append((series_id, day, last["price"], 0))
+
+            self.root.mkdir(parents=True, exist_ok=True)
+            if new_keys:
+                with open(self.keys_path, "a", encoding="utf-8") as f:
+                    for offset, key in enumerate(new_keys):
+                        f.write(f"{len(self.keys) + offset}\t" + "\t".join(key) + "\n")
+            if new_keys or appended:
+                self._write_points(np.array(appended, dtype=POINT_DTYPE), len(self.keys) + len(new_keys))
+            self._load()
+
+        logger.info(f"Price index: {len(appended)} points appended for {website} on {date}")
+        return len(appended)
+
+    def _write_points(self, added: np.ndarray, series_count: int):
+        """Write the points with `added` (one point per series, on the latest day) merged in, and their offsets."""
+        added = added[np.argsort(added["series"], kind="stable")]
+        # Each added point goes to the end of its series; new series go at the end
+        ends = np.append(self._starts[1:], len(self.points))
+        positions = ends[np.minimum(added["series"], len(ends) - 1)]
+        points = np.insert(np.asarray(self.points), positions, added)
+        counts = np.bincount(points["series"], minlength=series_count)
+        starts = np.concatenate(([0], np.cumsum(counts))).astype("<i8")
+
+        for path, data in ((self.points_path, points), (self.offsets_path, starts)):
+            tmp_path = path.with_name(path.name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(data.tobytes())
+            os.replace(tmp_path, path)
+
+    def _last_point(self, series_id: int):
+        end = self._starts[series_id + 1]
+        if end == self._starts[series_id]:
+            return None
+        return self.points[end - 1]
+
+    def ingest_csv(self, path: Path) -> int:
+        """Ingest a dated `<site>_<YYYYMMDD>.csv` file."""
+        path = Path(path)
+        match = _DATED_CSV.match(path.name)
+        if not match:
+            raise ValueError(f"Not a dated site CSV: {path.name}")
+        date = datetime.datetime.strptime(match.group("date"), "%Y%m%d").date()
+        with open(path, newline="", encoding="utf-8") as f:
+            return self.ingest_run(match.group("site"), csv.DictReader(f), date)
+
+
+def _same_price(old: float, new: float) -> bool:
+    if old != old and new != new:  # both NaN
+        return True
+    return bool(np.float32(old) == np.float32(new))
+
+
+def main(argv: Optional[List[str]] = None):
+    from .crawler import PRICE_INDEX_DIR
+
+    parser = argparse.ArgumentParser(description="Build and query the price-history index")
+    parser.add_argument("--root", default=str(PRICE_INDEX_DIR), help="index directory")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest = subparsers.add_parser("ingest", help="ingest dated CSV files (or directories of them), oldest first")
+    ingest.add_argument("paths", nargs="+")
+
+    history = subparsers.add_parser("history", help="print the price history of one product")
+    history.add_argument("website")
+    history.add_argument("product_id")
+    history.add_argument("language")
+
+    drops = subparsers.add_parser("drops", help="list price drops")
+    drops.add_argument("--since", type=datetime.date.fromisoformat)
+    drops.add_argument("--min-percent", type=float, default=0.0)
+
+    latest = subparsers.add_parser("latest", help="list the most recent changes")
+    latest.add_argument("-n", type=int, default=20)
+
+    args = parser.parse_args(argv)
+    index = PriceIndex(Path(args.root))
+
+    if args.command == "ingest":
+        files = []
+        for path in map(Path, args.paths):
+            files.extend(path.glob("*.csv") if path.is_dir() else [path])
+        dated = sorted((m.group("date"), str(p), p) for p in files if (m := _DATED_CSV.match(p.name)))
+        for _, _, path in dated:
+            print(f"{path}: {index.ingest_csv(path)} points")
+    elif args.command == "history":
+        for point in index.series(args.website, args.product_id, args.language):
+            print(from_day(point["day"]).isoformat(), point["price"], "available" if point["available"] else "unavailable")
+    elif args.command == "drops":
+        for drop in index.price_drops(args.since, args.min_percent):
+            print(drop)
+    elif args.command == "latest":
+        for change in index.latest_changes(args.n):
+            print(change)
+
+
+if __name__ == "__main__":
+    main()
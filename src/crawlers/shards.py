@@ -0,0 +1,284 @@
+"""
+Sharded crawl planning, shard outputs and their merge.
+
+A crawl can be split across N workers (e.g. a CI job matrix). Every worker
+computes the same plan from the same inputs: each website is weighted by
+the row count of its current CSV, websites heavier than an even share are
+split into product ranges (by a stable hash of the product ID), and the
+resulting units are assigned greedily to the least loaded shard.
+
+Each unit's records are written to
+
+    <output>/<website_key>/part-<k>-of-<M>.jsonl            {"page": ..., "record": ...} per line
+    <output>/<website_key>/part-<k>-of-<M>.json             manifest, written last
+    <output>/<website_key>/part-<k>-of-<M>.frontier.sqlite  the unit's crawl frontier
+
+The merge step reads the manifests, refuses websites with missing or
+unfinished parts, and streams the parts back in discovery order with
+products deduplicated by (website, product_id, language). The frontiers of
+unfinished parts are kept in the state directory; a resumed shard run
+plans those websites with the same split and continues each unit from its
+frontier, so a website larger than one job's time budget finishes over
+several runs.
+"""
+
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("ebike_crawler.shards")
+
+# Weight of a website without a current CSV (rows, i.e. products x languages)
+DEFAULT_SITE_WEIGHT = 50
+
+_PART_FILE = re.compile(r"part-(?P<part>\d+)-of-(?P<parts>\d+)\.json$")
+_FRONTIER_FILE = re.compile(r"part-(?P<part>\d+)-of-(?P<parts>\d+)\.frontier\.sqlite$")
+
+# (website_key, part, parts)
+Unit = Tuple[str, int, int]
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """Parse "i/N" (1-based) into (index, count) with a 0-based index."""
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", value or "")
+    if not match:
+        raise ValueError(f"Shard must look like i/N, got {value!r}")
+    index, count = int(match.group(1)), int(match.group(2))
+    if not 1 <= index <= count:
+        raise ValueError(f"Shard index must be between 1 and {count}, got {index}")
+    return index - 1, count
+
+
+def product_part(product_id: str, parts: int) -> int:
+    """Stable product range of a product ID; the same on every worker and Python process."""
+    return zlib.crc32(product_id.encode("utf-8")) % parts if parts > 1 else 0
+
+
+def site_weights(website_keys: Iterable[str], current_dir: Path) -> Dict[str, int]:
+    """Row count of each website's latest CSV, the expected amount of work."""
+    weights = {}
+    for key in website_keys:
+        files = sorted(Path(current_dir).glob(f"{key}_[0-9]*.csv"))
+        if files:
+            with open(files[-1], "rb") as f:
+                weights[key] = max(sum(1 for _ in f) - 1, 1)
+        else:
+            weights[key] = DEFAULT_SITE_WEIGHT
+    return weights
+
+
+def plan_shards(weights: Dict[str, int], count: int, splits: Optional[Dict[str, int]] = None) -> List[List[Unit]]:
+    """
+    Assign websites, or product ranges of large websites, to `count` shards.
+
+    Deterministic for the same weights: websites heavier than an even share
+    are split into ceil(weight / share) ranges, and units are assigned
+    heaviest first to the least loaded shard (lowest index on ties).
+    Websites in `splits` keep that number of ranges (see saved_splits).
+    """
+    splits = splits or {}
+    share = sum(weights.values()) / count if count else 0
+    units = []
+    for key, weight in weights.items():
+        parts = min(count, max(1, math.ceil(weight / share))) if share else 1
+        parts = splits.get(key, parts)
+        units.extend((weight / parts, key, part, parts) for part in range(parts))
+
+    shards: List[List[Unit]] = [[] for _ in range(count)]
+    loads = [(0.0, index) for index in range(count)]
+    for weight, key, part, parts in sorted(units, key=lambda u: (-u[0], u[1], u[2])):
+        load, index = heapq.heappop(loads)
+        shards[index].append((key, part, parts))
+        heapq.heappush(loads, (load + weight, index))
+    return shards
+
+
+def _part_path(output_dir: Path, website_key: str, part: int, parts: int) -> Path:
+    return Path(output_dir) / website_key / f"part-{part}-of-{parts}.json"
+
+
+def frontier_path(root: Path, website_key: str, part: int, parts: int) -> Path:
+    """Crawl frontier of a unit, in a shard output or the saved frontiers directory."""
+    return Path(root) / website_key / f"part-{part}-of-{parts}.frontier.sqlite"
+
+
+def saved_splits(frontier_dir: Path) -> Dict[str, int]:
+    """Number of parts of every website with saved unit frontiers."""
+    splits = {}
+    for path in sorted(Path(frontier_dir).glob("*/part-*-of-*.frontier.sqlite")):
+        match = _FRONTIER_FILE.search(path.name)
+        if match:
+            splits[path.parent.name] = int(match.group("parts"))
+    return splits
+
+
+def save_frontiers(website_key: str, manifests: List[Dict[str, Any]], frontier_dir: Path) -> List[Path]:
+    """
+    Keep the frontiers of a website's unfinished parts in `frontier_dir` for
+    the next resumed run, replacing the ones saved before. Returns the paths
+    saved; merged websites pass no manifests and lose their saved frontiers.
+    """
+    target = Path(frontier_dir) / website_key
+    if target.exists():
+        shutil.rmtree(target)
+    saved = []
+    for manifest in manifests:
+        source = frontier_path(Path(manifest["path"]).parent.parent, website_key, manifest["part"], manifest["parts"])
+        if manifest["complete"] or not source.exists():
+            continue
+        path = frontier_path(frontier_dir, website_key, manifest["part"], manifest["parts"])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(source, path)
+        saved.append(path)
+    return saved
+
+
+class ShardWriter:
+    """Writes one unit's records and, once finished, its manifest."""
+
+    def __init__(self, output_dir: Path, website_key: str, part: int, parts: int):
+        self.website_key = website_key
+        self.part = part
+        self.parts = parts
+        self.manifest_path = _part_path(output_dir, website_key, part, parts)
+        self.records_path = self.manifest_path.with_suffix(".jsonl")
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        # A previous manifest must not vouch for the records being rewritten
+        if self.manifest_path.exists():
+            self.manifest_path.unlink()
+        self._tmp_path = self.records_path.with_name(self.records_path.name + ".tmp")
+        self._file = open(self._tmp_path, "w", encoding="utf-8")
+        self.keys: List[Tuple[str, str]] = []
+
+    def __enter__(self) -> "ShardWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self._file.closed:
+            self._file.close()
+            self._tmp_path.unlink()
+
+    def write(self, record: Dict[str, Any], page_fingerprint: Optional[str]):
+        self._file.write(json.dumps({"page": page_fingerprint, "record": record}, ensure_ascii=False, default=str))
+        self._file.write("\n")
+        self.keys.append((str(record.get("product_id", "")), str(record.get("language", ""))))
+
+    def finish(self, discovered: List[str], languages: List[str], complete: bool) -> Path:
+        """Move the records into place and write the manifest."""
+        self._file.close()
+        os.replace(self._tmp_path, self.records_path)
+        written = set(self.keys)
+        missing = [
+            [product_id, lang] for product_id in discovered if product_part(product_id, self.parts) == self.part
+            for lang in languages if (product_id, lang) not in written
+        ]
+        manifest = {
+            "website_key": self.website_key,
+            "part": self.part,
+            "parts": self.parts,
+            "complete": complete,
+            "records": len(self.keys),
+            "discovered": discovered,
+            "languages": languages,
+            "missing": missing,
+        }
+        tmp_path = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        tmp_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp_path, self.manifest_path)
+        logger.info(f"Shard output {self.records_path}: {len(self.keys)} records, {len(missing)} missing")
+        return self.manifest_path
+
+
+def read_manifests(root: Path) -> Dict[str, List[Dict[str, Any]]]:
+    """Manifests of all finished shard outputs under `root`, by website key."""
+    manifests: Dict[str, List[Dict[str, Any]]] = {}
+    for path in sorted(Path(root).rglob("part-*-of-*.json")):
+        if not _PART_FILE.search(path.name):
+            continue
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+        manifest["path"] = str(path.with_suffix(".jsonl"))
+        manifests.setdefault(manifest["website_key"], []).append(manifest)
+    return manifests
+
+
+def check_gaps(website_key: str, manifests: List[Dict[str, Any]]) -> List[str]:
+    """
+    Problems that make a website's shard outputs unusable.
+
+    Every part of the website's split must be present and complete, and
+    all parts must agree on the number of parts.
+    """
+    problems = []
+    split = {m["parts"] for m in manifests}
+    if len(split) > 1:
+        return [f"{website_key}: parts disagree on the split ({sorted(split)})"]
+    parts = split.pop()
+    present = {m["part"] for m in manifests}
+    for part in range(parts):
+        if part not in present:
+            problems.append(f"{website_key}: part {part + 1} of {parts} is missing")
+    for m in manifests:
+        if not m["complete"]:
+            problems.append(f"{website_key}: part {m['part'] + 1} of {parts} did not finish ({m['path']})")
+    return problems
+
+
+def _read_part(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def merge_records(website_key: str, manifests: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Stream a website's shard records in discovery order without duplicates.
+
+    Yields {"page": ..., "record": ...} entries. Products discovered by some
+    worker but absent from the part that owns them are logged as gaps.
+    """
+    manifests = sorted(manifests, key=lambda m: (m["part"], m["path"]))
+    order: Dict[str, int] = {}
+    for manifest in manifests:
+        for product_id in manifest["discovered"]:
+            order.setdefault(product_id, len(order))
+    languages = {lang: i for m in manifests for i, lang in enumerate(m["languages"])}
+
+    def sort_key(entry: Dict[str, Any]) -> Tuple[int, int]:
+        record = entry["record"]
+        return order.get(str(record.get("product_id", "")), len(order)), languages.get(record.get("language"), 0)
+
+    seen = set()
+    duplicates = 0
+    for entry in heapq.merge(*(_read_part(m["path"]) for m in manifests), key=sort_key):
+        record = entry["record"]
+        key = (record.get("website"), str(record.get("product_id", "")), str(record.get("language", "")))
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        yield entry
+
+    written = {product_id for _, product_id, _ in seen}
+    parts = manifests[0]["parts"]
+    owned: Dict[int, set] = {}
+    for manifest in manifests:
+        owned.setdefault(manifest["part"], set()).update(manifest["discovered"])
+    unowned = [
+        product_id for product_id in order
+        if product_id not in written and product_id not in owned.get(product_part(product_id, parts), ())
+    ]
+    missing = sum(len(m["missing"]) for m in manifests)
+    if duplicates:
+        logger.info(f"{website_key}: dropped {duplicates} duplicate records")
+    if missing:
+        logger.warning(f"{website_key}: {missing} discovered products could not be crawled")
+    if unowned:
+        logger.warning(f"{website_key}: {len(unowned)} products were discovered by another shard but not by "
+                       f"the shard owning them, e.g. {unowned[0]}")
@@ -0,0 +1,155 @@
+"""
+Streaming sitemap discovery.
+
+Reads sitemap.xml files and sitemap indexes chunk by chunk with an
+incremental XML parser, so sitemaps with tens of thousands of URLs are
+processed in constant memory. Gzipped sitemaps (.xml.gz) are decompressed
+on the fly.
+
+The <lastmod> of each URL is used to put products that changed since they
+were last crawled at the front of the crawl queue.
+"""
+
+import datetime
+import logging
+import re
+import zlib
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional
+from xml.etree.ElementTree import XMLPullParser
+
+import requests
+
+logger = logging.getLogger("ebike_crawler.sitemap")
+
+CHUNK_SIZE = 64 * 1024
+MAX_SITEMAPS = 500  # guard against sitemap index loops and runaway nesting
+
+
+class SitemapEntry(NamedTuple):
+    loc: str
+    lastmod: Optional[datetime.datetime]
+
+
+def parse_lastmod(value: Optional[str]) -> Optional[datetime.datetime]:
+    """Parse a W3C datetime (date, or date and time with offset) as an aware UTC datetime."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    try:
+        parsed = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.astimezone(datetime.timezone.utc)
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _stream_chunks(url: str, session: requests.Session) -> Iterator[bytes]:
+    """Yield the (decompressed) body of a sitemap in chunks."""
+    with session.get(url, stream=True, timeout=30) as response:
+        response.raise_for_status()
+        decompressor = None
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if decompressor is None:
+                # .xml.gz files are served as opaque gzip, not Content-Encoding
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16) if chunk[:2] == b"\x1f\x8b" else False
+            yield decompressor.decompress(chunk) if decompressor else chunk
+        if decompressor:
+            yield decompressor.flush()
+
+
+def _parse_stream(chunks: Iterable[bytes]) -> Iterator[tuple]:
+    """Yield ("url" | "sitemap", loc, lastmod) for each entry of one sitemap document."""
+    parser = XMLPullParser(events=("start", "end"))
+    root = None
+    loc = lastmod = None
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, element in parser.read_events():
+            name = _local_name(element.tag)
+            if event == "start":
+                if root is None:
+                    root = element
+                continue
+            if name == "loc":
+                loc = (element.text or "").strip()
+            elif name == "lastmod":
+                lastmod = element.text
+            elif name in ("url", "sitemap"):
+                if loc:
+                    yield name, loc, parse_lastmod(lastmod)
+                loc = lastmod = None
+                # Drop finished entries so memory stays flat
+                root.clear()
+    parser.close()
+
+
+def iter_sitemap(sitemap_url: str, session: requests.Session,
+                 sitemap_filter: Optional[str] = None,
+                 before_request: Optional[Callable[[str], None]] = None) -> Iterator[SitemapEntry]:
+    """
+    Stream the page URLs of a sitemap, following sitemap indexes.
+
+    Args:
+        sitemap_url: URL of a sitemap or sitemap index
+        session: HTTP session used for the streaming requests
+        sitemap_filter: Optional regex; nested sitemaps whose URL does not
+            match it are skipped (e.g. "product" on Shopify indexes)
+        before_request: Called with each sitemap URL before it is fetched,
+            e.g. to wait for the host's politeness slot
+    """
+    pending: List[str] = [sitemap_url]
+    seen = set()
+    pattern = re.compile(sitemap_filter) if sitemap_filter else None
+
+    while pending and len(seen) < MAX_SITEMAPS:
+        url = pending.pop(0)
+        if url in seen:
+            continue
+        seen.add(url)
+        if before_request:
+            before_request(url)
+        count = 0
+        try:
+            for kind, loc, lastmod in _parse_stream(_stream_chunks(url, session)):
+                if kind == "sitemap":
+                    if pattern is None or pattern.search(loc):
+                        pending.append(loc)
+                else:
+                    count += 1
+                    yield SitemapEntry(loc, lastmod)
+        except (requests.RequestException, zlib.error) as e:
+            logger.warning(f"Could not read sitemap {url}: {e}")
+        except SyntaxError as e:  # xml.etree.ElementTree.ParseError
+            logger.warning(f"Malformed sitemap {url} after {count} URLs: {e}")
+        logger.debug(f"Sitemap {url}: {count} URLs")
+
+
+def prioritize(entries: Iterable[tuple],
+               last_crawled: Callable[[str], Optional[datetime.datetime]]) -> List[str]:
+    """
+    Order (product_id, lastmod) pairs so changed products are crawled first.
+
+    Products never crawled before or modified since their last crawl come
+    first, most recently modified first; then products without a lastmod;
+    then products unchanged since their last crawl, in sitemap order.
+    """
+    changed, unknown, unchanged = [], [], []
+    for position, (product_id, lastmod) in enumerate(entries):
+        crawled = last_crawled(product_id)
+        if crawled is None or (lastmod is not None and lastmod > crawled):
+            changed.append((lastmod or datetime.datetime.max.replace(tzinfo=datetime.timezone.utc), position, product_id))
+        elif lastmod is None:
+            unknown.append(product_id)
+        else:
+            unchanged.append(product_id)
+    changed.sort(key=lambda item: (-item[0].timestamp(), item[1]))
+    logger.info(f"Sitemap priority: {len(changed)} new or changed, {len(unknown)} without lastmod, "
+                f"{len(unchanged)} unchanged")
+    return [product_id for _, _, product_id in changed] + unknown + unchanged
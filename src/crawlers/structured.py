@@ -0,0 +1,246 @@
+"""
+Structured-data sources for storefront websites.
+
+Many e-bike shops publish their product data as machine-readable JSON, so
+there is no need to scrape it out of the rendered HTML:
+
+    catalog   Paginated bulk catalog endpoints (Shopify's products.json):
+              one request returns up to 250 products with prices and images,
+              replacing both listing-page discovery and product page fetches.
+    json_ld   schema.org Product objects embedded in product pages as
+              <script type="application/ld+json">, read without building
+              a DOM.
+
+Enabled per website with the "structured_source" key in WEBSITES. The CSS
+selectors remain the fallback when structured data is missing.
+"""
+
+import html
+import json
+import logging
+import re
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger("ebike_crawler.structured")
+
+SHOPIFY_PAGE_SIZE = 250
+
+# Spec field -> keywords identifying the line of a description that holds it
+SPEC_KEYWORDS = {
+    "battery": ["battery"],
+    "motor_type": ["motor"],
+    "max_speed": ["top speed", "max speed", "maximum speed"],
+    "range": ["range"],
+    "weight": ["bike weight", "net weight", "weight"],
+    "max_load": ["payload", "max load", "maximum load", "load capacity"],
+}
+
+_JSON_LD_SCRIPT = re.compile(
+    r"<script[^>]+type=[\"']application/ld\+json[\"'][^>]*>(.*?)</script>", re.IGNORECASE | re.DOTALL
+)
+_BLOCK_TAG = re.compile(r"<\s*(?:br|/p|/li|/div|/h\d|/tr)\b[^>]*>", re.IGNORECASE)
+_TAG = re.compile(r"<[^>]+>")
+
+
+def html_to_text(markup: Optional[str]) -> str:
+    """Strip tags from an HTML fragment, keeping block elements as lines."""
+    if not markup:
+        return ""
+    text = html.unescape(_TAG.sub(" ", _BLOCK_TAG.sub("\n", markup)))
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def spec_fields_from_text(text: str, keywords: Optional[Dict[str, List[str]]] = None,
+                          require_number: bool = True) -> Dict[str, str]:
+    """Pick the first line mentioning each spec keyword (and a number) out of a description."""
+    specs = {}
+    lines = [line for line in text.splitlines() if not require_number or any(c.isdigit() for c in line)]
+    for field, words in (keywords or SPEC_KEYWORDS).items():
+        for line in lines:
+            lowered = line.lower()
+            if any(word in lowered for word in words):
+                specs[field] = line[:200]
+                break
+    return specs
+
+
+def _to_price(value: Any) -> Optional[float]:
+    try:
+        return float(str(value).replace(",", ""))
+    except (TypeError, ValueError):
+        return None
+
+
+# --- Catalog endpoints -------------------------------------------------------
+
+def _shopify_record(product: Dict[str, Any]) -> Dict[str, Any]:
+    """Map one Shopify products.json entry to crawler record fields."""
+    record: Dict[str, Any] = {"name": product.get("title") or ""}
+
+    variants = product.get("variants") or []
+    available = [v for v in variants if v.get("available", True)] or variants
+    prices = [p for p in (_to_price(v.get("price")) for v in available) if p is not None]
+    if prices:
+        record["price"] = min(prices)
+
+    description = html_to_text(product.get("body_html"))
+    if description:
+        record["description"] = description
+        record.update(spec_fields_from_text(description))
+
+    images = [image.get("src") for image in product.get("images") or [] if image.get("src")]
+    if images:
+        record["images"] = images
+    return record
+
+
+def read_shopify_catalog(source: Dict[str, Any],
+                         fetch: Callable[[str], Any]) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    Read every product of a Shopify collection from its paginated products.json.
+
+    Args:
+        source: The website's structured_source config ("catalog_url", and
+            optionally "max_pages" and "product_types")
+        fetch: Function returning a response object (or None) for a URL
+
+    Returns:
+        Mapping of product handle -> record fields, or None if the catalog
+        could not be read at all
+    """
+    catalog_url = source["catalog_url"]
+    product_types = {t.lower() for t in source.get("product_types", [])}
+    max_pages = source.get("max_pages")
+    products: Dict[str, Dict[str, Any]] = {}
+    page = 1
+
+    while max_pages is None or page <= max_pages:
+        separator = "&" if "?" in catalog_url else "?"
+        response = fetch(f"{catalog_url}{separator}limit={SHOPIFY_PAGE_SIZE}&page={page}")
+        if response is None:
+            if page == 1:
+                return None
+            break
+        try:
+            entries = json.loads(response.content).get("products", [])
+        except (ValueError, AttributeError) as e:
+            logger.warning(f"Invalid catalog page {page} at {catalog_url}: {e}")
+            return None if page == 1 else products
+        if not entries:
+            break
+        for entry in entries:
+            handle = entry.get("handle")
+            if not handle:
+                continue
+            if product_types and (entry.get("product_type") or "").lower() not in product_types:
+                continue
+            products[handle] = _shopify_record(entry)
+        if len(entries) < SHOPIFY_PAGE_SIZE:
+            break
+        page += 1
+
+    logger.info(f"Read {len(products)} products from {page} catalog page(s) at {catalog_url}")
+    return products
+
+
+CATALOG_READERS = {
+    "shopify": read_shopify_catalog,
+}
+
+
+def read_catalog(source: Dict[str, Any], fetch: Callable[[str], Any]) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Read a website's bulk catalog with the reader for its "catalog" type."""
+    reader = CATALOG_READERS.get(source.get("catalog"))
+    if reader is None:
+        raise ValueError(f"Unknown catalog type: {source.get('catalog')}")
+    return reader(source, fetch)
+
+
+# --- JSON-LD -------------------------------------------------------------------
+
+def iter_json_ld(page_html: str) -> Iterator[Dict[str, Any]]:
+    """Yield every JSON-LD object in a page, flattening lists and @graph."""
+    for match in _JSON_LD_SCRIPT.finditer(page_html):
+        try:
+            data = json.loads(match.group(1).strip())
+        except ValueError:
+            continue
+        stack = data if isinstance(data, list) else [data]
+        while stack:
+            item = stack.pop(0)
+            if isinstance(item, list):
+                stack.extend(item)
+            elif isinstance(item, dict):
+                yield item
+                if "@graph" in item:
+                    stack.extend(item["@graph"] if isinstance(item["@graph"], list) else [item["@graph"]])
+
+
+def _is_type(item: Dict[str, Any], name: str) -> bool:
+    types = item.get("@type")
+    return name in (types if isinstance(types, list) else [types])
+
+
+def _offer_price(offers: Any) -> Optional[float]:
+    prices = []
+    for offer in offers if isinstance(offers, list) else [offers]:
+        if not isinstance(offer, dict):
+            continue
+        for key in ("price", "lowPrice"):
+            price = _to_price(offer.get(key))
+            if price is not None:
+                prices.append(price)
+                break
+        if "offers" in offer:
+            nested = _offer_price(offer["offers"])
+            if nested is not None:
+                prices.append(nested)
+    return min(prices) if prices else None
+
+
+def _image_urls(image: Any) -> List[str]:
+    urls = []
+    for item in image if isinstance(image, list) else [image]:
+        if isinstance(item, str):
+            urls.append(item)
+        elif isinstance(item, dict) and (item.get("url") or item.get("contentUrl")):
+            urls.append(item.get("url") or item.get("contentUrl"))
+    return urls
+
+
+def json_ld_product(page_html: str) -> Dict[str, Any]:
+    """
+    Extract record fields from the first schema.org Product in a page.
+
+    Specs come from additionalProperty name/value pairs, else from lines of
+    the description. Returns an empty dict if the page has no Product.
+    """
+    product = next((item for item in iter_json_ld(page_html) if _is_type(item, "Product")), None)
+    if product is None:
+        return {}
+
+    record: Dict[str, Any] = {}
+    if product.get("name"):
+        record["name"] = html.unescape(str(product["name"])).strip()
+    price = _offer_price(product.get("offers"))
+    if price is not None:
+        record["price"] = price
+    description = html_to_text(product.get("description"))
+    if description:
+        record["description"] = description
+
+    properties = "\n".join(
+        f"{prop.get('name')}: {prop.get('value')}"
+        for prop in product.get("additionalProperty") or []
+        if isinstance(prop, dict) and prop.get("name")
+    )
+    specs = spec_fields_from_text(properties, require_number=False)
+    for field, value in spec_fields_from_text(description).items():
+        specs.setdefault(field, value)
+    record.update(specs)
+
+    images = _image_urls(product.get("image"))
+    if images:
+        record["images"] = images
+    return record
@@ -0,0 +1,112 @@
+"""
+Streaming, atomic CSV writer for crawled products.
+
+Records are appended to an anonymous spool file as they are crawled, so a
+site's products are not held in memory until the site is finished. On
+commit the distinct raw spec values are normalized in one batch (see
+normalize.py) and the spool is written out once as CSV, with the normalized
+spec columns, to a temp file that is renamed into place.
+Further copies (the static site's data directory) are hard links to that
+file, or a single file copy where linking is not possible.
+"""
+
+import csv
+import json
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Set
+
+from .normalize import SPEC_COLUMNS, normalize_record, normalized_columns, parse_distinct
+
+logger = logging.getLogger("ebike_crawler.writer")
+
+
+def link_or_copy(source: Path, target: Path):
+    """Atomically place `source` at `target`, as a hard link if possible."""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_name(target.name + ".tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        # Different filesystem, or links not supported
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, target)
+
+
+class RecordWriter:
+    """
+    Spools product records and writes them as one CSV file.
+
+    CSV columns are the record fields in order of first appearance, followed
+    by the normalized spec columns. Nothing is written to the target until
+    `commit()`; a writer closed without committing leaves existing files
+    untouched.
+    """
+
+    def __init__(self):
+        self._spool = tempfile.TemporaryFile("w+", encoding="utf-8")
+        self._fields: Dict[str, None] = {}
+        # Distinct raw values of each spec field, parsed together on commit
+        self._spec_values: Dict[str, Set[str]] = {field: set() for field in SPEC_COLUMNS}
+        self.count = 0
+
+    def __enter__(self) -> "RecordWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, record: Dict[str, Any]):
+        for field in record:
+            if field not in self._fields:
+                self._fields[field] = None
+        for field, values in self._spec_values.items():
+            raw = record.get(field)
+            if raw:
+                values.add(str(raw))
+        self._spool.seek(0, os.SEEK_END)
+        self._spool.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self.count += 1
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """Read the spooled records back, in write order."""
+        self._spool.flush()
+        self._spool.seek(0)
+        for line in self._spool:
+            yield json.loads(line)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self.records()
+
+    def commit(self, path: Path, copies: Iterable[Path] = ()) -> Path:
+        """Write the CSV to `path` via a temp file and rename, then link it to every path in `copies`."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        columns = list(self._fields) + normalized_columns(self._fields)
+        for field, values in self._spec_values.items():
+            parse_distinct(field, values)
+        try:
+            with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=columns, lineterminator="\n")
+                writer.writeheader()
+                for record in self.records():
+                    record.update(normalize_record(record))
+                    writer.writerow(record)
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        logger.info(f"Saved {self.count} products to {path}")
+
+        for copy in copies:
+            link_or_copy(path, copy)
+            logger.info(f"Saved {self.count} products to {copy}")
+        return path
+
+    def close(self):
+        self._spool.close()